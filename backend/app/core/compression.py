@@ -0,0 +1,176 @@
+"""
+Response compression negotiated from ``Accept-Encoding``.
+
+gzip is always available. zstd and brotli are used when the ``zstandard`` /
+``brotli`` packages are installed. Bodies below ``compression_min_size``
+are sent as-is.
+
+Two paths share the negotiation:
+
+* ``app.core.http_cache`` compresses cached list bodies once per version
+  and keeps the encoded variants next to the identity body.
+* ``CompressionMiddleware`` covers every other response. Buffered bodies
+  are compressed whole. Streaming bodies are gzip'd chunk by chunk with a
+  sync flush, so NDJSON consumers still see rows as they are produced.
+  Responses that already carry ``Content-Encoding`` pass through untouched.
+"""
+
+from __future__ import annotations
+
+import gzip
+import zlib
+from typing import Callable
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+_CODECS: dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    _zstd = zstandard.ZstdCompressor(level=settings.compression_zstd_level)
+    _CODECS["zstd"] = _zstd.compress
+if brotli is not None:
+    _CODECS["br"] = lambda body: brotli.compress(body, quality=settings.compression_brotli_quality)
+_CODECS["gzip"] = lambda body: gzip.compress(body, compresslevel=settings.compression_gzip_level, mtime=0)
+
+# Server preference when the client weighs several encodings equally
+PREFERENCE = tuple(_CODECS)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _parse_accept_encoding(value: str) -> dict[str, float]:
+    weights: dict[str, float] = {}
+    for part in value.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, raw = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(raw)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def negotiate(accept_encoding: str | None, codings: tuple[str, ...] = PREFERENCE) -> str | None:
+    """Best available coding the client accepts, or None for identity."""
+    if not accept_encoding or not settings.compression_enabled:
+        return None
+    weights = _parse_accept_encoding(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(coding: str, body: bytes) -> bytes:
+    return _CODECS[coding](body)
+
+
+def should_compress(content_type: str | None, size: int) -> bool:
+    return size >= settings.compression_min_size and bool(content_type) and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding")
+        coding = negotiate(accept_encoding)
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        # Incremental encoders differ per codec; streams only ever use gzip
+        streaming = negotiate(accept_encoding, ("gzip",)) is not None
+        await _Responder(self.app, coding, streaming)(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, app: ASGIApp, coding: str, streaming: bool) -> None:
+        self.app = app
+        self.coding = coding
+        self.streaming = streaming
+        self.send: Send
+        self.start: Message | None = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            # Hold the start message until the first body chunk shows the size
+            self.start = message
+            self.passthrough = (
+                "content-encoding" in headers
+                or message["status"] in (204, 304)
+                or not (headers.get("content-type") or "").startswith(COMPRESSIBLE_TYPES)
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.start is not None:
+            start, self.start = self.start, None
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if self.passthrough or (more_body and not self.streaming) or (
+                not more_body and len(body) < settings.compression_min_size
+            ):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                self.stream = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+                headers["Content-Encoding"] = "gzip"
+                del headers["Content-Length"]
+                message["body"] = self.stream.compress(body) + self.stream.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                message["body"] = compress(self.coding, body)
+                headers["Content-Encoding"] = self.coding
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(start)
+            await self.send(message)
+            return
+
+        if self.passthrough or self.stream is None:
+            await self.send(message)
+            return
+        body = self.stream.compress(message.get("body", b""))
+        if message.get("more_body", False):
+            body += self.stream.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            body += self.stream.flush()
+        message["body"] = body
+        await self.send(message)
@@ -8,7 +8,54 @@ class Settings(BaseSettings):
     jwt_secret: str = "change_me_in_production"
     jwt_algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
+    jwt_cache_size: int = 4096
+    password_hash_workers: int = 0  # 0 = one per core, leaving a core for request handling
+    password_hash_queue_size: int = 32
+    password_hash_timeout_seconds: float = 10.0
     api_rate_limit_per_minute: int = 120
+    rate_limit_enabled: bool = True
+    metrics_cache_ttl_seconds: float = 2.0
+    json_fragment_cache_size: int = 50000  # per collection
+    render_cache_size: int = 4096
+    compression_enabled: bool = True
+    compression_min_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_zstd_level: int = 3
+    compression_brotli_quality: int = 5
+    ingest_timing_sample_rate: float = 0.05
+    changes_feed_max_per_tenant: int = 10000
+    changes_feed_max_wait_seconds: float = 30.0
+    ban_log_max_per_tenant: int = 10000
+    banned_traffic_sample_rate: float = 0.01  # share of items from banned IPs still stored in full
+    agent_batch_max_heartbeats: int = 500  # per POST /agents/heartbeat/batch
+    agent_batch_max_bytes: int = 16 * 1024 * 1024  # decompressed
+    event_retention_days: int = 90  # 0 keeps events forever
+    heartbeat_stale_after_seconds: float = 90.0
+    heartbeat_offline_after_seconds: float = 300.0
+    maintenance_interval_seconds: float = 5.0
+    geoip_db_path: str = ""  # built with python -m app.services.geoip; empty disables enrichment
+    geoip_cache_size: int = 65536
+    geoip_reload_interval_seconds: float = 30.0
+
+    # Cross-server correlation (app.services.correlation)
+    correlation_enabled: bool = True
+    correlation_window_seconds: float = 3600.0
+    correlation_min_servers: int = 3
+    correlation_min_failures: int = 20
+    correlation_max_sources_per_tenant: int = 50000
+    correlation_max_incidents_per_tenant: int = 1000
+    correlation_ban_duration: str = "24h"
+
+    # Attack statistics sketches (app.services.sketches), per tenant
+    attack_stats_top_k: int = 64  # counters per summary; counts are off by at most N/k
+    attack_stats_hll_precision: int = 11  # 2^p registers, ±1.04/sqrt(2^p) on distinct counts
+
+    # Scale-out mode (python -m app.scaleout); set per shard process by the router
+    shard_count: int = 1
+    shard_index: int = 0
+    shard_internal_secret: str = ""
+    shard_sockets: str = ""
+    shard_token_cache_ttl_seconds: float = 30.0
 
     discord_webhook_url: str = ""
     slack_webhook_url: str = ""
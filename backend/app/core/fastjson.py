@@ -0,0 +1,95 @@
+"""
+Fast JSON path for the list endpoints.
+
+Stored records are effectively immutable once created, so each record's API
+projection is encoded once and the bytes are cached. Responses are assembled
+by joining the cached fragments instead of building dicts and running them
+through ``jsonable_encoder`` on every request. The output is byte-for-byte
+what FastAPI's JSONResponse would produce for the same projection.
+
+Records that do change in place (servers on heartbeat, alerts on resolve)
+call ``invalidate_fragment`` from the store.
+"""
+
+from __future__ import annotations
+
+import json
+from threading import Lock
+from typing import Any, Callable, Iterable
+
+from fastapi.responses import Response
+
+from app.core.config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+_caches: dict[str, "FragmentCache"] = {}
+
+
+class FragmentCache:
+    """Encoded projection per record, keyed by record id.
+
+    An entry is only reused while it points at the same record object, so a
+    replaced record (or an id reused by another shard) is re-encoded rather
+    than served stale. Bounded; the oldest entries are evicted first.
+    """
+
+    def __init__(self, collection: str, project: Callable[[dict], dict], max_entries: int | None = None) -> None:
+        self.collection = collection
+        self._project = project
+        self._max_entries = max_entries or settings.json_fragment_cache_size
+        self._entries: dict[int, tuple[dict, bytes]] = {}
+        self._lock = Lock()
+        _caches[collection] = self
+
+    def fragment(self, record: dict) -> bytes:
+        key = record["id"]
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is record:
+            return entry[1]
+        data = dumps(self._project(record))
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self._max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (record, data)
+        return data
+
+    def invalidate(self, record_id: int) -> None:
+        with self._lock:
+            self._entries.pop(record_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def invalidate_fragment(collection: str, record_id: int) -> None:
+    cache = _caches.get(collection)
+    if cache is not None:
+        cache.invalidate(record_id)
+
+
+def fragment_cache_entries() -> int:
+    return sum(len(cache) for cache in _caches.values())
+
+
+def list_body(cache: FragmentCache, records: Iterable[dict], **fields: Any) -> bytes:
+    """``{"items": [...], **fields}`` assembled from cached record fragments."""
+    parts = [b'{"items":[', b",".join(cache.fragment(r) for r in records), b"]"]
+    for key, value in fields.items():
+        parts += [b",", dumps(key), b":", dumps(value)]
+    parts.append(b"}")
+    return b"".join(parts)
+
+
+def list_response(cache: FragmentCache, records: Iterable[dict], **fields: Any) -> Response:
+    return Response(list_body(cache, records, **fields), media_type="application/json")
@@ -0,0 +1,112 @@
+"""
+Conditional GET for the dashboard's polled list endpoints.
+
+The store keeps a version counter per (tenant, collection) that is bumped
+on every write. Endpoints derive a weak ETag from that version, the tenant
+and the query string. Versions are per-tenant counters, so two tenants
+routinely reach the same one; the tenant in the tag (and ``Vary:
+Authorization``) keeps a browser that switches accounts from revalidating
+one tenant's cached list with another's ETag. A matching ``If-None-Match`` gets ``304 Not Modified`` without
+rendering anything. Otherwise the last rendered body for the same tenant,
+collection and query is reused while its version is current, along with
+any compressed variants of it, so each encoding is paid for once per
+version rather than once per poll.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from threading import Lock
+from typing import Callable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.core.compression import compress, negotiate, should_compress
+from app.core.config import settings
+
+# Versions restart at zero with the process; the epoch keeps ETags issued
+# before a restart from matching a new body that reached the same version.
+_EPOCH = os.urandom(4).hex()
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(usuario_id: int, collection: str, version: int, query: str) -> str:
+    # Keyed with the epoch so the tag does not expose the tenant id
+    digest = hashlib.blake2b(f"{usuario_id}?{query}".encode(), digest_size=8, key=_EPOCH.encode()).hexdigest()
+    return f'W/"{_EPOCH}.{collection}.{version}.{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/ prefixes are ignored on both sides
+    tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(","))
+
+
+class RenderCache:
+    """Last rendered body per (tenant, collection, query), bounded and oldest-first evicted.
+
+    Each entry maps content codings to bodies; "identity" is always present
+    and compressed variants are added as clients ask for them.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max_entries
+        self._entries: dict[tuple, tuple[int, dict[str, bytes]]] = {}
+        self._lock = Lock()
+
+    def get(self, key: tuple, version: int) -> dict[str, bytes] | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        return None
+
+    def put(self, key: tuple, version: int, body: bytes) -> dict[str, bytes]:
+        variants = {"identity": body}
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._entries) >= self._max_entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (version, variants)
+        return variants
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+render_cache = RenderCache(settings.render_cache_size)
+
+
+def cached_response(
+    request: Request,
+    usuario_id: int,
+    collection: str,
+    version: int,
+    render: Callable[[], bytes],
+) -> Response:
+    """304, cached body or freshly rendered body for a versioned collection view."""
+    query = request.url.query
+    etag = make_etag(usuario_id, collection, version, query)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding, Authorization"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    key = (usuario_id, collection, query)
+    variants = render_cache.get(key, version)
+    if variants is None:
+        variants = render_cache.put(key, version, render())
+    body = variants["identity"]
+    coding = negotiate(request.headers.get("accept-encoding"))
+    if coding is not None and should_compress("application/json", len(body)):
+        encoded = variants.get(coding)
+        if encoded is None:
+            # Racing requests may both compress; either result is valid
+            encoded = variants[coding] = compress(coding, body)
+        body = encoded
+        headers["Content-Encoding"] = coding
+    return Response(body, media_type="application/json", headers=headers)
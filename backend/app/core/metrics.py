@@ -0,0 +1,178 @@
+"""Prometheus collectors shared across modules (exported on /metrics/prometheus)."""
+
+import threading
+from contextvars import ContextVar, Token
+from itertools import count
+from time import monotonic
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest
+
+from app.core.config import settings
+
+# ── HTTP ──────────────────────────────────────────────────────────────
+# Labelled by matched route template, never the raw path, so /alerts/{alert_id}
+# stays one series no matter how many alerts exist.
+HTTP_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"}
+
+http_requests = Counter(
+    "node_guardian_http_requests_total",
+    "Total HTTP requests",
+    ["method", "route", "status"],
+)
+http_request_duration = Histogram(
+    "node_guardian_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+http_response_size = Histogram(
+    "node_guardian_http_response_size_bytes",
+    "HTTP response body size",
+    ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+http_in_flight = Gauge("node_guardian_http_requests_in_flight", "HTTP requests being served")
+
+# ── Auth ──────────────────────────────────────────────────────────────
+jwt_cache_requests = Counter(
+    "node_guardian_jwt_cache_requests_total",
+    "Verified-JWT cache lookups",
+    ["result"],
+)
+jwt_cache_hits = jwt_cache_requests.labels(result="hit")
+jwt_cache_misses = jwt_cache_requests.labels(result="miss")
+jwt_cache_entries = Gauge("node_guardian_jwt_cache_entries", "Verified JWTs currently cached")
+
+password_hash_seconds = Histogram(
+    "node_guardian_password_hash_seconds",
+    "PBKDF2 hash/verify latency including queueing in the hashing pool",
+    ["op"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+password_hash_rejected = Counter(
+    "node_guardian_password_hash_rejected_total",
+    "Password hashing requests rejected with 503",
+    ["reason"],
+)
+
+
+# ── Ingest pipeline ───────────────────────────────────────────────────
+# Stage timers only run for one in every N heartbeats (INGEST_TIMING_SAMPLE_RATE),
+# so leaving them on in production costs a counter increment per heartbeat.
+INGEST_STAGES = (
+    "token_lookup",
+    "upsert_server",
+    "cpu_alerts",
+    "disk_alerts",
+    "update_traffic",
+    "login_attempts",
+    "events",
+    "ban_filter",
+    "ban_sync",
+)
+# Rule types are user-defined strings; anything unknown shares one series.
+RULE_TYPES = {"ssh_login_failed", "port_scan", "cpu_critical", "disk_warning", "ddos"}
+
+ingest_stage_seconds = Histogram(
+    "node_guardian_ingest_stage_seconds",
+    "Sampled heartbeat ingest time per stage",
+    ["stage"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5),
+)
+heartbeat_items = Counter(
+    "node_guardian_heartbeat_items_total",
+    "Items received through agent heartbeats",
+    ["kind"],
+)
+blocked_items = Counter(
+    "node_guardian_blocked_items_total",
+    "Heartbeat items from already-banned sources, dropped at ingest (sampled ones included)",
+    ["kind"],
+)
+heartbeat_batch_size = Histogram(
+    "node_guardian_heartbeat_batch_size",
+    "Items per heartbeat",
+    ["kind"],
+    buckets=(0, 1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+rule_eval_seconds = Histogram(
+    "node_guardian_rule_eval_seconds",
+    "Sampled automation rule evaluation time per condicao_tipo",
+    ["condicao_tipo"],
+    buckets=(0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.001, 0.005, 0.025),
+)
+
+_stage_timers = {stage: ingest_stage_seconds.labels(stage=stage) for stage in INGEST_STAGES}
+_rule_timers = {tipo: rule_eval_seconds.labels(condicao_tipo=tipo) for tipo in RULE_TYPES}
+_rule_timer_other = rule_eval_seconds.labels(condicao_tipo="other")
+_ingest_sampled: ContextVar[bool] = ContextVar("ingest_sampled", default=False)
+_ingest_ticks = count()
+_ingest_every = max(1, round(1 / settings.ingest_timing_sample_rate)) if settings.ingest_timing_sample_rate > 0 else 0
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+def begin_ingest_sample() -> Token:
+    """Decide whether the current heartbeat is timed; pass the token to end_ingest_sample."""
+    sampled = bool(_ingest_every) and next(_ingest_ticks) % _ingest_every == 0
+    return _ingest_sampled.set(sampled)
+
+
+def end_ingest_sample(token: Token) -> None:
+    _ingest_sampled.reset(token)
+
+
+def ingest_sampling_active() -> bool:
+    return _ingest_sampled.get()
+
+
+def ingest_stage(stage: str):
+    """Context manager timing ``stage`` when the current heartbeat is sampled."""
+    if not _ingest_sampled.get():
+        return _NOOP_TIMER
+    return _stage_timers[stage].time()
+
+
+def observe_rule_eval(condicao_tipo: str, seconds: float) -> None:
+    _rule_timers.get(condicao_tipo, _rule_timer_other).observe(seconds)
+
+
+def observe_heartbeat_batch(kind: str, size: int) -> None:
+    heartbeat_batch_size.labels(kind=kind).observe(size)
+    if size:
+        heartbeat_items.labels(kind=kind).inc(size)
+
+
+def observe_blocked(kind: str, size: int) -> None:
+    if size:
+        blocked_items.labels(kind=kind).inc(size)
+
+
+# ── Exposition ────────────────────────────────────────────────────────
+_exposition_lock = threading.Lock()
+_exposition: tuple[float, bytes] = (float("-inf"), b"")
+
+
+def render_exposition() -> bytes:
+    """Text exposition of the default registry, rebuilt at most once per TTL."""
+    global _exposition
+    rendered_at, body = _exposition
+    if monotonic() - rendered_at < settings.metrics_cache_ttl_seconds:
+        return body
+    with _exposition_lock:
+        rendered_at, body = _exposition
+        if monotonic() - rendered_at >= settings.metrics_cache_ttl_seconds:
+            body = generate_latest()
+            _exposition = (monotonic(), body)
+    return body
@@ -1,6 +1,12 @@
+import asyncio
 import hashlib
+import os
 import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from time import perf_counter
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, Header, status
@@ -8,6 +14,14 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
 from app.core.config import settings
+from app.core.sharding import is_internal_request, sharding_enabled
+from app.core.metrics import (
+    jwt_cache_entries,
+    jwt_cache_hits,
+    jwt_cache_misses,
+    password_hash_rejected,
+    password_hash_seconds,
+)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
@@ -27,11 +41,72 @@ def verify_password(password: str, stored: str) -> bool:
     except Exception:
         return False
 
+# PBKDF2 runs on its own small pool so a login burst cannot occupy the
+# shared threadpool that sync routes (agent heartbeats included) run on.
+_hash_workers = settings.password_hash_workers or max(1, (os.cpu_count() or 2) - 1)
+_hash_pool = ThreadPoolExecutor(max_workers=_hash_workers, thread_name_prefix="pwhash")
+_hash_slots = threading.BoundedSemaphore(_hash_workers + settings.password_hash_queue_size)
+
+
+async def _run_in_hash_pool(op: str, fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        password_hash_rejected.labels(reason="saturated").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service busy, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    start = perf_counter()
+    future = _hash_pool.submit(fn, *args)
+    future.add_done_callback(lambda _: _hash_slots.release())
+    try:
+        return await asyncio.wait_for(
+            asyncio.wrap_future(future), settings.password_hash_timeout_seconds
+        )
+    except asyncio.TimeoutError as exc:
+        password_hash_rejected.labels(reason="timeout").inc()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service timed out, try again shortly",
+            headers={"Retry-After": "1"},
+        ) from exc
+    finally:
+        password_hash_seconds.labels(op=op).observe(perf_counter() - start)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hash_pool("hash", hash_password, password)
+
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await _run_in_hash_pool("verify", verify_password, password, stored)
+
 # ── Agent token helpers ──────────────────────────────────────────────
 def generate_agent_token() -> str:
     return f"ng_{secrets.token_hex(28)}"
 
 # ── JWT ──────────────────────────────────────────────────────────────
+# Bumped per user on password change, deactivation or role change; tokens
+# carry the generation they were issued under and older ones are rejected.
+_token_generations: dict[int, int] = {}
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    """Invalidate every access token issued to ``user_id`` so far."""
+    _token_generations[user_id] = _token_generations.get(user_id, 0) + 1
+
+
+def get_token_generations() -> dict[int, int]:
+    return dict(_token_generations)
+
+
+def merge_token_generations(generations: dict[int, int]) -> None:
+    """Adopt revocations made on another shard (generations only move forward)."""
+    for user_id, gen in generations.items():
+        if gen > _token_generations.get(user_id, 0):
+            _token_generations[user_id] = gen
+
+
 def create_access_token(user_id: int, email: str, role: str = "user", nome: str = "") -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
     payload = {
@@ -39,27 +114,78 @@ def create_access_token(user_id: int, email: str, role: str = "user", nome: str
         "uid": user_id,
         "role": role,
         "nome": nome,
+        "gen": _token_generations.get(user_id, 0),
         "exp": expire,
     }
     return jwt.encode(payload, settings.jwt_secret, algorithm=settings.jwt_algorithm)
 
 
+class _VerifiedTokenCache:
+    """Bounded LRU of decoded tokens keyed by SHA-256 digest; entries expire at ``exp``."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, tuple[dict, float, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes) -> tuple[dict, int] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, exp, gen = entry
+            if exp <= datetime.now(timezone.utc).timestamp():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user, gen
+
+    def put(self, key: bytes, user: dict, exp: float, gen: int) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (user, exp, gen)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+_jwt_cache = _VerifiedTokenCache(settings.jwt_cache_size)
+jwt_cache_entries.set_function(lambda: len(_jwt_cache))
+
+
 def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid token",
     )
-    try:
-        payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+    key = hashlib.sha256(token.encode()).digest()
+    cached = _jwt_cache.get(key)
+    if cached is not None:
+        jwt_cache_hits.inc()
+        user, gen = cached
+    else:
+        jwt_cache_misses.inc()
+        try:
+            payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
+        except JWTError as exc:
+            raise credentials_exception from exc
         email = payload.get("sub")
         user_id = payload.get("uid")
         role = payload.get("role", "user")
         nome = payload.get("nome", "")
         if email is None or user_id is None:
             raise credentials_exception
-        return {"user_id": user_id, "email": email, "role": role, "nome": nome}
-    except JWTError as exc:
-        raise credentials_exception from exc
+        user = {"user_id": user_id, "email": email, "role": role, "nome": nome}
+        gen = payload.get("gen", 0)
+        if payload.get("exp") is not None:
+            _jwt_cache.put(key, user, float(payload["exp"]), gen)
+    if gen < _token_generations.get(user["user_id"], 0):
+        raise credentials_exception
+    return dict(user)
 
 
 def require_roles(allowed_roles: list[str]):
@@ -104,6 +230,29 @@ def get_agent_tokens_db() -> list[dict]:
     return _agent_tokens_db
 
 
+def resolve_agent_token(
+    token: str,
+    forwarded_owner: str | None = None,
+    internal_secret: str | None = None,
+) -> dict | None:
+    """Active token entry for ``token``.
+
+    In scale-out mode tokens live on the control shard; the front router
+    resolves them there and forwards ``usuario_id:token_id`` to the owning
+    shard, which trusts it only alongside the internal secret.
+    """
+    entry = next((t for t in _agent_tokens_db if t["token"] == token and t["ativo"]), None)
+    if entry is not None or not (sharding_enabled() and forwarded_owner):
+        return entry
+    if not is_internal_request(internal_secret):
+        return None
+    try:
+        usuario_id, token_id = (int(part) for part in forwarded_owner.split(":", 1))
+    except ValueError:
+        return None
+    return {"id": token_id, "usuario_id": usuario_id, "token": token, "ativo": True}
+
+
 def is_admin(user: dict) -> bool:
     """Check if user has admin/superadmin role."""
     return user.get("role") in ["admin", "superadmin"]
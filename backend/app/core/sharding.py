@@ -0,0 +1,53 @@
+"""
+Tenant sharding for the multi-process scale-out mode (see app/scaleout.py).
+
+Tenants (``usuario_id``) are placed on shard-owner processes with a
+consistent-hash ring, so a tenant's servers, events, bans, etc. live in
+exactly one process. Shard 0 is also the control shard: it owns users and
+agent tokens. Headers prefixed with ``X-Synex-`` are only trusted when they
+carry the per-deployment internal secret set by the front router.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+from bisect import bisect_right
+
+from app.core.config import settings
+
+CONTROL_SHARD = 0
+INTERNAL_HEADER = "x-synex-internal"
+TOKEN_OWNER_HEADER = "x-synex-token-owner"
+
+
+class HashRing:
+    def __init__(self, shards: int, vnodes: int = 128) -> None:
+        self.shards = shards
+        points = []
+        for shard in range(shards):
+            for v in range(vnodes):
+                points.append((self._hash(f"shard-{shard}-{v}"), shard))
+        points.sort()
+        self._keys = [p for p, _ in points]
+        self._owners = [s for _, s in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+    def owner(self, usuario_id: int) -> int:
+        if self.shards <= 1:
+            return CONTROL_SHARD
+        idx = bisect_right(self._keys, self._hash(f"tenant-{usuario_id}"))
+        return self._owners[idx % len(self._owners)]
+
+
+def sharding_enabled() -> bool:
+    return settings.shard_count > 1
+
+
+def is_internal_request(secret: str | None) -> bool:
+    """True when the request came from the front router of this deployment."""
+    expected = settings.shard_internal_secret
+    return bool(expected and secret and hmac.compare_digest(secret, expected))
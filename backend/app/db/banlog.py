@@ -0,0 +1,93 @@
+"""
+Versioned per-tenant ban log for agent ban-list sync.
+
+Every ban and unban/expiry bumps the tenant's ban version and appends
+``(version, op, ip)`` to its log. An agent reports the cursor it last
+applied and gets back only the net adds and removes since then, at a cost
+proportional to the number of changes. It gets a full snapshot of the
+active set instead when its cursor cannot be served incrementally:
+
+* first sync (empty cursor);
+* cursor from another process lifetime (versions restart with the process,
+  so the cursor carries a per-process epoch);
+* cursor older than the trimmed part of the log;
+* more changes pending than the snapshot would hold anyway.
+
+The store calls ``record`` and ``diff`` while holding its ban lock, so a
+snapshot and the version it is tagged with always agree.
+
+A ban scoped to one server is only sent to that server's agent: ``diff``
+takes a ``visible`` predicate that filters the adds and the snapshot.
+Removes always go out; for an IP the agent never had, they are no-ops.
+"""
+
+from __future__ import annotations
+
+import os
+from bisect import bisect_right
+from typing import Callable, Iterable
+
+_EPOCH = os.urandom(4).hex()
+
+# (version, op, ip), op is "add" or "remove"
+BanChange = tuple[int, str, str]
+
+
+class BanLog:
+    def __init__(self, max_per_tenant: int) -> None:
+        self.max_per_tenant = max_per_tenant
+        self._versions: dict[int, int] = {}
+        self._logs: dict[int, list[BanChange]] = {}
+        self._trimmed: dict[int, int] = {}  # usuario_id -> highest version dropped
+
+    def cursor(self, usuario_id: int) -> str:
+        return f"{_EPOCH}.{self._versions.get(usuario_id, 0)}"
+
+    def record(self, usuario_id: int, op: str, ip: str) -> None:
+        version = self._versions.get(usuario_id, 0) + 1
+        self._versions[usuario_id] = version
+        log = self._logs.setdefault(usuario_id, [])
+        log.append((version, op, ip))
+        # Trim in chunks so the amortized cost per write stays O(1)
+        if len(log) > self.max_per_tenant + self.max_per_tenant // 4:
+            drop = len(log) - self.max_per_tenant
+            self._trimmed[usuario_id] = log[drop - 1][0]
+            del log[:drop]
+
+    def diff(
+        self,
+        usuario_id: int,
+        cursor: str,
+        active: Iterable[str],
+        active_count: int,
+        visible: Callable[[str], bool] | None = None,
+    ) -> dict:
+        """``{"cursor", "full", "add", "remove"}`` bringing an agent at ``cursor`` up to date."""
+        current = self._versions.get(usuario_id, 0)
+        epoch, _, raw = cursor.partition(".")
+        version = int(raw) if epoch == _EPOCH and raw.isdigit() else -1
+        if version == current:
+            return {"cursor": self.cursor(usuario_id), "full": False, "add": [], "remove": []}
+
+        log = self._logs.get(usuario_id, [])
+        if 0 <= version < current and version >= self._trimmed.get(usuario_id, 0):
+            start = bisect_right(log, version, key=lambda c: c[0])
+            if len(log) - start <= active_count:
+                net: dict[str, str] = {}
+                for _, op, ip in log[start:]:
+                    net.pop(ip, None)  # keep dict order = order of last change
+                    net[ip] = op
+                return {
+                    "cursor": self.cursor(usuario_id),
+                    "full": False,
+                    "add": [ip for ip, op in net.items() if op == "add" and (visible is None or visible(ip))],
+                    "remove": [ip for ip, op in net.items() if op == "remove"],
+                }
+        add = list(active) if visible is None else [ip for ip in active if visible(ip)]
+        return {"cursor": self.cursor(usuario_id), "full": True, "add": add, "remove": []}
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "tenants": len(self._versions),
+            "records": sum(len(log) for log in self._logs.values()),
+        }
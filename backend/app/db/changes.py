@@ -0,0 +1,104 @@
+"""
+Per-tenant changes feed for polling clients.
+
+Every write to a tracked collection (events, alerts, bans, server status)
+is appended to the owning tenant's log under a global, monotonically
+increasing sequence number.  A client asks for "everything after seq N"
+and pays O(log n + new records); long-poll callers park on an asyncio
+event that the writer wakes up from whatever thread it runs on.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from bisect import bisect_right
+from typing import Any
+
+# (seq, kind, op, data)
+Change = tuple[int, str, str, dict[str, Any]]
+
+
+class ChangeFeed:
+    def __init__(self, max_per_tenant: int) -> None:
+        self.max_per_tenant = max_per_tenant
+        self._seq = 0
+        self._logs: dict[int, list[Change]] = {}
+        self._trimmed: dict[int, int] = {}  # usuario_id -> highest seq dropped
+        self._waiters: dict[int, set[tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def record(self, usuario_id: int, kind: str, op: str, data: dict[str, Any]) -> int:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            log = self._logs.setdefault(usuario_id, [])
+            log.append((seq, kind, op, data))
+            # Trim in chunks so the amortized cost per write stays O(1)
+            if len(log) > self.max_per_tenant + self.max_per_tenant // 4:
+                drop = len(log) - self.max_per_tenant
+                self._trimmed[usuario_id] = log[drop - 1][0]
+                del log[:drop]
+            waiters = self._waiters.pop(usuario_id, None)
+        if waiters:
+            for loop, ev in waiters:
+                loop.call_soon_threadsafe(ev.set)
+        return seq
+
+    def since(
+        self,
+        usuario_id: int,
+        since: int,
+        kinds: set[str] | None = None,
+        limit: int = 500,
+    ) -> tuple[list[Change], int, bool]:
+        """Return (changes, next_cursor, reset) for records newer than ``since``.
+
+        ``reset`` is True when part of the requested range was already trimmed,
+        in which case the client should resync with the regular list endpoints.
+        """
+        with self._lock:
+            log = self._logs.get(usuario_id, [])
+            reset = since < self._trimmed.get(usuario_id, 0)
+            start = bisect_right(log, since, key=lambda c: c[0])
+            items: list[Change] = []
+            cursor = since
+            for change in log[start:]:
+                if len(items) >= limit:
+                    break
+                cursor = change[0]
+                if kinds is None or change[1] in kinds:
+                    items.append(change)
+        return items, cursor, reset
+
+    async def wait(self, usuario_id: int, since: int, timeout: float) -> None:
+        """Block until the tenant has records newer than ``since`` or timeout."""
+        ev = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ev)
+        with self._lock:
+            log = self._logs.get(usuario_id)
+            if log and log[-1][0] > since:
+                return
+            self._waiters.setdefault(usuario_id, set()).add(waiter)
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                pending = self._waiters.get(usuario_id)
+                if pending is not None:
+                    pending.discard(waiter)
+                    if not pending:
+                        del self._waiters[usuario_id]
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "tenants": len(self._logs),
+            "records": sum(len(log) for log in self._logs.values()),
+            "waiters": sum(len(w) for w in self._waiters.values()),
+        }
@@ -6,8 +6,28 @@ This replaces scattered _fake / hardcoded lists.
 """
 
 from __future__ import annotations
-from datetime import datetime, timezone
-from typing import Any
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from ipaddress import ip_network
+from itertools import count, islice
+from queue import Empty, SimpleQueue
+from socket import AF_INET, AF_INET6, inet_pton
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from app.core.config import settings
+from app.core.fastjson import fragment_cache_entries, invalidate_fragment
+from app.core.http_cache import render_cache
+from app.core.metrics import ingest_sampling_active, observe_rule_eval
+from app.db.banlog import BanLog
+from app.db.changes import ChangeFeed
+from app.services.correlation import HOSTILE_TYPES, CorrelationEngine, Finding
+from app.services.geoip import geoip
+from app.services.search import SearchIndex
+from app.services.sketches import AttackStats
 
 # ── Helpers ───────────────────────────────────────────────────────────
 _counters: dict[str, int] = {}
@@ -15,16 +35,70 @@ _counters: dict[str, int] = {}
 
 def next_id(collection: str) -> int:
     _counters[collection] = _counters.get(collection, 0) + 1
-    return _counters[collection]
+    # Interleave ids across shards so they stay unique fleet-wide
+    return (_counters[collection] - 1) * settings.shard_count + settings.shard_index + 1
 
 
 def now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def _created(record: dict) -> datetime:
+    return record["criado_em"]
+
+
+def _iter_time_range(
+    records: list[dict],
+    since: datetime | None,
+    until: datetime | None,
+    newest_first: bool,
+) -> Iterator[dict]:
+    """Records of an append-only, criado_em-ordered list within [since, until].
+
+    Walks by position over the list object captured at call time, so rows
+    appended meanwhile are ignored and nothing is copied.
+    """
+    lo = bisect_left(records, since, key=_created) if since else 0
+    hi = bisect_right(records, until, key=_created) if until else len(records)
+    positions = range(hi - 1, lo - 1, -1) if newest_first else range(lo, hi)
+    for i in positions:
+        yield records[i]
+
+
+# Per-tenant, per-collection write counters behind the list endpoints' ETags.
+# Tenant None holds global rows (automation rules shared by everyone).
+_versions: dict[tuple[int | None, str], int] = {}
+
+
+def bump_version(usuario_id: int | None, collection: str) -> None:
+    key = (usuario_id, collection)
+    _versions[key] = _versions.get(key, 0) + 1
+
+
+def collection_version(usuario_id: int, collection: str) -> int:
+    # Both counters only grow, so their sum changes whenever either does
+    return _versions.get((usuario_id, collection), 0) + _versions.get((None, collection), 0)
+
+
+# ── Changes feed ─────────────────────────────────────────────────────
+# Sequence-numbered log of writes per tenant, consumed by GET /changes
+change_feed = ChangeFeed(settings.changes_feed_max_per_tenant)
+
+
 # ── Servers ───────────────────────────────────────────────────────────
 # Populated by agent heartbeats
 servers: list[dict[str, Any]] = []
+_servers_by_key: dict[tuple[int, str], dict[str, Any]] = {}  # (token_id, hostname) -> server
+
+# Liveness: every server sits in exactly one of these, keyed by id and ordered
+# by last heartbeat. All servers share the same timeouts, so the oldest
+# heartbeat is always at the front: expiry pops from the front until it finds
+# a live one, and a heartbeat moves its server to the back. Both are O(1), so
+# there is no periodic full scan and no heap.
+_live: OrderedDict[int, dict[str, Any]] = OrderedDict()  # status "online"
+_stale: OrderedDict[int, dict[str, Any]] = OrderedDict()  # status "stale"
+_liveness_lock = Lock()
+_offline_alerts: dict[int, int] = {}  # servidor_id -> open agent_offline alert id
 
 
 def upsert_server(
@@ -40,10 +114,7 @@ def upsert_server(
     conns: int = 0,
     open_ports: list[int] | None = None,
 ) -> dict:
-    existing = next(
-        (s for s in servers if s["token_id"] == token_id and s["hostname"] == hostname),
-        None,
-    )
+    existing = _servers_by_key.get((token_id, hostname))
     if existing:
         existing.update(
             ip_publico=ip_publico,
@@ -54,9 +125,14 @@ def upsert_server(
             uptime=uptime,
             conns=conns,
             open_ports=open_ports or [],
-            status="online",
-            ultimo_heartbeat=now(),
         )
+        previous = _mark_alive(existing)
+        invalidate_fragment("servers", existing["id"])
+        bump_version(usuario_id, "servers")
+        if previous != "online":
+            change_feed.record(usuario_id, "server", "status", dict(existing))
+            if previous == "offline":
+                _recover_server(existing)
         return existing
 
     srv = {
@@ -77,11 +153,110 @@ def upsert_server(
         "criado_em": now(),
     }
     servers.append(srv)
+    _servers_by_key[(token_id, hostname)] = srv
+    _mark_alive(srv)
+    bump_version(usuario_id, "servers")
+    change_feed.record(usuario_id, "server", "create", dict(srv))
     return srv
 
 
+def _mark_alive(srv: dict) -> str:
+    """Record a heartbeat: online, and to the back of _live. Returns the previous status.
+
+    Status and ultimo_heartbeat only change under the lock, so expiry either
+    sees this heartbeat or finishes its flip before it and we see "stale"/"offline".
+    """
+    with _liveness_lock:
+        previous = srv["status"]
+        srv["status"] = "online"
+        srv["ultimo_heartbeat"] = now()
+        _stale.pop(srv["id"], None)
+        _live.pop(srv["id"], None)
+        _live[srv["id"]] = srv
+    return previous
+
+
+def _publish_server_status(srv: dict) -> None:
+    invalidate_fragment("servers", srv["id"])
+    bump_version(srv["usuario_id"], "servers")
+    change_feed.record(srv["usuario_id"], "server", "status", dict(srv))
+
+
+def expire_heartbeats() -> int:
+    """Move servers that missed their heartbeats to stale, then offline.
+
+    Cheap enough to call before every read of server status: with nothing
+    to expire it looks at two dict heads and returns.
+    """
+    ts = now().timestamp()
+    stale_before = ts - settings.heartbeat_stale_after_seconds
+    offline_before = ts - settings.heartbeat_offline_after_seconds
+    went_stale, went_offline = [], []
+    with _liveness_lock:
+        while _live:
+            srv = next(iter(_live.values()))
+            if srv["ultimo_heartbeat"].timestamp() >= stale_before:
+                break
+            _live.popitem(last=False)
+            # Appended in heartbeat order, so _stale stays sorted too
+            _stale[srv["id"]] = srv
+            srv["status"] = "stale"
+            went_stale.append(srv)
+        while _stale:
+            srv = next(iter(_stale.values()))
+            if srv["ultimo_heartbeat"].timestamp() >= offline_before:
+                break
+            _stale.popitem(last=False)
+            srv["status"] = "offline"
+            went_offline.append((srv, srv["ultimo_heartbeat"]))
+    for srv in went_stale:
+        _publish_server_status(srv)
+    for srv, last_seen in went_offline:
+        _publish_server_status(srv)
+        add_event(
+            srv["usuario_id"], srv["id"], srv["hostname"], "agent_offline", "critical",
+            f"Agente em {srv['hostname']} sem heartbeat há {int(ts - last_seen.timestamp())}s",
+        )
+        alert = add_alert(
+            srv["usuario_id"], srv["id"], srv["hostname"],
+            titulo=f"Servidor {srv['hostname']} offline",
+            severidade="critical",
+            mensagem=f"Último heartbeat em {last_seen.isoformat()}.",
+        )
+        with _liveness_lock:
+            still_offline = srv["status"] == "offline"
+            if still_offline:
+                _offline_alerts[srv["id"]] = alert["id"]
+        if not still_offline:
+            # A heartbeat landed while the alert was being raised and its
+            # recovery found nothing to resolve yet
+            resolve_alert(alert["id"])
+    return len(went_stale) + len(went_offline)
+
+
+def _recover_server(srv: dict) -> None:
+    alert_id = _offline_alerts.pop(srv["id"], None)
+    if alert_id is not None:
+        resolve_alert(alert_id)
+    add_event(
+        srv["usuario_id"], srv["id"], srv["hostname"], "agent_online", "info",
+        f"Agente em {srv['hostname']} voltou a enviar heartbeats",
+    )
+
+
 # ── Events / Logs ────────────────────────────────────────────────────
 events: list[dict[str, Any]] = []
+# Per-tenant time index (append order == criado_em order)
+_events_by_user: dict[int, list[dict[str, Any]]] = {}
+# Retention swaps a tenant's list for a trimmed copy from a worker thread;
+# appends take this lock too so none lands in the old list after the copy
+_events_lock = Lock()
+# Full-text index over mensagem/origem_ip/payload, backing /events/search
+event_search = SearchIndex()
+# Retention runs from the maintenance loop, never on the ingest path, and
+# only once the oldest event is this far past the cutoff, so each pass drops
+# about an hour of events at once instead of a sliver every few seconds.
+RETENTION_GRANULARITY_SECONDS = 3600
 
 
 def add_event(
@@ -93,7 +268,11 @@ def add_event(
     mensagem: str,
     origem_ip: str | None = None,
     payload: dict | None = None,
+    coletado_em: float | None = None,
 ) -> dict:
+    if coletado_em is not None:
+        # criado_em is ingest time (the event log is append-ordered); keep when the agent saw it
+        payload = {**(payload or {}), "coletado_em": coletado_em}
     ev = {
         "id": next_id("events"),
         "usuario_id": usuario_id,
@@ -103,16 +282,94 @@ def add_event(
         "severidade": severidade,
         "mensagem": mensagem,
         "origem_ip": origem_ip,
+        "geo": geoip.lookup(origem_ip),
         "payload": payload or {},
         "criado_em": now(),
     }
-    events.append(ev)
-    _evaluate_automation_rules(ev)
+    with _events_lock:
+        events.append(ev)
+        _events_by_user.setdefault(usuario_id, []).append(ev)
+    event_search.add(ev)
+    attack_stats.observe_event(ev)
+    change_feed.record(usuario_id, "event", "create", ev)
+    _evaluate_automation_rules(ev, coletado_em)
+    # The correlator assumes arrival order; records replayed from an agent's
+    # spool only reach it while they are still inside its window
+    if settings.correlation_enabled and (
+        coletado_em is None or ev["criado_em"].timestamp() - coletado_em <= settings.correlation_window_seconds
+    ):
+        finding = correlator.observe(ev)
+        if finding is not None:
+            _apply_finding(finding, ev)
     return ev
 
 
+def apply_event_retention() -> int:
+    """Prune events past EVENT_RETENTION_DAYS once a full granule has expired; returns how many."""
+    if settings.event_retention_days <= 0 or not events:
+        return 0
+    cutoff = now().timestamp() - settings.event_retention_days * 86400
+    if events[0]["criado_em"].timestamp() > cutoff - RETENTION_GRANULARITY_SECONDS:
+        return 0
+    return prune_events(cutoff)
+
+
+def prune_events(cutoff: float) -> int:
+    """Drop events created before ``cutoff`` (epoch seconds) from the log and its indexes."""
+    if not events or events[0]["criado_em"].timestamp() >= cutoff:
+        return 0
+    cutoff_dt = datetime.fromtimestamp(cutoff, timezone.utc)
+    k = bisect_left(events, cutoff_dt, key=_created)
+    with _events_lock:
+        del events[:k]
+    for uid in list(_events_by_user):
+        # Per tenant, so ingest waits for one list copy at most
+        with _events_lock:
+            lst = _events_by_user[uid]
+            i = bisect_left(lst, cutoff_dt, key=_created)
+            if i == len(lst):
+                del _events_by_user[uid]
+            elif i:
+                # New list object: exports already walking the old one finish undisturbed
+                _events_by_user[uid] = lst[i:]
+    event_search.prune(cutoff)
+    return k
+
+
+def tenant_events(usuario_id: int) -> list[dict]:
+    return _events_by_user.get(usuario_id, [])
+
+
+def iter_events(
+    usuario_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    tipo: str | None = None,
+    severidade: str | None = None,
+    servidor_id: int | None = None,
+    ip_match: Callable[[str | None], bool] | None = None,
+    newest_first: bool = True,
+) -> Iterator[dict]:
+    for ev in _iter_time_range(tenant_events(usuario_id), since, until, newest_first):
+        if tipo is not None and ev["tipo"] != tipo:
+            continue
+        if severidade is not None and ev["severidade"] != severidade:
+            continue
+        if servidor_id is not None and ev["servidor_id"] != servidor_id:
+            continue
+        if ip_match is not None and not ip_match(ev["origem_ip"]):
+            continue
+        yield ev
+
+
 # ── Security: Login Attempts ─────────────────────────────────────────
 login_attempts: list[dict[str, Any]] = []
+_login_attempts_by_user: dict[int, list[dict[str, Any]]] = {}
+# Running [total, failed, suspicious] per tenant, so list headers don't rescan the log
+_login_totals: dict[int, list[int]] = {}
+_SUSPICIOUS_USERS = ("root", "admin")
+# Top-K / distinct-count sketches behind /security/stats
+attack_stats = AttackStats(settings.attack_stats_top_k, settings.attack_stats_hll_precision)
 
 
 def add_login_attempt(
@@ -123,6 +380,7 @@ def add_login_attempt(
     origem_ip: str,
     method: str,
     success: bool,
+    coletado_em: float | None = None,
 ) -> dict:
     attempt = {
         "id": next_id("login_attempts"),
@@ -131,11 +389,21 @@ def add_login_attempt(
         "hostname": hostname,
         "user": user,
         "origem_ip": origem_ip,
+        "geo": geoip.lookup(origem_ip),
         "method": method,
         "success": success,
         "criado_em": now(),
+        "coletado_em": coletado_em,  # epoch the agent saw it, for attempts replayed from its spool
     }
     login_attempts.append(attempt)
+    _login_attempts_by_user.setdefault(usuario_id, []).append(attempt)
+    totals = _login_totals.setdefault(usuario_id, [0, 0, 0])
+    totals[0] += 1
+    if not success:
+        totals[1] += 1
+    elif user in _SUSPICIOUS_USERS:
+        totals[2] += 1
+    attack_stats.observe_login(attempt)
 
     # Auto-event for failed attempts
     sev = "info" if success else "warning"
@@ -147,12 +415,76 @@ def add_login_attempt(
         severidade=sev,
         mensagem=f"{'Successful' if success else 'Failed'} login as '{user}' from {origem_ip} via {method}",
         origem_ip=origem_ip,
+        coletado_em=coletado_em,
     )
     return attempt
 
 
+def tenant_login_attempts(usuario_id: int) -> list[dict]:
+    return _login_attempts_by_user.get(usuario_id, [])
+
+
+def login_attempt_totals(usuario_id: int) -> dict[str, int]:
+    total, blocked, suspicious = _login_totals.get(usuario_id, (0, 0, 0))
+    return {"total": total, "blocked": blocked, "suspicious": suspicious}
+
+
+def iter_login_attempts(
+    usuario_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    servidor_id: int | None = None,
+    ip_match: Callable[[str | None], bool] | None = None,
+    success: bool | None = None,
+    newest_first: bool = True,
+) -> Iterator[dict]:
+    for attempt in _iter_time_range(tenant_login_attempts(usuario_id), since, until, newest_first):
+        if servidor_id is not None and attempt["servidor_id"] != servidor_id:
+            continue
+        if ip_match is not None and not ip_match(attempt["origem_ip"]):
+            continue
+        if success is not None and attempt["success"] != success:
+            continue
+        yield attempt
+
+
 # ── Banned IPs ────────────────────────────────────────────────────────
+# banned_ips is the full history. Active bans are also indexed per tenant
+# and IP, and bans with an expiry sit in a min-heap of (expira_em, id, ban).
+# Unbanned entries stay in the heap and are skipped when they surface, so
+# neither unban nor expiry ever scans the table.
 banned_ips: list[dict[str, Any]] = []
+_bans_by_user: dict[int, list[dict[str, Any]]] = {}
+_active_bans: dict[int, dict[str, dict[str, Any]]] = {}  # usuario_id -> ip -> ban
+# Active CIDR bans, checked only when the exact lookup misses, grouped by
+# prefix: usuario_id -> (ip version, netmask as int) -> network address -> ban.
+# A lookup is one dict probe per distinct prefix length, not per CIDR.
+_banned_networks: dict[int, dict[tuple[int, int], dict[int, dict[str, Any]]]] = {}
+_ban_deadlines: list[tuple[float, int, dict[str, Any]]] = []
+_bans_lock = Lock()
+ban_log = BanLog(settings.ban_log_max_per_tenant)
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+PERMANENT_BAN = ("permanente", "permanent", "never", "0")
+
+
+def parse_ban_duration(expira: str) -> float | None:
+    """Seconds for "30m", "24h", "7d", ...; None for a permanent ban. Raises ValueError."""
+    text = expira.strip().lower()
+    if text in PERMANENT_BAN:
+        return None
+    amount, unit = text[:-1].strip(), text[-1:]
+    if unit not in _DURATION_UNITS or not amount.isdigit() or int(amount) <= 0:
+        raise ValueError(f"invalid ban duration {expira!r}; use e.g. 30m, 24h, 7d or permanente")
+    return int(amount) * _DURATION_UNITS[unit]
+
+
+def tenant_bans(usuario_id: int) -> list[dict]:
+    return _bans_by_user.get(usuario_id, [])
+
+
+def active_bans(usuario_id: int) -> list[dict]:
+    expire_bans()
+    return list(_active_bans.get(usuario_id, {}).values())
 
 
 def ban_ip(
@@ -164,33 +496,222 @@ def ban_ip(
     origem: str = "Automático",
     expira: str | None = None,
 ) -> dict:
-    # avoid duplicates
-    existing = next((b for b in banned_ips if b["ip"] == ip and b["usuario_id"] == usuario_id and b["ativo"]), None)
+    # avoid duplicates: one active ban per (tenant, IP). A source now banned
+    # on a second server gets its existing ban widened to the whole tenant.
+    existing = _active_bans.get(usuario_id, {}).get(ip)
     if existing:
+        if existing["servidor_id"] is not None and existing["servidor_id"] != servidor_id:
+            return widen_ban(existing, motivo, origem, expira or "24h")
         return existing
 
+    expira = expira or "24h"
+    try:
+        ttl = parse_ban_duration(expira)
+    except ValueError:
+        # Rule durations predate validation; fall back to the old default
+        expira, ttl = "24h", 86400
+    criado_em = now()
     entry = {
         "id": next_id("banned_ips"),
         "usuario_id": usuario_id,
         "servidor_id": servidor_id,
         "hostname": hostname,
         "ip": ip,
+        "geo": geoip.lookup(ip),
         "motivo": motivo,
         "origem": origem,
-        "expira": expira or "24h",
+        "expira": expira,
+        "expira_em": criado_em + timedelta(seconds=ttl) if ttl is not None else None,
         "ativo": True,
-        "criado_em": now(),
+        "desativado_em": None,
+        "bloqueios": 0,  # heartbeat items dropped because of this ban
+        "ultimo_bloqueio": None,
+        "criado_em": criado_em,
     }
-    banned_ips.append(entry)
+    network = _parse_network(ip)
+    with _bans_lock:
+        banned_ips.append(entry)
+        _bans_by_user.setdefault(usuario_id, []).append(entry)
+        _active_bans.setdefault(usuario_id, {})[ip] = entry
+        if network is not None:
+            version, mask, base = network
+            _banned_networks.setdefault(usuario_id, {}).setdefault((version, mask), {})[base] = entry
+        ban_log.record(usuario_id, "add", ip)
+        if ttl is not None:
+            heapq.heappush(_ban_deadlines, (entry["expira_em"].timestamp(), entry["id"], entry))
+    change_feed.record(usuario_id, "ban", "create", dict(entry))
     return entry
 
 
+def widen_ban(ban: dict, motivo: str, origem: str, expira: str) -> dict:
+    """Make an active per-server ban tenant-wide and extend it to at least ``expira`` from now."""
+    try:
+        ttl = parse_ban_duration(expira)
+    except ValueError:
+        expira, ttl = "24h", 86400
+    expira_em = now() + timedelta(seconds=ttl) if ttl is not None else None
+    with _bans_lock:
+        if not ban["ativo"]:
+            return ban
+        if ban["servidor_id"] is not None:
+            ban.update(servidor_id=None, hostname="*", motivo=motivo, origem=origem)
+            # Scope changed: agents that skipped the per-server ban pick it up
+            ban_log.record(ban["usuario_id"], "add", ban["ip"])
+        if ban["expira_em"] is not None and (expira_em is None or expira_em > ban["expira_em"]):
+            ban["expira"] = expira
+            ban["expira_em"] = expira_em
+            if expira_em is not None:
+                heapq.heappush(_ban_deadlines, (expira_em.timestamp(), ban["id"], ban))
+    change_feed.record(ban["usuario_id"], "ban", "update", dict(ban))
+    return ban
+
+
+def _deactivate_ban(ban: dict) -> None:
+    # Caller holds _bans_lock
+    ban["ativo"] = False
+    ban["desativado_em"] = now()
+    tenant = _active_bans.get(ban["usuario_id"])
+    if tenant is not None and tenant.get(ban["ip"]) is ban:
+        del tenant[ban["ip"]]
+        if not tenant:
+            del _active_bans[ban["usuario_id"]]
+        network = _parse_network(ban["ip"])
+        groups = _banned_networks.get(ban["usuario_id"])
+        if network is not None and groups is not None:
+            version, mask, base = network
+            nets = groups.get((version, mask))
+            if nets is not None and nets.get(base) is ban:
+                del nets[base]
+                if not nets:
+                    del groups[(version, mask)]
+                    if not groups:
+                        del _banned_networks[ban["usuario_id"]]
+        ban_log.record(ban["usuario_id"], "remove", ban["ip"])
+
+
 def unban_ip(usuario_id: int, ip: str) -> bool:
-    for b in banned_ips:
-        if b["ip"] == ip and b["usuario_id"] == usuario_id and b["ativo"]:
-            b["ativo"] = False
-            return True
-    return False
+    with _bans_lock:
+        ban = _active_bans.get(usuario_id, {}).get(ip)
+        if ban is None:
+            return False
+        _deactivate_ban(ban)
+    change_feed.record(usuario_id, "ban", "update", dict(ban))
+    return True
+
+
+def ban_changes(usuario_id: int, cursor: str, servidor_id: int | None = None) -> dict:
+    """Adds/removes since an agent's ban cursor, or a full snapshot; see app.db.banlog.
+
+    With ``servidor_id``, bans scoped to another server are left out: only
+    tenant-wide bans and that server's own reach its agent.
+    """
+    expire_bans()
+    with _bans_lock:
+        active = _active_bans.get(usuario_id, {})
+        visible = None
+        if servidor_id is not None:
+            def visible(ip: str) -> bool:
+                ban = active.get(ip)
+                return ban is not None and ban["servidor_id"] in (None, servidor_id)
+        return ban_log.diff(usuario_id, cursor, active.keys(), len(active), visible)
+
+
+def _parse_network(ip: str) -> tuple[int, int, int] | None:
+    if "/" not in ip:
+        return None
+    try:
+        network = ip_network(ip, strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.netmask), int(network.network_address)
+
+
+def _network_ban(groups: dict, ip: str) -> dict[str, Any] | None:
+    # inet_pton costs ~0.25 us against ~2.5 us for ipaddress.ip_address
+    try:
+        version, value = 4, int.from_bytes(inet_pton(AF_INET, ip))
+    except OSError:
+        try:
+            version, value = 6, int.from_bytes(inet_pton(AF_INET6, ip))
+        except OSError:
+            return None
+    for (net_version, mask), nets in list(groups.items()):
+        if net_version == version:
+            ban = nets.get(value & mask)
+            if ban is not None:
+                return ban
+    return None
+
+
+# Heartbeat items from sources the tenant already bans are counted on the ban
+# instead of stored; one in every N (BANNED_TRAFFIC_SAMPLE_RATE) is still kept.
+_blocked_ticks = count()
+_blocked_keep_every = (
+    max(1, round(1 / settings.banned_traffic_sample_rate)) if settings.banned_traffic_sample_rate > 0 else 0
+)
+
+
+def filter_banned(
+    usuario_id: int, servidor_id: int, items: list[dict], key: str, hostile: Callable[[dict], bool]
+) -> tuple[list[dict], int]:
+    """Drop hostile heartbeat items whose ``key`` IP is actively banned; returns (items to ingest, blocked).
+
+    Only items for which ``hostile(item)`` is true are dropped: a successful
+    login from a banned source is a compromise signal and always goes through.
+    A ban scoped to another server does not count: that traffic is not
+    blocked here, and the correlator needs it to widen the ban.
+    """
+    bans = _active_bans.get(usuario_id)
+    if not bans or not items:
+        return items, 0
+    networks = _banned_networks.get(usuario_id)
+    ts = now()
+    kept = []
+    blocked = 0
+    for item in items:
+        ip = item.get(key)
+        if not isinstance(ip, str) or not hostile(item):
+            kept.append(item)
+            continue
+        ban = bans.get(ip)
+        if ban is None and networks:
+            ban = _network_ban(networks, ip)
+        # Expired bans linger until the next expire_bans pass
+        if (
+            ban is None
+            or ban["servidor_id"] not in (None, servidor_id)
+            or (ban["expira_em"] is not None and ban["expira_em"] <= ts)
+        ):
+            kept.append(item)
+            continue
+        blocked += 1
+        ban["bloqueios"] += 1
+        ban["ultimo_bloqueio"] = ts
+        if _blocked_keep_every and next(_blocked_ticks) % _blocked_keep_every == 0:
+            kept.append(item)
+    if blocked:
+        attack_stats.observe_blocked(usuario_id, ts.timestamp(), blocked)
+    return kept, blocked
+
+
+def expire_bans() -> int:
+    """Deactivate every ban whose expira_em has passed; returns how many."""
+    ts = now().timestamp()
+    expired = []
+    with _bans_lock:
+        while _ban_deadlines and _ban_deadlines[0][0] <= ts:
+            _, _, ban = heapq.heappop(_ban_deadlines)
+            # A ban extended by widen_ban leaves its earlier deadline behind in the heap
+            if ban["ativo"] and ban["expira_em"] is not None and ban["expira_em"].timestamp() <= ts:
+                _deactivate_ban(ban)
+                expired.append(ban)
+    for ban in expired:
+        change_feed.record(ban["usuario_id"], "ban", "update", dict(ban))
+        add_audit_log(
+            ban["usuario_id"], "ban_expired", "ban", ban["ip"],
+            {"ban_id": ban["id"], "motivo": ban["motivo"], "expira_em": ban["expira_em"].isoformat()},
+        )
+    return len(expired)
 
 
 # ── Traffic ───────────────────────────────────────────────────────────
@@ -219,6 +740,7 @@ def update_traffic(
             "status": iface.get("status", "up"),
             "atualizado_em": now(),
         })
+    bump_version(usuario_id, "traffic")
 
 
 # ── Alerts ────────────────────────────────────────────────────────────
@@ -245,6 +767,8 @@ def add_alert(
         "criado_em": now(),
     }
     alerts.append(alert)
+    bump_version(usuario_id, "alerts")
+    change_feed.record(usuario_id, "alert", "create", dict(alert))
     return alert
 
 
@@ -252,6 +776,9 @@ def resolve_alert(alert_id: int) -> bool:
     for a in alerts:
         if a["id"] == alert_id:
             a["status"] = "resolvido"
+            invalidate_fragment("alerts", alert_id)
+            bump_version(a["usuario_id"], "alerts")
+            change_feed.record(a["usuario_id"], "alert", "update", dict(a))
             return True
     return False
 
@@ -348,6 +875,7 @@ def add_automation_rule(
     }
     _next_rule_id += 1
     automation_rules.append(rule)
+    bump_version(usuario_id, "automations")
     return rule
 
 
@@ -355,6 +883,7 @@ def toggle_automation_rule(rule_id: int) -> bool:
     for r in automation_rules:
         if r["id"] == rule_id:
             r["ativo"] = not r["ativo"]
+            bump_version(r["usuario_id"], "automations")
             return True
     return False
 
@@ -362,15 +891,36 @@ def toggle_automation_rule(rule_id: int) -> bool:
 # ── Automation Engine ─────────────────────────────────────────────────
 # Track failed logins per IP for brute-force detection
 _ip_fail_counters: dict[str, list[datetime]] = {}
+_FAIL_WINDOW_SECONDS = 300
+# Keys of IPs that stopped attacking are dropped every N failed-login
+# evaluations, so rotating attackers can't grow the dict without bound.
+_FAIL_SWEEP_EVERY = 1024
+_fail_evaluations = 0
+
+
+def _sweep_fail_counters(cutoff: float) -> None:
+    stale = [k for k, ts in _ip_fail_counters.items() if not ts or ts[-1].timestamp() <= cutoff]
+    for k in stale:
+        del _ip_fail_counters[k]
 
 
-def _evaluate_automation_rules(event: dict) -> None:
-    """Run automation rules against incoming events."""
+def _evaluate_automation_rules(event: dict, coletado_em: float | None = None) -> None:
+    """Run automation rules against incoming events.
+
+    Failures replayed from an agent's spool are counted at ``coletado_em``, so
+    a backlog of old attempts arriving at once does not look like a burst.
+    """
+    global _fail_evaluations
     tipo = event.get("tipo", "")
     usuario_id = event.get("usuario_id")
     servidor_id = event.get("servidor_id")
     hostname = event.get("hostname", "")
     origem_ip = event.get("origem_ip")
+    if tipo in HOSTILE_TYPES and origem_ip:
+        ban = _active_bans.get(usuario_id, {}).get(origem_ip)
+        if ban is not None and ban["servidor_id"] in (None, servidor_id):
+            return  # already banned here: nothing to escalate, and no repeat alerts
+    timed = ingest_sampling_active()
 
     for rule in automation_rules:
         if not rule["ativo"]:
@@ -379,14 +929,20 @@ def _evaluate_automation_rules(event: dict) -> None:
         if rule["usuario_id"] is not None and rule["usuario_id"] != usuario_id:
             continue
 
+        start = perf_counter() if timed else 0.0
         if rule["condicao_tipo"] == "ssh_login_failed" and tipo == "ssh_login_failed" and origem_ip:
             key = f"{usuario_id}:{origem_ip}"
             if key not in _ip_fail_counters:
                 _ip_fail_counters[key] = []
-            _ip_fail_counters[key].append(now())
+            ts = now()
+            seen = ts if coletado_em is None else datetime.fromtimestamp(min(coletado_em, ts.timestamp()), timezone.utc)
+            _ip_fail_counters[key].append(seen)
             # Keep only last 5 min
-            cutoff = now().timestamp() - 300
+            cutoff = ts.timestamp() - _FAIL_WINDOW_SECONDS
             _ip_fail_counters[key] = [t for t in _ip_fail_counters[key] if t.timestamp() > cutoff]
+            _fail_evaluations += 1
+            if _fail_evaluations % _FAIL_SWEEP_EVERY == 0:
+                _sweep_fail_counters(cutoff)
             if len(_ip_fail_counters[key]) >= rule["condicao_threshold"]:
                 ban_ip(
                     usuario_id=usuario_id,
@@ -405,7 +961,7 @@ def _evaluate_automation_rules(event: dict) -> None:
                     severidade="critical",
                     mensagem=f"IP {origem_ip} fez {len(_ip_fail_counters[key])} tentativas de login em 5 min. Banido automaticamente.",
                 )
-                _ip_fail_counters[key] = []
+                _ip_fail_counters.pop(key, None)
 
         elif rule["condicao_tipo"] == "port_scan" and tipo == "port_scan" and origem_ip:
             ban_ip(
@@ -426,6 +982,9 @@ def _evaluate_automation_rules(event: dict) -> None:
                 mensagem=f"IP {origem_ip} realizou port scanning.",
             )
 
+        if timed:
+            observe_rule_eval(rule["condicao_tipo"], perf_counter() - start)
+
 
 def _check_cpu_alerts(usuario_id: int, servidor_id: int, hostname: str, cpu: float) -> None:
     """Called during heartbeat to check CPU rules."""
@@ -458,8 +1017,115 @@ def _check_disk_alerts(usuario_id: int, servidor_id: int, hostname: str, disk: f
             )
 
 
+# ── Correlated incidents ─────────────────────────────────────────────
+correlator = CorrelationEngine(
+    settings.correlation_window_seconds,
+    settings.correlation_min_servers,
+    settings.correlation_min_failures,
+    settings.correlation_max_sources_per_tenant,
+)
+_incidents_by_user: dict[int, list[dict[str, Any]]] = {}
+_INCIDENT_TITLES = {
+    "distributed_bruteforce": "Brute-force distribuído",
+    "kill_chain": "Possível comprometimento",
+}
+
+
+def _apply_finding(finding: Finding, ev: dict) -> None:
+    """Open, update or escalate the incident for a correlated source."""
+    incident = finding.source.incident
+    if not finding.opens:
+        if incident is None:
+            return  # another heartbeat reserved it and is still opening it
+        incident["eventos"] += 1
+        incident["ultimo_em"] = ev["criado_em"]
+        # Every event of an ongoing attack lands here; only copy and publish when the spread changes
+        if len(finding.source.servers) != len(incident["servidores"]):
+            incident["servidores"] = finding.servers
+            incident["sequencia"] = finding.sequence
+            change_feed.record(finding.usuario_id, "incident", "update", dict(incident))
+        return
+
+    severidade = "critical" if finding.kind == "kill_chain" else "high"
+    titulo = f"{_INCIDENT_TITLES[finding.kind]} de {finding.ip}"
+    mensagem = (
+        f"IP {finding.ip} atingiu {len(finding.servers)} servidores; "
+        f"sequência: {' → '.join(finding.sequence)}. Banido em toda a frota."
+    )
+    motivo = f"Correlação: {_INCIDENT_TITLES[finding.kind].lower()} ({len(finding.servers)} servidores)"
+    ban = _active_bans.get(finding.usuario_id, {}).get(finding.ip)
+    if ban is not None:
+        # Usually a per-server ban from the brute-force or port-scan rule
+        ban = widen_ban(ban, motivo, "Correlação", settings.correlation_ban_duration)
+    else:
+        ban = ban_ip(
+            usuario_id=finding.usuario_id,
+            servidor_id=None,
+            hostname="*",
+            ip=finding.ip,
+            motivo=motivo,
+            origem="Correlação",
+            expira=settings.correlation_ban_duration,
+        )
+    if incident is not None:
+        # Escalation: the brute-force source went on to log in somewhere
+        incident.update(tipo=finding.kind, severidade=severidade, titulo=titulo, ultimo_em=ev["criado_em"])
+        incident["servidores"] = finding.servers
+        incident["sequencia"] = finding.sequence
+        incident["eventos"] += 1
+        change_feed.record(finding.usuario_id, "incident", "update", dict(incident))
+    else:
+        incident = {
+            "id": next_id("incidents"),
+            "usuario_id": finding.usuario_id,
+            "tipo": finding.kind,
+            "severidade": severidade,
+            "titulo": titulo,
+            "ip": finding.ip,
+            "geo": ev.get("geo"),
+            "servidores": finding.servers,
+            "sequencia": finding.sequence,
+            "eventos": 1,
+            "ban_id": ban["id"],
+            "primeiro_em": datetime.fromtimestamp(finding.source.first_seen, timezone.utc),
+            "ultimo_em": ev["criado_em"],
+            "criado_em": now(),
+        }
+        finding.source.incident = incident
+        tenant = _incidents_by_user.setdefault(finding.usuario_id, [])
+        tenant.append(incident)
+        cap = settings.correlation_max_incidents_per_tenant
+        if len(tenant) > cap + cap // 4:
+            del tenant[: len(tenant) - cap]
+        change_feed.record(finding.usuario_id, "incident", "create", dict(incident))
+    add_alert(
+        usuario_id=finding.usuario_id,
+        servidor_id=ev.get("servidor_id"),
+        hostname=ev.get("hostname", ""),
+        titulo=titulo,
+        severidade="critical",
+        mensagem=mensagem,
+    )
+
+
+def tenant_incidents(usuario_id: int) -> list[dict]:
+    return _incidents_by_user.get(usuario_id, [])
+
+
 # ── Audit Logs ──────────────────────────────────────────────────────
+# Handlers only enqueue (SimpleQueue.put never blocks or takes a lock held by
+# readers). Entries move into the log and its indexes when the next reader
+# drains the queue, or inline once the backlog reaches _AUDIT_DRAIN_AT. The
+# log and every index list stay in criado_em order, so reads never sort.
 audit_logs: list[dict[str, Any]] = []
+_audit_queue: SimpleQueue = SimpleQueue()
+_audit_drain_lock = Lock()
+_AUDIT_DRAIN_AT = 256
+_audit_by_user: dict[int, list[dict[str, Any]]] = {}
+_audit_by_action: dict[str, list[dict[str, Any]]] = {}
+# Action counts per user, plus None for all users
+_audit_action_counts: dict[int | None, dict[str, int]] = {}
+
 
 def add_audit_log(
     usuario_id: int,
@@ -468,31 +1134,93 @@ def add_audit_log(
     resource_id: str | None = None,
     details: dict[str, Any] | None = None,
     ip_address: str = "0.0.0.0",
-) -> dict:
-    log = {
-        "id": next_id("audit_logs"),
-        "usuario_id": usuario_id,
-        "action": action,  # login, logout, create, update, delete, ban_ip, etc.
-        "resource_type": resource_type,  # user, server, ban, token, etc.
-        "resource_id": resource_id,
-        "details": details or {},
-        "ip_address": ip_address,
-        "criado_em": now(),
-    }
-    audit_logs.append(log)
-    return log
+) -> None:
+    # action: login, register, create, revoke, ban_ip, ...; resource_type: user, token, ban, ...
+    _audit_queue.put((usuario_id, action, resource_type, resource_id, details or {}, ip_address, now()))
+    if _audit_queue.qsize() >= _AUDIT_DRAIN_AT:
+        drain_audit_queue()
+
+
+def drain_audit_queue() -> None:
+    if _audit_queue.empty():
+        return
+    with _audit_drain_lock:
+        while True:
+            try:
+                usuario_id, action, resource_type, resource_id, details, ip_address, criado_em = _audit_queue.get_nowait()
+            except Empty:
+                break
+            log = {
+                "id": next_id("audit_logs"),
+                "usuario_id": usuario_id,
+                "action": action,
+                "resource_type": resource_type,
+                "resource_id": resource_id,
+                "details": details,
+                "ip_address": ip_address,
+                "criado_em": criado_em,
+            }
+            audit_logs.append(log)
+            _audit_by_user.setdefault(usuario_id, []).append(log)
+            _audit_by_action.setdefault(action, []).append(log)
+            for key in (usuario_id, None):
+                counts = _audit_action_counts.setdefault(key, {})
+                counts[action] = counts.get(action, 0) + 1
+
+
+def iter_audit_logs(
+    usuario_id: int | None = None,
+    action: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    newest_first: bool = True,
+) -> Iterator[dict]:
+    """Walk the narrowest index for the filters without copying it."""
+    drain_audit_queue()
+    if usuario_id is not None and action is not None:
+        by_user = _audit_by_user.get(usuario_id, [])
+        by_action = _audit_by_action.get(action, [])
+        logs, check = (by_user, "action") if len(by_user) <= len(by_action) else (by_action, "usuario_id")
+        want = action if check == "action" else usuario_id
+    else:
+        if usuario_id is not None:
+            logs = _audit_by_user.get(usuario_id, [])
+        elif action is not None:
+            logs = _audit_by_action.get(action, [])
+        else:
+            logs = audit_logs
+        check = want = None
+    for log in _iter_time_range(logs, since, until, newest_first):
+        if check is None or log[check] == want:
+            yield log
+
+
+def get_audit_logs(
+    usuario_id: int | None = None,
+    limit: int = 100,
+    action: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> list[dict]:
+    return list(islice(iter_audit_logs(usuario_id, action, since, until), limit))
 
-def get_audit_logs(usuario_id: int | None = None, limit: int = 100) -> list[dict]:
-    logs = audit_logs
-    if usuario_id is not None:
-        logs = [log for log in logs if log["usuario_id"] == usuario_id]
-    return sorted(logs, key=lambda x: x["criado_em"], reverse=True)[:limit]
+
+def get_audit_summary(usuario_id: int | None = None) -> dict:
+    drain_audit_queue()
+    actions = dict(_audit_action_counts.get(usuario_id, {}))
+    total = sum(actions.values())
+    return {
+        "total_logs": total,
+        "actions": actions,
+        "recent_logs": min(total, 10),
+    }
 
 # ── Dashboard Stats ──────────────────────────────────────────────────
 def get_dashboard_stats(usuario_id: int) -> dict:
+    expire_heartbeats()
     user_servers = [s for s in servers if s["usuario_id"] == usuario_id]
-    user_events = [e for e in events if e["usuario_id"] == usuario_id]
-    user_banned = [b for b in banned_ips if b["usuario_id"] == usuario_id and b["ativo"]]
+    user_events = tenant_events(usuario_id)
+    user_banned = active_bans(usuario_id)
     user_alerts = [a for a in alerts if a["usuario_id"] == usuario_id and a["status"] == "ativo"]
     user_attacks = [e for e in user_events if e["severidade"] in ("critical", "warning")]
 
@@ -511,3 +1239,43 @@ def get_dashboard_stats(usuario_id: int) -> dict:
         "ram_medio": round(avg_ram, 1),
         "disco_medio": round(avg_disk, 1),
     }
+
+
+# ── Diagnostics ──────────────────────────────────────────────────────
+def structure_sizes() -> dict[str, int]:
+    """Sizes of every in-memory structure, for soak tests and leak hunting."""
+    feed = change_feed.sizes()
+    return {
+        "servers": len(servers),
+        "servers_index": len(_servers_by_key),
+        "liveness_online": len(_live),
+        "liveness_stale": len(_stale),
+        "offline_alerts": len(_offline_alerts),
+        "events": len(events),
+        "login_attempts": len(login_attempts),
+        "banned_ips": len(banned_ips),
+        "active_bans": sum(len(v) for v in _active_bans.values()),
+        "ban_deadlines": len(_ban_deadlines),
+        "banned_networks": sum(len(nets) for groups in list(_banned_networks.values()) for nets in groups.values()),
+        "ban_log_records": ban_log.sizes()["records"],
+        "traffic": len(traffic),
+        "alerts": len(alerts),
+        "automation_rules": len(automation_rules),
+        "audit_logs": len(audit_logs),
+        "events_index_tenants": len(_events_by_user),
+        "login_attempts_index_tenants": len(_login_attempts_by_user),
+        **event_search.sizes(),
+        "geoip_cache": geoip.cache_entries(),
+        "audit_queue": _audit_queue.qsize(),
+        "audit_index_users": len(_audit_by_user),
+        "audit_index_actions": len(_audit_by_action),
+        "ip_fail_counters": len(_ip_fail_counters),
+        **correlator.sizes(),
+        **attack_stats.sizes(),
+        "incidents": sum(len(v) for v in _incidents_by_user.values()),
+        "change_feed_records": feed["records"],
+        "change_feed_waiters": feed["waiters"],
+        "json_fragments": fragment_cache_entries(),
+        "collection_versions": len(_versions),
+        "render_cache": len(render_cache),
+    }
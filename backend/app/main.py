@@ -1,23 +1,62 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
+from time import perf_counter
 
-from fastapi import Depends, FastAPI, WebSocket
+from fastapi import Depends, FastAPI, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from prometheus_client import Counter, Gauge, generate_latest
-from starlette.responses import PlainTextResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
 import psutil
 import os
 
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.core.metrics import (
+    HTTP_METHODS,
+    http_in_flight,
+    http_request_duration,
+    http_requests,
+    http_response_size,
+    render_exposition,
+)
+from app.db.store import apply_event_retention, expire_bans, expire_heartbeats
 from app.middleware import enforce_rate_limit
 from app.models.schemas import HealthResponse
-from app.routers import admin, agents, alerts, audit, auth, automations, events, metrics, security, servers, tokens, traffic
+from app.routers import admin, agents, alerts, audit, auth, automations, changes, events, internal, metrics, security, servers, tokens, traffic
 
 app_start_time = datetime.now(timezone.utc)
 
 configure_logging()
+logger = logging.getLogger("synexguard.maintenance")
+
+
+async def _maintenance_loop() -> None:
+    """Background upkeep that must happen even when nobody is reading."""
+    while True:
+        await asyncio.sleep(settings.maintenance_interval_seconds)
+        try:
+            expire_heartbeats()
+            expire_bans()
+            # Rewrites the search postings when it fires; keep it off the event loop
+            await run_in_threadpool(apply_event_retention)
+        except Exception:
+            logger.exception("maintenance_failed")
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    task = asyncio.create_task(_maintenance_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+
 
-app = FastAPI(title=settings.app_name, version="1.0.0")
+app = FastAPI(title=settings.app_name, version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,16 +65,38 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Inside the metrics middleware below, so response sizes are wire sizes
+app.add_middleware(CompressionMiddleware)
 
-request_counter = Counter("node_guardian_http_requests_total", "Total HTTP requests", ["path"])
 active_alerts = Gauge("node_guardian_active_alerts", "Number of active alerts")
 
 
 @app.middleware("http")
 async def metrics_and_rate_limit(request, call_next):
-    await enforce_rate_limit(request)
-    response = await call_next(request)
-    request_counter.labels(path=request.url.path).inc()
+    start = perf_counter()
+    template = None
+    http_in_flight.inc()
+    try:
+        try:
+            await enforce_rate_limit(request)
+        except HTTPException as exc:
+            template = "rate_limited"
+            response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+        else:
+            response = await call_next(request)
+    finally:
+        http_in_flight.dec()
+
+    # The router stores the matched route in the shared scope; unmatched
+    # paths collapse into a single series.
+    if template is None:
+        template = getattr(request.scope.get("route"), "path", None) or "unmatched"
+    method = request.method if request.method in HTTP_METHODS else "OTHER"
+    http_requests.labels(method=method, route=template, status=f"{response.status_code // 100}xx").inc()
+    http_request_duration.labels(method=method, route=template).observe(perf_counter() - start)
+    content_length = response.headers.get("content-length")
+    if content_length is not None:
+        http_response_size.labels(method=method, route=template).observe(int(content_length))
     return response
 
 
@@ -88,7 +149,7 @@ def version():
 @app.get("/metrics/prometheus")
 def prometheus_metrics():
     active_alerts.set(1)
-    return PlainTextResponse(generate_latest().decode("utf-8"))
+    return Response(render_exposition(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.websocket("/ws/events")
@@ -105,6 +166,7 @@ app.include_router(auth.router, prefix=api_prefix)
 app.include_router(servers.router, prefix=api_prefix)
 app.include_router(agents.router, prefix=api_prefix)
 app.include_router(events.router, prefix=api_prefix)
+app.include_router(changes.router, prefix=api_prefix)
 app.include_router(security.router, prefix=api_prefix)
 app.include_router(metrics.router, prefix=api_prefix)
 app.include_router(traffic.router, prefix=api_prefix)
@@ -113,4 +175,4 @@ app.include_router(automations.router, prefix=api_prefix)
 app.include_router(tokens.router, prefix=api_prefix)
 app.include_router(admin.router, prefix=api_prefix)
 app.include_router(audit.router, prefix=api_prefix)
-app.include_router(audit.router, prefix=api_prefix)
+app.include_router(internal.router, prefix=api_prefix)
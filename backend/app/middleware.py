@@ -1,4 +1,5 @@
 from collections import defaultdict
+from math import ceil
 from time import time
 
 from fastapi import HTTPException, Request
@@ -6,10 +7,30 @@ from fastapi import HTTPException, Request
 from app.core.config import settings
 
 
+WINDOW_SECONDS = 60
+
+
+def _retry_after(seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, ceil(seconds)))}
+
+
 class EnhancedRateLimiter:
     def __init__(self) -> None:
         self.requests: dict[str, list[float]] = defaultdict(list)
         self.blocked_ips: dict[str, float] = {}  # IP -> blocked_until_timestamp
+        self._next_sweep = 0.0
+
+    def sweep(self, now: float) -> None:
+        """Forget clients idle for a full window and blocks that have expired."""
+        cutoff = now - WINDOW_SECONDS
+        for ip in [ip for ip, ts in self.requests.items() if not ts or ts[-1] <= cutoff]:
+            del self.requests[ip]
+        for ip in [ip for ip, until in self.blocked_ips.items() if until <= now]:
+            del self.blocked_ips[ip]
+        self._next_sweep = now + WINDOW_SECONDS
+
+    def sizes(self) -> dict[str, int]:
+        return {"rate_limiter_clients": len(self.requests), "rate_limiter_blocked": len(self.blocked_ips)}
 
     def is_blocked(self, client_ip: str) -> bool:
         if client_ip in self.blocked_ips:
@@ -31,12 +52,14 @@ class EnhancedRateLimiter:
         if self.is_blocked(client_ip):
             raise HTTPException(
                 status_code=429, 
-                detail="IP temporariamente bloqueado devido a excesso de requisições"
+                detail="IP temporariamente bloqueado devido a excesso de requisições",
+                headers=_retry_after(self.blocked_ips[client_ip] - time()),
             )
             
         now = time()
-        window_seconds = 60
-        cutoff_time = now - window_seconds
+        if now >= self._next_sweep:
+            self.sweep(now)
+        cutoff_time = now - WINDOW_SECONDS
         
         # Clean old entries and count recent requests
         entries = [ts for ts in self.requests[client_ip] if ts > cutoff_time]
@@ -54,11 +77,14 @@ class EnhancedRateLimiter:
                 self.block_ip(client_ip, 15)
                 raise HTTPException(
                     status_code=429, 
-                    detail="IP bloqueado por 15 minutos devido a abuso"
+                    detail="IP bloqueado por 15 minutos devido a abuso",
+                    headers=_retry_after(self.blocked_ips[client_ip] - now),
                 )
+            # A slot frees up once enough of the window's oldest requests age out
             raise HTTPException(
                 status_code=429, 
-                detail=f"Rate limit excedido: {len(entries)}/{limit} req/min"
+                detail=f"Rate limit excedido: {len(entries)}/{limit} req/min",
+                headers=_retry_after(entries[-limit] + WINDOW_SECONDS - now),
             )
             
         entries.append(now)
@@ -68,6 +94,11 @@ class EnhancedRateLimiter:
 rate_limiter = EnhancedRateLimiter()
 
 
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
 async def enforce_rate_limit(request: Request):
-    client_ip = request.client.host if request.client else "unknown"
-    rate_limiter.check(client_ip, str(request.url.path))
+    if not settings.rate_limit_enabled:
+        return
+    rate_limiter.check(client_ip(request), str(request.url.path))
@@ -90,6 +90,7 @@ class BannedIpIn(BaseModel):
     ip: str
     motivo: str = "manual"
     origem: str = "manual"
+    expira: str = "24h"  # 30m, 24h, 7d, ... or "permanente"
 
 
 # ── Automations ──────────────────────────────────────────────────────
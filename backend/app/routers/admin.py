@@ -1,12 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel
+from starlette.responses import PlainTextResponse
 
 from app.core.security import (
     get_agent_tokens_db,
     get_current_user,
     get_users_db,
     require_roles,
+    revoke_user_tokens,
 )
+from app.db.store import add_audit_log
+from app.middleware import client_ip
+from app.services.profiler import ProfilerBusy, profiler
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -57,7 +64,7 @@ def admin_list_users(user=Depends(get_current_user)):
 
 
 @router.put("/users/{user_id}", dependencies=[_superadmin])
-def admin_toggle_user(user_id: int, payload: ToggleUserIn, current=Depends(get_current_user)):
+def admin_toggle_user(user_id: int, payload: ToggleUserIn, request: Request, current=Depends(get_current_user)):
     users = get_users_db()
     target = next((u for u in users if u["id"] == user_id), None)
     if not target:
@@ -65,11 +72,17 @@ def admin_toggle_user(user_id: int, payload: ToggleUserIn, current=Depends(get_c
     if target["role"] == "superadmin":
         raise HTTPException(status_code=403, detail="Cannot modify superadmin")
     target["ativo"] = payload.ativo
+    if not payload.ativo:
+        revoke_user_tokens(user_id)
+    add_audit_log(
+        current["user_id"], "activate" if payload.ativo else "deactivate", "user", str(user_id),
+        {"email": target["email"]}, client_ip(request),
+    )
     return {"detail": f"User {'activated' if payload.ativo else 'deactivated'}"}
 
 
 @router.delete("/users/{user_id}", dependencies=[_superadmin])
-def admin_delete_user(user_id: int, current=Depends(get_current_user)):
+def admin_delete_user(user_id: int, request: Request, current=Depends(get_current_user)):
     users = get_users_db()
     tokens = get_agent_tokens_db()
     target = next((u for u in users if u["id"] == user_id), None)
@@ -80,6 +93,8 @@ def admin_delete_user(user_id: int, current=Depends(get_current_user)):
     # Remove user tokens
     tokens[:] = [t for t in tokens if t["usuario_id"] != user_id]
     users.remove(target)
+    revoke_user_tokens(user_id)
+    add_audit_log(current["user_id"], "delete", "user", str(user_id), {"email": target["email"]}, client_ip(request))
     return {"detail": "User deleted"}
 
 
@@ -111,6 +126,8 @@ def admin_list_servers(user=Depends(get_current_user)):
         token = next((t for t in tokens if t["id"] == s.get("token_id")), None)
         result.append({
             "id": s["id"],
+            "usuario_id": s.get("usuario_id"),
+            "token_id": s.get("token_id"),
             "hostname": s["hostname"],
             "ip_publico": s["ip_publico"],
             "os_info": s["os_info"],
@@ -128,3 +145,29 @@ def admin_list_servers(user=Depends(get_current_user)):
             "token_nome": token["nome"] if token else "Token removido",
         })
     return result
+
+
+# ── Profiling ────────────────────────────────────────────────────────
+@router.post("/profile", dependencies=[_superadmin], response_class=PlainTextResponse)
+async def admin_profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval_ms: float = Query(10, ge=5, le=1000),
+    user=Depends(get_current_user),
+):
+    """Sample every thread of this worker and return collapsed stacks (flamegraph input)."""
+    try:
+        result, stop = profiler.start(seconds, interval_ms / 1000)
+    except ProfilerBusy:
+        raise HTTPException(status_code=409, detail="A profiling session is already running")
+    try:
+        profile = await asyncio.wrap_future(result)
+    finally:
+        # Client went away or the request was cancelled: end the session early
+        stop.set()
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={
+            "X-Profile-Samples": str(profile.samples),
+            "X-Profile-Overhead": f"{profile.overhead:.4f}",
+        },
+    )
@@ -1,11 +1,25 @@
+import zlib
 from datetime import datetime, timezone
 from typing import Any
 
-from fastapi import APIRouter, Depends, Header, HTTPException
-from pydantic import BaseModel
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
 
-from app.core.security import get_agent_tokens_db, get_current_user
+from app.core.config import settings
+
+from app.core.metrics import (
+    begin_ingest_sample,
+    end_ingest_sample,
+    ingest_stage,
+    observe_blocked,
+    observe_heartbeat_batch,
+)
+from app.core.security import get_current_user, resolve_agent_token
 from app.db.store import (
+    ban_changes,
+    filter_banned,
     upsert_server,
     add_event,
     add_login_attempt,
@@ -13,6 +27,7 @@ from app.db.store import (
     _check_cpu_alerts,
     _check_disk_alerts,
 )
+from app.services.correlation import HOSTILE_TYPES
 
 router = APIRouter(prefix="/agents", tags=["agents"])
 
@@ -30,6 +45,10 @@ class HeartbeatPayload(BaseModel):
     interfaces: list[dict[str, Any]] = []
     login_attempts: list[dict[str, Any]] = []
     events: list[dict[str, Any]] = []
+    # Last ban cursor the agent applied ("" on first sync); omit to skip ban sync
+    ban_cursor: str | None = None
+    # Epoch seconds the agent collected this heartbeat; set on spooled ones
+    coletado_em: float | None = None
 
 
 @router.get("")
@@ -39,74 +58,250 @@ def list_agents(user=Depends(get_current_user)):
     return {"items": user_servers}
 
 
+@router.get("/bans")
+def agent_bans(
+    cursor: str = "",
+    servidor_id: int | None = None,
+    x_agent_token: str = Header(None),
+    x_synex_token_owner: str | None = Header(None),
+    x_synex_internal: str | None = Header(None),
+):
+    """Ban-list diff for an agent: adds/removes since ``cursor``, or a full snapshot.
+
+    Without ``servidor_id`` every active ban of the tenant is listed, including
+    ones scoped to a single server.
+    """
+    if not x_agent_token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    token_entry = resolve_agent_token(x_agent_token, x_synex_token_owner, x_synex_internal)
+    if not token_entry:
+        raise HTTPException(status_code=401, detail="Invalid or revoked agent token")
+    return ban_changes(token_entry["usuario_id"], cursor, servidor_id)
+
+
+@router.post("/heartbeat/batch")
+async def agent_heartbeat_batch(
+    request: Request,
+    x_agent_token: str = Header(None),
+    x_synex_token_owner: str | None = Header(None),
+    x_synex_internal: str | None = Header(None),
+    content_encoding: str | None = Header(None),
+):
+    """Backlog an agent spooled while the API was unreachable: NDJSON heartbeats, usually gzip'd."""
+    if not x_agent_token:
+        raise HTTPException(status_code=401, detail="Missing agent token")
+    # Authenticate before reading a byte of the body: unauthenticated clients
+    # must not get the server to buffer, inflate and parse a batch
+    token_entry = resolve_agent_token(x_agent_token, x_synex_token_owner, x_synex_internal)
+    if not token_entry:
+        raise HTTPException(status_code=401, detail="Invalid or revoked agent token")
+    body = await _read_body(request, settings.agent_batch_max_bytes)
+
+    def ingest() -> dict:
+        # Inflating and validating up to AGENT_BATCH_MAX_BYTES is CPU work: off the event loop too
+        heartbeats = _read_batch(body, content_encoding)
+        observe_heartbeat_batch("spooled_heartbeats", len(heartbeats))
+        sample = begin_ingest_sample()
+        try:
+            return _ingest_batch(heartbeats, token_entry)
+        finally:
+            end_ingest_sample(sample)
+
+    # Same threadpool as the single heartbeat, which is a sync route
+    return await run_in_threadpool(ingest)
+
+
 @router.post("/heartbeat")
 def agent_heartbeat(
     payload: HeartbeatPayload,
     x_agent_token: str = Header(None),
+    x_synex_token_owner: str | None = Header(None),
+    x_synex_internal: str | None = Header(None),
 ):
     """Agent calls this with its token to report full system state."""
     if not x_agent_token:
         raise HTTPException(status_code=401, detail="Missing agent token")
 
-    tokens = get_agent_tokens_db()
-    token_entry = next(
-        (t for t in tokens if t["token"] == x_agent_token and t["ativo"]),
-        None,
-    )
+    sample = begin_ingest_sample()
+    try:
+        with ingest_stage("token_lookup"):
+            token_entry = resolve_agent_token(x_agent_token, x_synex_token_owner, x_synex_internal)
+        return _ingest_heartbeat(payload, token_entry)
+    finally:
+        end_ingest_sample(sample)
+
+
+def _ingest_heartbeat(payload: HeartbeatPayload, token_entry: dict | None) -> dict:
     if not token_entry:
         raise HTTPException(status_code=401, detail="Invalid or revoked agent token")
+    usuario_id = token_entry["usuario_id"]
+    servidor_id = _ingest_state(payload, token_entry)
+    blocked = _ingest_records(payload, usuario_id, servidor_id)
+    response = {
+        "status": "ok",
+        "server_id": servidor_id,
+        "events_processed": len(payload.events),
+        "login_attempts_processed": len(payload.login_attempts),
+        "blocked": blocked,
+    }
+    _attach_bans(response, usuario_id, payload.ban_cursor)
+    return response
 
+
+def _ingest_state(payload: HeartbeatPayload, token_entry: dict) -> int:
+    """Server metrics, threshold alerts and traffic counters; returns servidor_id."""
     token_entry["ultimo_uso"] = datetime.now(timezone.utc)
     usuario_id = token_entry["usuario_id"]
 
-    srv = upsert_server(
-        usuario_id=usuario_id,
-        token_id=token_entry["id"],
-        hostname=payload.hostname,
-        ip_publico=payload.ip_publico,
-        os_info=payload.os_info,
-        cpu=payload.cpu,
-        ram=payload.ram,
-        disk=payload.disk,
-        uptime=payload.uptime,
-        conns=payload.conns,
-        open_ports=payload.open_ports,
-    )
+    with ingest_stage("upsert_server"):
+        srv = upsert_server(
+            usuario_id=usuario_id,
+            token_id=token_entry["id"],
+            hostname=payload.hostname,
+            ip_publico=payload.ip_publico,
+            os_info=payload.os_info,
+            cpu=payload.cpu,
+            ram=payload.ram,
+            disk=payload.disk,
+            uptime=payload.uptime,
+            conns=payload.conns,
+            open_ports=payload.open_ports,
+        )
 
     servidor_id = srv["id"]
 
-    _check_cpu_alerts(usuario_id, servidor_id, payload.hostname, payload.cpu)
-    _check_disk_alerts(usuario_id, servidor_id, payload.hostname, payload.disk)
+    with ingest_stage("cpu_alerts"):
+        _check_cpu_alerts(usuario_id, servidor_id, payload.hostname, payload.cpu)
+    with ingest_stage("disk_alerts"):
+        _check_disk_alerts(usuario_id, servidor_id, payload.hostname, payload.disk)
 
     if payload.interfaces:
-        update_traffic(usuario_id, servidor_id, payload.hostname, payload.interfaces)
+        with ingest_stage("update_traffic"):
+            update_traffic(usuario_id, servidor_id, payload.hostname, payload.interfaces)
+    return servidor_id
 
-    for la in payload.login_attempts:
-        add_login_attempt(
-            usuario_id=usuario_id,
-            servidor_id=servidor_id,
-            hostname=payload.hostname,
-            user=la.get("user", "unknown"),
-            origem_ip=la.get("ip", "0.0.0.0"),
-            method=la.get("method", "SSH"),
-            success=la.get("success", False),
-        )
 
-    for ev in payload.events:
-        add_event(
-            usuario_id=usuario_id,
-            servidor_id=servidor_id,
-            hostname=payload.hostname,
-            tipo=ev.get("tipo", "unknown"),
-            severidade=ev.get("severidade", "info"),
-            mensagem=ev.get("mensagem", ""),
-            origem_ip=ev.get("origem_ip"),
-            payload=ev.get("payload"),
-        )
+def _ingest_records(payload: HeartbeatPayload, usuario_id: int, servidor_id: int) -> int:
+    """Login attempts and events carried by one heartbeat; returns how many came from banned sources."""
+    attempts, events = payload.login_attempts, payload.events
+    with ingest_stage("ban_filter"):
+        attempts, blocked_attempts = filter_banned(usuario_id, servidor_id, attempts, "ip", _failed_attempt)
+        events, blocked_events = filter_banned(usuario_id, servidor_id, events, "origem_ip", _hostile_event)
+    observe_blocked("login_attempts", blocked_attempts)
+    observe_blocked("events", blocked_events)
+
+    observe_heartbeat_batch("login_attempts", len(payload.login_attempts))
+    with ingest_stage("login_attempts"):
+        for la in attempts:
+            add_login_attempt(
+                usuario_id=usuario_id,
+                servidor_id=servidor_id,
+                hostname=payload.hostname,
+                user=la.get("user", "unknown"),
+                origem_ip=la.get("ip", "0.0.0.0"),
+                method=la.get("method", "SSH"),
+                success=la.get("success", False),
+                coletado_em=payload.coletado_em,
+            )
+
+    observe_heartbeat_batch("events", len(payload.events))
+    with ingest_stage("events"):
+        for ev in events:
+            add_event(
+                usuario_id=usuario_id,
+                servidor_id=servidor_id,
+                hostname=payload.hostname,
+                tipo=ev.get("tipo", "unknown"),
+                severidade=ev.get("severidade", "info"),
+                mensagem=ev.get("mensagem", ""),
+                origem_ip=ev.get("origem_ip"),
+                payload=ev.get("payload"),
+                coletado_em=payload.coletado_em,
+            )
+    return blocked_attempts + blocked_events
+
+
+def _failed_attempt(la: dict) -> bool:
+    return not la.get("success", False)
+
 
-    return {
+def _hostile_event(ev: dict) -> bool:
+    return ev.get("tipo") in HOSTILE_TYPES
+
+
+def _attach_bans(response: dict, usuario_id: int, ban_cursor: str | None) -> None:
+    if ban_cursor is not None:
+        # After ingest, so bans triggered by this very heartbeat go out with it
+        with ingest_stage("ban_sync"):
+            response["bans"] = ban_changes(usuario_id, ban_cursor, response["server_id"])
+
+
+# ── Spooled batches ───────────────────────────────────────────────────
+async def _read_body(request: Request, limit: int) -> bytes:
+    """Request body, refused with 413 as soon as it passes ``limit`` bytes on the wire."""
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {limit} bytes")
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise HTTPException(status_code=413, detail=f"Lote acima de {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _read_batch(body: bytes, content_encoding: str | None) -> list[HeartbeatPayload]:
+    """Decode an NDJSON batch, gzip'd or not, refusing anything over the size caps."""
+    limit = settings.agent_batch_max_bytes
+    coding = (content_encoding or "identity").strip().lower()
+    if coding == "gzip":
+        inflater = zlib.decompressobj(wbits=31)
+        try:
+            # Bounded output, so a small gzip bomb can't expand past the cap
+            raw = inflater.decompress(body, limit + 1)
+        except zlib.error:
+            raise HTTPException(status_code=400, detail="Corpo gzip inválido")
+        if not inflater.eof and not inflater.unconsumed_tail:
+            raise HTTPException(status_code=400, detail="Corpo gzip truncado")
+    elif coding == "identity":
+        raw = body
+    else:
+        raise HTTPException(status_code=415, detail=f"Content-Encoding não suportado: {coding}")
+    if len(raw) > limit:
+        raise HTTPException(status_code=413, detail=f"Lote acima de {limit} bytes descomprimidos")
+
+    heartbeats = []
+    for n, line in enumerate(raw.splitlines(), 1):
+        if not line.strip():
+            continue
+        if len(heartbeats) >= settings.agent_batch_max_heartbeats:
+            raise HTTPException(status_code=413, detail=f"Lote acima de {settings.agent_batch_max_heartbeats} heartbeats")
+        try:
+            heartbeats.append(HeartbeatPayload.model_validate(orjson.loads(line)))
+        except (orjson.JSONDecodeError, ValidationError) as exc:
+            raise HTTPException(status_code=422, detail=f"Linha {n}: {exc}")
+    if not heartbeats:
+        raise HTTPException(status_code=422, detail="Lote vazio")
+    return heartbeats
+
+
+def _ingest_batch(heartbeats: list[HeartbeatPayload], token_entry: dict | None) -> dict:
+    if not token_entry:
+        raise HTTPException(status_code=401, detail="Invalid or revoked agent token")
+    usuario_id = token_entry["usuario_id"]
+    # Older snapshots are stale: only the newest one updates metrics and alerts,
+    # while every heartbeat's events and login attempts are kept, oldest first
+    latest = heartbeats[-1]
+    servidor_id = _ingest_state(latest, token_entry)
+    blocked = sum(_ingest_records(hb, usuario_id, servidor_id) for hb in heartbeats)
+    response = {
         "status": "ok",
         "server_id": servidor_id,
-        "events_processed": len(payload.events),
-        "login_attempts_processed": len(payload.login_attempts),
+        "heartbeats_processed": len(heartbeats),
+        "events_processed": sum(len(hb.events) for hb in heartbeats),
+        "login_attempts_processed": sum(len(hb.login_attempts) for hb in heartbeats),
+        "blocked": blocked,
     }
+    _attach_bans(response, usuario_id, latest.ban_cursor)
+    return response
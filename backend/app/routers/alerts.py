@@ -1,36 +1,45 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 
+from app.core.fastjson import FragmentCache, list_body
+from app.core.http_cache import cached_response
 from app.core.security import get_current_user
-from app.db.store import alerts, resolve_alert
+from app.db.store import alerts, collection_version, resolve_alert
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
 
+def _alert_out(a: dict) -> dict:
+    return {
+        "id": a["id"],
+        "hostname": a.get("hostname", ""),
+        "titulo": a["titulo"],
+        "severidade": a["severidade"],
+        "mensagem": a.get("mensagem", ""),
+        "status": a["status"],
+        "criado_em": a["criado_em"].isoformat(),
+    }
+
+
+alert_json = FragmentCache("alerts", _alert_out)
+
+
 @router.get("")
 def list_alerts(
+    request: Request,
     user=Depends(get_current_user),
     status: str | None = None,
     limit: int = Query(50, ge=1, le=500),
 ):
-    user_alerts = [a for a in alerts if a["usuario_id"] == user["user_id"]]
-    if status:
-        user_alerts = [a for a in user_alerts if a["status"] == status]
-    result = sorted(user_alerts, key=lambda a: a["criado_em"], reverse=True)[:limit]
-    return {
-        "items": [
-            {
-                "id": a["id"],
-                "hostname": a.get("hostname", ""),
-                "titulo": a["titulo"],
-                "severidade": a["severidade"],
-                "mensagem": a.get("mensagem", ""),
-                "status": a["status"],
-                "criado_em": a["criado_em"].isoformat(),
-            }
-            for a in result
-        ],
-        "total": len(user_alerts),
-    }
+    uid = user["user_id"]
+
+    def render() -> bytes:
+        user_alerts = [a for a in alerts if a["usuario_id"] == uid]
+        if status:
+            user_alerts = [a for a in user_alerts if a["status"] == status]
+        result = sorted(user_alerts, key=lambda a: a["criado_em"], reverse=True)[:limit]
+        return list_body(alert_json, result, total=len(user_alerts))
+
+    return cached_response(request, uid, "alerts", collection_version(uid, "alerts"), render)
 
 
 @router.put("/{alert_id}/resolve")
@@ -1,56 +1,63 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, Query
+from app.core.export import as_utc, export_response
+from app.core.fastjson import FragmentCache, list_response
 from app.core.security import get_current_user, is_admin
-from app.db.store import get_audit_logs
+from app.db.store import get_audit_logs, get_audit_summary, iter_audit_logs
 
 router = APIRouter(prefix="/audit", tags=["audit"])
 
+AUDIT_FIELDS = ["id", "action", "resource_type", "resource_id", "details", "ip_address", "criado_em"]
+
+
+def _audit_log_out(log: dict) -> dict:
+    return {
+        "id": log["id"],
+        "action": log["action"],
+        "resource_type": log["resource_type"],
+        "resource_id": log["resource_id"],
+        "details": log["details"],
+        "ip_address": log["ip_address"],
+        "criado_em": log["criado_em"].isoformat(),
+    }
+
+
+audit_log_json = FragmentCache("audit_logs", _audit_log_out)
+
+
+def _scope(user: dict) -> int | None:
+    """Admins see every user's logs; everyone else only their own."""
+    return None if is_admin(user) else user["user_id"]
+
 
 @router.get("")
 def list_audit_logs(
     user=Depends(get_current_user),
     limit: int = Query(100, ge=1, le=1000),
+    action: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
 ):
-    """Get audit logs. Regular users see their own logs, admins see all logs."""
-    if is_admin(user):
-        # Admin can see all logs
-        logs = get_audit_logs(usuario_id=None, limit=limit)
-    else:
-        # Regular users see only their own audit logs
-        logs = get_audit_logs(usuario_id=user["user_id"], limit=limit)
-    
-    return {
-        "items": [
-            {
-                "id": log["id"],
-                "action": log["action"],
-                "resource_type": log["resource_type"],
-                "resource_id": log["resource_id"],
-                "details": log["details"],
-                "ip_address": log["ip_address"],
-                "criado_em": log["criado_em"].isoformat(),
-            }
-            for log in logs
-        ],
-        "total": len(logs),
-    }
+    """Get audit logs, latest first. Regular users see their own logs, admins see all logs."""
+    logs = get_audit_logs(_scope(user), limit, action, as_utc(since), as_utc(until))
+    return list_response(audit_log_json, logs, total=len(logs))
 
 
 @router.get("/summary")
 def audit_summary(user=Depends(get_current_user)):
     """Get audit log summary/stats."""
-    if is_admin(user):
-        logs = get_audit_logs(usuario_id=None, limit=1000)
-    else:
-        logs = get_audit_logs(usuario_id=user["user_id"], limit=1000)
-    
-    # Count by action type
-    action_counts = {}
-    for log in logs:
-        action = log["action"]
-        action_counts[action] = action_counts.get(action, 0) + 1
-    
-    return {
-        "total_logs": len(logs),
-        "actions": action_counts,
-        "recent_logs": len([log for log in logs[:10]]),  # Last 10 for quick stats
-    }
\ No newline at end of file
+    return get_audit_summary(_scope(user))
+
+
+@router.get("/export")
+def export_audit_logs(
+    user=Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    action: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """Stream audit logs oldest first as NDJSON or CSV."""
+    rows = iter_audit_logs(_scope(user), action, as_utc(since), as_utc(until), newest_first=False)
+    return export_response(rows, format, "audit", AUDIT_FIELDS, _audit_log_out)
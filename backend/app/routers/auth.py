@@ -1,14 +1,17 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from app.core.security import (
     create_access_token,
     get_current_user,
     get_users_db,
-    hash_password,
-    verify_password,
+    hash_password_async,
+    revoke_user_tokens,
+    verify_password_async,
 )
+from app.db.store import add_audit_log
+from app.middleware import client_ip
 from app.models.schemas import (
     LoginIn,
     PasswordChangeIn,
@@ -22,32 +25,42 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post("/register", response_model=UserOut)
-def register(payload: RegisterIn):
+async def register(payload: RegisterIn, request: Request):
     users = get_users_db()
+    if any(u["email"] == payload.email for u in users):
+        raise HTTPException(status_code=409, detail="Email already registered")
+    senha_hash = await hash_password_async(payload.password)
+    # Concurrent registrations for the same email both pass the first check
+    # while hashing; nothing awaits between this one and the append
     if any(u["email"] == payload.email for u in users):
         raise HTTPException(status_code=409, detail="Email already registered")
     user = {
         "id": len(users) + 1,
         "nome": payload.nome,
         "email": payload.email,
-        "senha_hash": hash_password(payload.password),
+        "senha_hash": senha_hash,
         "role": "user",
         "avatar_url": None,
         "ativo": True,
         "criado_em": datetime.now(timezone.utc),
     }
     users.append(user)
+    add_audit_log(user["id"], "register", "user", str(user["id"]), ip_address=client_ip(request))
     return UserOut(**{k: v for k, v in user.items() if k != "senha_hash"})
 
 
 @router.post("/token", response_model=TokenResponse)
-def login(payload: LoginIn):
+async def login(payload: LoginIn, request: Request):
     users = get_users_db()
     user = next((u for u in users if u["email"] == payload.email), None)
-    if not user or not verify_password(payload.password, user["senha_hash"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not await verify_password_async(payload.password, user["senha_hash"]):
+        add_audit_log(user["id"], "login_failed", "user", str(user["id"]), ip_address=client_ip(request))
         raise HTTPException(status_code=401, detail="Invalid credentials")
     if not user.get("ativo", True):
         raise HTTPException(status_code=403, detail="Account disabled")
+    add_audit_log(user["id"], "login", "user", str(user["id"]), ip_address=client_ip(request))
     token = create_access_token(
         user_id=user["id"],
         email=user["email"],
@@ -67,7 +80,7 @@ def me(current=Depends(get_current_user)):
 
 
 @router.put("/me", response_model=UserOut)
-def update_me(payload: UserUpdateIn, current=Depends(get_current_user)):
+def update_me(payload: UserUpdateIn, request: Request, current=Depends(get_current_user)):
     users = get_users_db()
     user = next((u for u in users if u["id"] == current["user_id"]), None)
     if not user:
@@ -80,16 +93,30 @@ def update_me(payload: UserUpdateIn, current=Depends(get_current_user)):
         user["email"] = payload.email
     if payload.avatar_url is not None:
         user["avatar_url"] = payload.avatar_url
+    add_audit_log(
+        user["id"], "update", "user", str(user["id"]),
+        {"fields": sorted(payload.model_dump(exclude_none=True))},
+        ip_address=client_ip(request),
+    )
     return UserOut(**{k: v for k, v in user.items() if k != "senha_hash"})
 
 
 @router.put("/me/password")
-def change_password(payload: PasswordChangeIn, current=Depends(get_current_user)):
+async def change_password(payload: PasswordChangeIn, request: Request, current=Depends(get_current_user)):
     users = get_users_db()
     user = next((u for u in users if u["id"] == current["user_id"]), None)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    if not verify_password(payload.current_password, user["senha_hash"]):
+    if not await verify_password_async(payload.current_password, user["senha_hash"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
-    user["senha_hash"] = hash_password(payload.new_password)
-    return {"detail": "Password updated"}
+    user["senha_hash"] = await hash_password_async(payload.new_password)
+    # Sessions opened with the old password stop working; hand back a fresh token
+    revoke_user_tokens(user["id"])
+    add_audit_log(user["id"], "password_change", "user", str(user["id"]), ip_address=client_ip(request))
+    token = create_access_token(
+        user_id=user["id"],
+        email=user["email"],
+        role=user.get("role", "user"),
+        nome=user["nome"],
+    )
+    return {"detail": "Password updated", "access_token": token, "token_type": "bearer"}
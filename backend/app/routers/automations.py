@@ -1,31 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 
+from app.core.fastjson import dumps
+from app.core.http_cache import cached_response
 from app.core.security import get_current_user
-from app.db.store import automation_rules, add_automation_rule, toggle_automation_rule
+from app.db.store import automation_rules, add_automation_rule, collection_version, parse_ban_duration, toggle_automation_rule
 
 router = APIRouter(prefix="/automations", tags=["automations"])
 
 
 @router.get("")
-def list_automations(user=Depends(get_current_user)):
-    # Return global rules + user-specific
-    user_rules = [
-        r for r in automation_rules
-        if r["usuario_id"] is None or r["usuario_id"] == user["user_id"]
-    ]
-    return {
-        "items": [
-            {
-                "id": r["id"],
-                "nome": r["nome"],
-                "condicao": r["condicao"],
-                "acao": r["acao"],
-                "ativo": r["ativo"],
-            }
-            for r in user_rules
+def list_automations(request: Request, user=Depends(get_current_user)):
+    uid = user["user_id"]
+
+    def render() -> bytes:
+        # Return global rules + user-specific
+        user_rules = [
+            r for r in automation_rules
+            if r["usuario_id"] is None or r["usuario_id"] == uid
         ]
-    }
+        return dumps({
+            "items": [
+                {
+                    "id": r["id"],
+                    "nome": r["nome"],
+                    "condicao": r["condicao"],
+                    "acao": r["acao"],
+                    "ativo": r["ativo"],
+                }
+                for r in user_rules
+            ]
+        })
+
+    return cached_response(request, uid, "automations", collection_version(uid, "automations"), render)
 
 
 class RuleIn(BaseModel):
@@ -40,6 +47,11 @@ class RuleIn(BaseModel):
 
 @router.post("/rules")
 def create_rule(payload: RuleIn, user=Depends(get_current_user)):
+    if payload.acao_duration:
+        try:
+            parse_ban_duration(payload.acao_duration)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
     rule = add_automation_rule(
         usuario_id=user["user_id"],
         nome=payload.nome,
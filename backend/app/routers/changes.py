@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Query
+
+from app.core.config import settings
+from app.core.security import get_current_user
+from app.db.store import change_feed
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+FEED_KINDS = {"event", "alert", "ban", "server", "incident"}
+
+
+@router.get("")
+async def list_changes(
+    user=Depends(get_current_user),
+    since: int = Query(0, ge=0),
+    kinds: str | None = Query(None, description="Comma-separated: event,alert,ban,server,incident"),
+    limit: int = Query(500, ge=1, le=5000),
+    timeout: float = Query(0, ge=0, description="Long-poll: seconds to wait for new data"),
+):
+    """Records newer than ``since``; pass the returned ``next_since`` on the next call."""
+    kind_filter = None
+    if kinds:
+        kind_filter = {k.strip() for k in kinds.split(",") if k.strip()} & FEED_KINDS
+    usuario_id = user["user_id"]
+
+    items, cursor, reset = change_feed.since(usuario_id, since, kind_filter, limit)
+    if not items and not reset and timeout > 0:
+        await change_feed.wait(usuario_id, cursor, min(timeout, settings.changes_feed_max_wait_seconds))
+        items, cursor, reset = change_feed.since(usuario_id, cursor, kind_filter, limit)
+
+    return {
+        "items": [
+            {"seq": seq, "kind": kind, "op": op, "data": data}
+            for seq, kind, op, data in items
+        ],
+        "next_since": cursor,
+        "reset": reset,
+    }
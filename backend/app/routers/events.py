@@ -1,11 +1,33 @@
-from fastapi import APIRouter, Depends, Query
+from datetime import datetime
 
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.core.export import as_utc, export_response, ip_filter
+from app.core.fastjson import FragmentCache, list_response
 from app.core.security import get_current_user
-from app.db.store import events, add_event
+from app.db.store import add_event, event_search, iter_events, tenant_events
+from app.services.search import QueryError, parse_query
 
 router = APIRouter(prefix="/events", tags=["events"])
 
 
+def _event_out(e: dict) -> dict:
+    return {
+        "id": e["id"],
+        "hostname": e["hostname"],
+        "tipo": e["tipo"],
+        "severidade": e["severidade"],
+        "mensagem": e["mensagem"],
+        "origem_ip": e["origem_ip"],
+        "geo": e["geo"],
+        "criado_em": e["criado_em"].isoformat(),
+    }
+
+
+event_json = FragmentCache("events", _event_out)
+EVENT_FIELDS = ["id", "hostname", "tipo", "severidade", "mensagem", "origem_ip", "geo", "criado_em"]
+
+
 @router.get("")
 def list_events(
     user=Depends(get_current_user),
@@ -13,28 +35,59 @@ def list_events(
     tipo: str | None = None,
     severidade: str | None = None,
 ):
-    user_events = [e for e in events if e["usuario_id"] == user["user_id"]]
+    user_events = tenant_events(user["user_id"])
     if tipo:
         user_events = [e for e in user_events if e["tipo"] == tipo]
     if severidade:
         user_events = [e for e in user_events if e["severidade"] == severidade]
     # Return latest first
     result = sorted(user_events, key=lambda e: e["criado_em"], reverse=True)[:limit]
-    return {
-        "items": [
-            {
-                "id": e["id"],
-                "hostname": e["hostname"],
-                "tipo": e["tipo"],
-                "severidade": e["severidade"],
-                "mensagem": e["mensagem"],
-                "origem_ip": e["origem_ip"],
-                "criado_em": e["criado_em"].isoformat(),
-            }
-            for e in result
-        ],
-        "total": len(user_events),
-    }
+    return list_response(event_json, result, total=len(user_events))
+
+
+@router.get("/search")
+def search_events(
+    user=Depends(get_current_user),
+    q: str = Query(..., min_length=1, max_length=512),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: int | None = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Full-text search over the tenant's events, newest first, with cursor pagination."""
+    try:
+        clauses = parse_query(q)
+        since, until = as_utc(since), as_utc(until)
+        items, next_cursor = event_search.search(
+            user["user_id"],
+            clauses,
+            since.timestamp() if since else None,
+            until.timestamp() if until else None,
+            cursor,
+            limit,
+        )
+    except QueryError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return list_response(event_json, items, next_cursor=next_cursor)
+
+
+@router.get("/export")
+def export_events(
+    user=Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    tipo: str | None = None,
+    severidade: str | None = None,
+    servidor_id: int | None = None,
+    ip: str | None = None,
+):
+    """Stream the tenant's events oldest first as NDJSON or CSV, with no row cap."""
+    rows = iter_events(
+        user["user_id"], as_utc(since), as_utc(until), tipo, severidade, servidor_id, ip_filter(ip),
+        newest_first=False,
+    )
+    return export_response(rows, format, "events", EVENT_FIELDS, _event_out)
 
 
 @router.post("")
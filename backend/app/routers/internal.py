@@ -0,0 +1,40 @@
+"""Shard-to-router endpoints for the scale-out mode; 404 unless called by the front router."""
+
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from app.core.security import (
+    get_agent_tokens_db,
+    get_token_generations,
+    merge_token_generations,
+)
+from app.core.sharding import is_internal_request
+
+
+def require_internal(x_synex_internal: str | None = Header(None)) -> None:
+    if not is_internal_request(x_synex_internal):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+router = APIRouter(prefix="/internal", tags=["internal"], include_in_schema=False, dependencies=[Depends(require_internal)])
+
+
+@router.get("/agent-tokens/resolve")
+def resolve_agent_token_owner(x_agent_token: str = Header(...)):
+    entry = next((t for t in get_agent_tokens_db() if t["token"] == x_agent_token and t["ativo"]), None)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Invalid or revoked agent token")
+    entry["ultimo_uso"] = datetime.now(timezone.utc)
+    return {"usuario_id": entry["usuario_id"], "token_id": entry["id"]}
+
+
+@router.get("/token-generations")
+def list_token_generations():
+    return {str(uid): gen for uid, gen in get_token_generations().items()}
+
+
+@router.post("/token-generations")
+def sync_token_generations(generations: dict[str, int]):
+    merge_token_generations({int(uid): gen for uid, gen in generations.items()})
+    return {"synced": len(generations)}
@@ -1,23 +1,32 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
+from app.core.fastjson import dumps
+from app.core.http_cache import cached_response
 from app.core.security import get_current_user
-from app.db.store import servers
+from app.db.store import collection_version, expire_heartbeats, servers
 
 router = APIRouter(prefix="/metrics", tags=["metrics"])
 
 
 @router.get("")
-def list_metrics(user=Depends(get_current_user)):
-    user_servers = [s for s in servers if s["usuario_id"] == user["user_id"] and s["status"] == "online"]
-    items = []
-    for s in user_servers:
-        items.append({
-            "servidor_id": s["id"],
-            "hostname": s["hostname"],
-            "cpu": s["cpu"],
-            "ram": s["ram"],
-            "disk": s["disk"],
-            "conns": s["conns"],
-            "open_ports": len(s.get("open_ports", [])),
-        })
-    return {"items": items}
+def list_metrics(request: Request, user=Depends(get_current_user)):
+    uid = user["user_id"]
+    expire_heartbeats()
+
+    def render() -> bytes:
+        user_servers = [s for s in servers if s["usuario_id"] == uid and s["status"] == "online"]
+        items = []
+        for s in user_servers:
+            items.append({
+                "servidor_id": s["id"],
+                "hostname": s["hostname"],
+                "cpu": s["cpu"],
+                "ram": s["ram"],
+                "disk": s["disk"],
+                "conns": s["conns"],
+                "open_ports": len(s.get("open_ports", [])),
+            })
+        return dumps({"items": items})
+
+    # Derived from the servers collection, so it shares its version
+    return cached_response(request, uid, "metrics", collection_version(uid, "servers"), render)
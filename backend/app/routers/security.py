@@ -1,70 +1,181 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import math
+from datetime import datetime, timedelta, timezone
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app.core.export import as_utc, export_response, ip_filter
+from app.core.fastjson import FragmentCache, list_response
+from app.core.config import settings
 from app.core.security import get_current_user
-from app.db.store import login_attempts, banned_ips, ban_ip, unban_ip
+from app.db import store
+from app.db.store import (
+    add_audit_log,
+    active_bans,
+    ban_ip,
+    expire_bans,
+    iter_login_attempts,
+    login_attempt_totals,
+    parse_ban_duration,
+    tenant_bans,
+    tenant_incidents,
+    tenant_login_attempts,
+    unban_ip,
+)
+from app.middleware import client_ip
 from app.models.schemas import BannedIpIn
 
 router = APIRouter(prefix="/security", tags=["security"])
 
 
+def _login_attempt_out(a: dict) -> dict:
+    return {
+        "id": a["id"],
+        "hostname": a["hostname"],
+        "user": a["user"],
+        "origem_ip": a["origem_ip"],
+        "geo": a["geo"],
+        "method": a["method"],
+        "success": a["success"],
+        "criado_em": a["criado_em"].isoformat(),
+        "coletado_em": a["coletado_em"],
+    }
+
+
+login_attempt_json = FragmentCache("login_attempts", _login_attempt_out)
+LOGIN_ATTEMPT_FIELDS = ["id", "hostname", "user", "origem_ip", "geo", "method", "success", "criado_em", "coletado_em"]
+
+
 @router.get("/login-attempts")
 def list_login_attempts(
     user=Depends(get_current_user),
     limit: int = Query(50, ge=1, le=500),
 ):
-    user_attempts = [a for a in login_attempts if a["usuario_id"] == user["user_id"]]
-    result = sorted(user_attempts, key=lambda a: a["criado_em"], reverse=True)[:limit]
-    total_today = len(user_attempts)
-    blocked = len([a for a in user_attempts if not a["success"]])
-    suspicious = len([a for a in user_attempts if a["success"] and a["user"] in ("root", "admin")])
+    # The per-tenant list is in criado_em order, so the newest are at the end
+    result = tenant_login_attempts(user["user_id"])[-limit:][::-1]
+    return list_response(login_attempt_json, result, stats=login_attempt_totals(user["user_id"]))
+
+
+@router.get("/login-attempts/export")
+def export_login_attempts(
+    user=Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    servidor_id: int | None = None,
+    ip: str | None = None,
+    success: bool | None = None,
+):
+    """Stream the tenant's login attempts oldest first as NDJSON or CSV, with no row cap."""
+    rows = iter_login_attempts(
+        user["user_id"], as_utc(since), as_utc(until), servidor_id, ip_filter(ip), success,
+        newest_first=False,
+    )
+    return export_response(rows, format, "login-attempts", LOGIN_ATTEMPT_FIELDS, _login_attempt_out)
+
+
+def _incident_out(i: dict, active_after: datetime) -> dict:
     return {
-        "items": [
-            {
-                "id": a["id"],
-                "hostname": a["hostname"],
-                "user": a["user"],
-                "origem_ip": a["origem_ip"],
-                "method": a["method"],
-                "success": a["success"],
-                "criado_em": a["criado_em"].isoformat(),
-            }
-            for a in result
-        ],
-        "stats": {
-            "total": total_today,
-            "blocked": blocked,
-            "suspicious": suspicious,
-        },
+        "id": i["id"],
+        "tipo": i["tipo"],
+        "severidade": i["severidade"],
+        "titulo": i["titulo"],
+        "ip": i["ip"],
+        "geo": i["geo"],
+        "servidores": i["servidores"],
+        "sequencia": i["sequencia"],
+        "eventos": i["eventos"],
+        "ban_id": i["ban_id"],
+        "status": "ativo" if i["ultimo_em"] >= active_after else "encerrado",
+        "primeiro_em": i["primeiro_em"].isoformat(),
+        "ultimo_em": i["ultimo_em"].isoformat(),
     }
 
 
-@router.get("/banned-ips")
-def list_banned_ips(user=Depends(get_current_user)):
-    user_banned = [b for b in banned_ips if b["usuario_id"] == user["user_id"]]
+@router.get("/incidents")
+def list_incidents(
+    user=Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=500),
+    ativos: bool = False,
+):
+    """Correlated cross-server incidents, most recently active first."""
+    # Incidents are active while their source is still inside the correlation window
+    active_after = store.now() - timedelta(seconds=settings.correlation_window_seconds)
+    items = tenant_incidents(user["user_id"])
+    if ativos:
+        items = [i for i in items if i["ultimo_em"] >= active_after]
+    items = sorted(items, key=lambda i: i["ultimo_em"], reverse=True)[:limit]
+    return {"items": [_incident_out(i, active_after) for i in items]}
+
+
+@router.get("/stats")
+def attack_stats(
+    user=Depends(get_current_user),
+    janela: str = Query("hora", pattern="^(hora|dia)$"),
+    anterior: bool = False,
+    top: int = Query(10, ge=1, le=settings.attack_stats_top_k),
+):
+    """Top attacker IPs / usernames and distinct counts for the current (or previous) hour or UTC day.
+
+    Answered from fixed-size sketches: ``count`` is an upper bound and
+    ``count - erro`` a lower bound; distinct counts are estimates.
+    """
+    summary = store.attack_stats.summary(user["user_id"], janela, anterior, store.now().timestamp(), top)
+    summary["inicio"] = datetime.fromtimestamp(summary["inicio"], timezone.utc).isoformat()
+    summary["fim"] = datetime.fromtimestamp(summary["fim"], timezone.utc).isoformat()
+    summary["erro_relativo_distintos"] = round(1.04 / math.sqrt(1 << store.attack_stats.precision), 4)
+    return {"janela": janela, **summary}
+
+
+def _ban_out(b: dict) -> dict:
     return {
-        "items": [
-            {
-                "id": b["id"],
-                "hostname": b.get("hostname", ""),
-                "ip": b["ip"],
-                "motivo": b["motivo"],
-                "origem": b["origem"],
-                "expira": b["expira"],
-                "ativo": b["ativo"],
-                "criado_em": b["criado_em"].isoformat(),
-            }
-            for b in user_banned
-        ]
+        "id": b["id"],
+        "hostname": b.get("hostname", ""),
+        "ip": b["ip"],
+        "geo": b.get("geo"),
+        "motivo": b["motivo"],
+        "origem": b["origem"],
+        "expira": b["expira"],
+        "expira_em": b["expira_em"].isoformat() if b["expira_em"] else None,
+        "ativo": b["ativo"],
+        "bloqueios": b["bloqueios"],
+        "ultimo_bloqueio": b["ultimo_bloqueio"].isoformat() if b["ultimo_bloqueio"] else None,
+        "criado_em": b["criado_em"].isoformat(),
     }
 
 
+@router.get("/banned-ips")
+def list_banned_ips(
+    user=Depends(get_current_user),
+    status: str = Query("todos", pattern="^(todos|ativos|expirando)$"),
+    dentro_de: int = Query(3600, ge=1, description="Window in seconds for status=expirando"),
+):
+    """Ban history; ``ativos`` for active bans only, ``expirando`` for those ending within ``dentro_de``."""
+    uid = user["user_id"]
+    if status == "todos":
+        expire_bans()
+        user_banned = tenant_bans(uid)
+    elif status == "ativos":
+        user_banned = active_bans(uid)
+    else:
+        horizon = store.now() + timedelta(seconds=dentro_de)
+        user_banned = sorted(
+            (b for b in active_bans(uid) if b["expira_em"] is not None and b["expira_em"] <= horizon),
+            key=lambda b: b["expira_em"],
+        )
+    return {"items": [_ban_out(b) for b in user_banned]}
+
+
 @router.post("/banned-ips")
-def manual_ban_ip(payload: BannedIpIn, user=Depends(get_current_user)):
+def manual_ban_ip(payload: BannedIpIn, request: Request, user=Depends(get_current_user)):
     from app.db.store import servers
     hostname = ""
     srv = next((s for s in servers if s["id"] == payload.servidor_id and s["usuario_id"] == user["user_id"]), None)
     if srv:
         hostname = srv["hostname"]
+    try:
+        parse_ban_duration(payload.expira)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     entry = ban_ip(
         usuario_id=user["user_id"],
         servidor_id=payload.servidor_id,
@@ -72,13 +183,20 @@ def manual_ban_ip(payload: BannedIpIn, user=Depends(get_current_user)):
         ip=payload.ip,
         motivo=payload.motivo,
         origem="Manual",
+        expira=payload.expira,
+    )
+    add_audit_log(
+        user["user_id"], "ban_ip", "ban", payload.ip,
+        {"servidor_id": payload.servidor_id, "motivo": payload.motivo, "expira": payload.expira},
+        client_ip(request),
     )
     return entry
 
 
-@router.delete("/banned-ips/{ip}")
-def api_unban_ip(ip: str, user=Depends(get_current_user)):
+@router.delete("/banned-ips/{ip:path}")  # :path, so CIDR bans ("10.0.0.0/8") can be lifted
+def api_unban_ip(ip: str, request: Request, user=Depends(get_current_user)):
     success = unban_ip(user["user_id"], ip)
     if not success:
         raise HTTPException(status_code=404, detail="IP not found or already unbanned")
+    add_audit_log(user["user_id"], "unban_ip", "ban", ip, ip_address=client_ip(request))
     return {"unbanned": ip}
@@ -1,32 +1,43 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
+from app.core.fastjson import FragmentCache, list_body
+from app.core.http_cache import cached_response
 from app.core.security import get_current_user
-from app.db.store import servers, get_dashboard_stats
+from app.db.store import collection_version, expire_heartbeats, servers, get_dashboard_stats
 
 router = APIRouter(prefix="/servers", tags=["servers"])
 
 
+def _server_out(s: dict) -> dict:
+    return {
+        "id": s["id"],
+        "hostname": s["hostname"],
+        "ip_publico": s["ip_publico"],
+        "os_info": s["os_info"],
+        "cpu": s["cpu"],
+        "ram": s["ram"],
+        "disk": s["disk"],
+        "uptime": s["uptime"],
+        "conns": s["conns"],
+        "open_ports": s["open_ports"],
+        "status": s["status"],
+        "ultimo_heartbeat": s["ultimo_heartbeat"].isoformat() if s.get("ultimo_heartbeat") else None,
+        "criado_em": s["criado_em"].isoformat() if s.get("criado_em") else None,
+    }
+
+
+server_json = FragmentCache("servers", _server_out)
+
+
 @router.get("")
-def list_servers(user=Depends(get_current_user)):
-    user_servers = [s for s in servers if s["usuario_id"] == user["user_id"]]
-    result = []
-    for s in user_servers:
-        result.append({
-            "id": s["id"],
-            "hostname": s["hostname"],
-            "ip_publico": s["ip_publico"],
-            "os_info": s["os_info"],
-            "cpu": s["cpu"],
-            "ram": s["ram"],
-            "disk": s["disk"],
-            "uptime": s["uptime"],
-            "conns": s["conns"],
-            "open_ports": s["open_ports"],
-            "status": s["status"],
-            "ultimo_heartbeat": s["ultimo_heartbeat"].isoformat() if s.get("ultimo_heartbeat") else None,
-            "criado_em": s["criado_em"].isoformat() if s.get("criado_em") else None,
-        })
-    return {"items": result}
+def list_servers(request: Request, user=Depends(get_current_user)):
+    uid = user["user_id"]
+    expire_heartbeats()  # a status flip bumps the version, so stale bodies aren't served
+
+    def render() -> bytes:
+        return list_body(server_json, [s for s in servers if s["usuario_id"] == uid])
+
+    return cached_response(request, uid, "servers", collection_version(uid, "servers"), render)
 
 
 @router.get("/stats")
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from app.core.config import settings
 from app.core.security import (
@@ -8,6 +8,8 @@ from app.core.security import (
     get_agent_tokens_db,
     get_current_user,
 )
+from app.db.store import add_audit_log
+from app.middleware import client_ip
 from app.models.schemas import AgentTokenIn, AgentTokenOut
 
 router = APIRouter(prefix="/tokens", tags=["tokens"])
@@ -35,7 +37,7 @@ def list_tokens(user=Depends(get_current_user)):
 
 
 @router.post("", response_model=AgentTokenOut, status_code=201)
-def create_token(payload: AgentTokenIn, user=Depends(get_current_user)):
+def create_token(payload: AgentTokenIn, request: Request, user=Depends(get_current_user)):
     tokens = get_agent_tokens_db()
     raw_token = generate_agent_token()
     entry = {
@@ -49,13 +51,14 @@ def create_token(payload: AgentTokenIn, user=Depends(get_current_user)):
         "criado_em": datetime.now(timezone.utc),
     }
     tokens.append(entry)
+    add_audit_log(user["user_id"], "create", "token", str(entry["id"]), {"nome": payload.nome}, client_ip(request))
     out = AgentTokenOut(**{k: v for k, v in entry.items() if k != "usuario_id"})
     out.install_command = _install_cmd(raw_token)
     return out
 
 
 @router.delete("/{token_id}")
-def revoke_token(token_id: int, user=Depends(get_current_user)):
+def revoke_token(token_id: int, request: Request, user=Depends(get_current_user)):
     tokens = get_agent_tokens_db()
     entry = next(
         (t for t in tokens if t["id"] == token_id and t["usuario_id"] == user["user_id"]),
@@ -64,4 +67,5 @@ def revoke_token(token_id: int, user=Depends(get_current_user)):
     if not entry:
         raise HTTPException(status_code=404, detail="Token not found")
     entry["ativo"] = False
+    add_audit_log(user["user_id"], "revoke", "token", str(token_id), ip_address=client_ip(request))
     return {"detail": "Token revoked"}
@@ -0,0 +1,383 @@
+"""
+Multi-process scale-out on one host: a stateless front router in front of N
+shard-owner processes, each running the regular app on a unix socket.
+
+    python -m app.scaleout --shards 4 --routers 2 --port 8000
+
+Tenants are consistently hashed (app.core.sharding.HashRing) to the shard
+that owns all of their state, so per-tenant reads and ingest never cross
+processes:
+
+* Bearer-token requests go to the owner of the JWT's ``uid``. The router
+  only reads the claims to pick a shard; the shard verifies the token.
+* Agent requests (``X-Agent-Token``) are resolved once against the control
+  shard, which owns users and agent tokens, cached for
+  ``--token-cache-ttl`` seconds and forwarded with the owner attached.
+* Auth, token management and superadmin user/token views go to the control
+  shard. After a revoking call (password change, deactivation, deletion)
+  the router pushes token generations to every shard before replying.
+* Cross-tenant superadmin/admin views (``/admin/servers``, ``/audit``) fan
+  out to every shard and are merged here. A regular user's ``/audit`` reads
+  go to the owner shard and the control shard. Their login, register and
+  token audit rows are written on the control shard.
+
+Router processes share the listening port (uvicorn workers), so the proxy
+hop scales with them. Limitations: ``/ws/events`` is not proxied; rate
+limits and Prometheus metrics are per shard (``/metrics/prometheus?shard=N``,
+``/admin/profile?shard=N``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any
+
+import httpx
+from jose import JWTError, jwt
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from app.core.config import Settings
+from app.core.sharding import CONTROL_SHARD, INTERNAL_HEADER, TOKEN_OWNER_HEADER, HashRing
+
+API = "/api/v1"
+CONTROL_PREFIXES = (f"{API}/auth", f"{API}/tokens", f"{API}/admin")
+FANOUT_PATHS = {f"{API}/admin/servers", f"{API}/audit", f"{API}/audit/summary"}
+FANOUT_EXPORT_PATHS = {f"{API}/audit/export"}
+REVOKING_PATHS = (f"{API}/auth/me/password", f"{API}/admin/users/")
+HOP_BY_HOP = {
+    b"connection", b"keep-alive", b"transfer-encoding", b"te", b"trailer",
+    b"upgrade", b"proxy-authorization", b"proxy-authenticate", b"host", b"content-length",
+}
+TOKEN_CACHE_MAX = 100_000
+
+
+class ShardRouter:
+    def __init__(self, sockets: list[str], secret: str, token_cache_ttl: float = 30.0) -> None:
+        self.ring = HashRing(len(sockets))
+        self.secret = secret
+        self.token_cache_ttl = token_cache_ttl
+        self.clients = [
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=path),
+                base_url="http://shard",
+                timeout=httpx.Timeout(30.0, read=None),
+            )
+            for path in sockets
+        ]
+        self._token_owners: dict[str, tuple[float, int, int]] = {}
+
+    # ── Routing ─────────────────────────────────────────────────────
+    async def handle(self, request: Request) -> Response:
+        path = request.url.path
+        if path.startswith(f"{API}/internal"):
+            return JSONResponse({"detail": "Not Found"}, status_code=404)
+
+        headers = self._forward_headers(request)
+        claims = self._claims(request)
+
+        if path in FANOUT_PATHS and (path.startswith(f"{API}/admin") or claims.get("role") in ("admin", "superadmin")):
+            return await self._fanout(request, headers)
+        if path in FANOUT_EXPORT_PATHS and claims.get("role") in ("admin", "superadmin"):
+            return await self._fanout_export(request, headers)
+        if path.startswith(f"{API}/audit") and "uid" in claims:
+            shards = self._audit_shards(claims["uid"])
+            if path in FANOUT_EXPORT_PATHS:
+                return await self._fanout_export(request, headers, shards)
+            if path in FANOUT_PATHS:
+                return await self._fanout(request, headers, shards)
+
+        agent_token = request.headers.get("x-agent-token")
+        if path.startswith(f"{API}/agents/") and agent_token:
+            owner = await self._resolve_agent_token(agent_token)
+            if owner is None:
+                return JSONResponse({"detail": "Invalid or revoked agent token"}, status_code=401)
+            usuario_id, token_id = owner
+            headers.append((TOKEN_OWNER_HEADER.encode(), f"{usuario_id}:{token_id}".encode()))
+            return await self._proxy(request, self.ring.owner(usuario_id), headers)
+
+        if "shard" in request.query_params and (
+            path == "/metrics/prometheus" or path == f"{API}/admin/profile"
+        ):
+            try:
+                shard = int(request.query_params["shard"]) % len(self.clients)
+            except ValueError:
+                return JSONResponse({"detail": "Invalid shard"}, status_code=400)
+            return await self._proxy(request, shard, headers)
+
+        if path.startswith(CONTROL_PREFIXES):
+            response = await self._proxy(request, CONTROL_SHARD, headers)
+            if request.method in ("PUT", "DELETE") and path.startswith(REVOKING_PATHS) and response.status_code < 300:
+                await self._sync_token_generations()
+            return response
+
+        if "uid" in claims:
+            try:
+                return await self._proxy(request, self.ring.owner(int(claims["uid"])), headers)
+            except (TypeError, ValueError):
+                pass
+        return await self._proxy(request, CONTROL_SHARD, headers)
+
+    def _audit_shards(self, uid: Any) -> list[int]:
+        """Shards holding a regular user's audit rows: their owner, plus the control shard for auth/token actions."""
+        try:
+            owner = self.ring.owner(int(uid))
+        except (TypeError, ValueError):
+            return [CONTROL_SHARD]
+        return sorted({CONTROL_SHARD, owner})
+
+    def _forward_headers(self, request: Request) -> list[tuple[bytes, bytes]]:
+        # Never let clients smuggle internal headers through
+        headers = [
+            (k, v) for k, v in request.headers.raw
+            if k.lower() not in HOP_BY_HOP and not k.lower().startswith(b"x-synex-")
+        ]
+        headers.append((INTERNAL_HEADER.encode(), self.secret.encode()))
+        if request.client:
+            headers.append((b"x-forwarded-for", request.client.host.encode()))
+        return headers
+
+    @staticmethod
+    def _claims(request: Request) -> dict[str, Any]:
+        auth = request.headers.get("authorization", "")
+        if not auth.lower().startswith("bearer "):
+            return {}
+        try:
+            return jwt.get_unverified_claims(auth[7:])
+        except JWTError:
+            return {}
+
+    async def _proxy(self, request: Request, shard: int, headers: list[tuple[bytes, bytes]]) -> Response:
+        client = self.clients[shard]
+        upstream = client.build_request(
+            request.method,
+            request.url.path,
+            params=request.query_params.multi_items(),
+            headers=headers,
+            content=await request.body(),
+        )
+        resp = await client.send(upstream, stream=True)
+        return StreamingResponse(
+            resp.aiter_raw(),
+            status_code=resp.status_code,
+            headers={k: v for k, v in resp.headers.items() if k.lower().encode() not in HOP_BY_HOP},
+            background=BackgroundTask(resp.aclose),
+        )
+
+    # ── Control shard helpers ───────────────────────────────────────
+    async def _resolve_agent_token(self, token: str) -> tuple[int, int] | None:
+        cached = self._token_owners.get(token)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+        resp = await self.clients[CONTROL_SHARD].get(
+            f"{API}/internal/agent-tokens/resolve",
+            headers={INTERNAL_HEADER: self.secret, "x-agent-token": token},
+        )
+        if resp.status_code != 200:
+            self._token_owners.pop(token, None)
+            return None
+        owner = resp.json()
+        if len(self._token_owners) >= TOKEN_CACHE_MAX:
+            self._token_owners.clear()
+        self._token_owners[token] = (time.monotonic() + self.token_cache_ttl, owner["usuario_id"], owner["token_id"])
+        return owner["usuario_id"], owner["token_id"]
+
+    async def _sync_token_generations(self) -> None:
+        internal = {INTERNAL_HEADER: self.secret}
+        resp = await self.clients[CONTROL_SHARD].get(f"{API}/internal/token-generations", headers=internal)
+        generations = resp.json()
+        await asyncio.gather(*(
+            client.post(f"{API}/internal/token-generations", json=generations, headers=internal)
+            for shard, client in enumerate(self.clients) if shard != CONTROL_SHARD
+        ))
+
+    # ── Fan-out views ───────────────────────────────────────────────
+    async def _fanout(
+        self, request: Request, headers: list[tuple[bytes, bytes]], shards: list[int] | None = None
+    ) -> Response:
+        path = request.url.path
+        params = request.query_params.multi_items()
+        clients = self.clients if shards is None else [self.clients[shard] for shard in shards]
+        responses = await asyncio.gather(*(
+            client.get(path, params=params, headers=headers) for client in clients
+        ))
+        for resp in responses:
+            if resp.status_code != 200:
+                return Response(resp.content, status_code=resp.status_code, media_type=resp.headers.get("content-type"))
+        bodies = [resp.json() for resp in responses]
+
+        if path == f"{API}/admin/servers":
+            servers = [s for body in bodies for s in body]
+            await self._enrich_owners(servers, headers)
+            return JSONResponse(sorted(servers, key=lambda s: s["id"]))
+        if path == f"{API}/audit":
+            limit = int(request.query_params.get("limit", 100))
+            items = sorted(
+                (item for body in bodies for item in body["items"]),
+                key=lambda item: item["criado_em"],
+                reverse=True,
+            )[:limit]
+            return JSONResponse({"items": items, "total": len(items)})
+        return JSONResponse(_merge_summaries(bodies))
+
+    async def _fanout_export(
+        self, request: Request, headers: list[tuple[bytes, bytes]], shards: list[int] | None = None
+    ) -> Response:
+        """Concatenate each shard's export stream (per-shard time order, CSV header once)."""
+        shards = list(range(len(self.clients))) if shards is None else shards
+        # Identity from the shards so the streams can be joined byte-wise
+        # (explicitly: httpx would otherwise add its own Accept-Encoding)
+        headers = [(k, v) for k, v in headers if k.lower() != b"accept-encoding"] + [(b"accept-encoding", b"identity")]
+        path, params = request.url.path, request.query_params.multi_items()
+        csv_format = request.query_params.get("format") == "csv"
+        first = await self.clients[CONTROL_SHARD].send(
+            self.clients[CONTROL_SHARD].build_request("GET", path, params=params, headers=headers), stream=True
+        )
+        if first.status_code != 200:
+            await first.aread()
+            await first.aclose()
+            return Response(first.content, status_code=first.status_code, media_type=first.headers.get("content-type"))
+
+        async def body():
+            try:
+                async for chunk in first.aiter_raw():
+                    yield chunk
+            finally:
+                await first.aclose()
+            for shard in shards:
+                if shard == CONTROL_SHARD:
+                    continue
+                async with self.clients[shard].stream("GET", path, params=params, headers=headers) as resp:
+                    skip_header = csv_format
+                    async for chunk in resp.aiter_raw():
+                        if skip_header:
+                            header, sep, chunk = chunk.partition(b"\n")
+                            skip_header = not sep
+                        if chunk:
+                            yield chunk
+
+        return StreamingResponse(
+            body(),
+            media_type=first.headers.get("content-type"),
+            headers={"content-disposition": first.headers.get("content-disposition", "")},
+        )
+
+    async def _enrich_owners(self, servers: list[dict], headers: list[tuple[bytes, bytes]]) -> None:
+        control = self.clients[CONTROL_SHARD]
+        users_resp, tokens_resp = await asyncio.gather(
+            control.get(f"{API}/admin/users", headers=headers),
+            control.get(f"{API}/admin/tokens", headers=headers),
+        )
+        users = {u["id"]: u for u in users_resp.json()} if users_resp.status_code == 200 else {}
+        tokens = {t["id"]: t for t in tokens_resp.json()} if tokens_resp.status_code == 200 else {}
+        for s in servers:
+            owner = users.get(s.get("usuario_id"))
+            token = tokens.get(s.get("token_id"))
+            s["owner_nome"] = owner["nome"] if owner else "Desconhecido"
+            s["owner_email"] = owner["email"] if owner else "?"
+            s["token_nome"] = token["nome"] if token else "Token removido"
+
+
+def _merge_summaries(bodies: list[dict]) -> dict:
+    """Sum numeric fields and count dicts key-wise across shard responses."""
+    merged: dict[str, Any] = {}
+    for body in bodies:
+        for key, value in body.items():
+            if isinstance(value, dict):
+                target = merged.setdefault(key, {})
+                for k, v in value.items():
+                    target[k] = target.get(k, 0) + v
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+            else:
+                merged.setdefault(key, value)
+    if "recent_logs" in merged:
+        # A capped count, not a sum: each shard reports min(its total, 10)
+        merged["recent_logs"] = min(merged.get("total_logs", 0), 10)
+    return merged
+
+
+def create_router_app() -> Starlette:
+    """uvicorn factory for router workers; configured by main() via the environment."""
+    # Read fresh: with a single worker this runs in the process that set the env
+    config = Settings()
+    sockets = [p for p in config.shard_sockets.split(os.pathsep) if p]
+    router = ShardRouter(sockets, config.shard_internal_secret, config.shard_token_cache_ttl_seconds)
+    methods = ["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"]
+    return Starlette(routes=[Route("/{path:path}", router.handle, methods=methods)])
+
+
+def _spawn_shards(count: int, secret: str, sockdir: str) -> tuple[list[subprocess.Popen], list[str]]:
+    procs, sockets = [], []
+    for index in range(count):
+        path = os.path.join(sockdir, f"shard-{index}.sock")
+        env = {
+            **os.environ,
+            "SHARD_COUNT": str(count),
+            "SHARD_INDEX": str(index),
+            "SHARD_INTERNAL_SECRET": secret,
+        }
+        procs.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--uds", path, "--proxy-headers", "--forwarded-allow-ips", "*", "--no-access-log",
+            ],
+            env=env,
+        ))
+        sockets.append(path)
+    deadline = time.monotonic() + 30
+    while not all(os.path.exists(p) for p in sockets):
+        if time.monotonic() > deadline or any(p.poll() is not None for p in procs):
+            raise RuntimeError("shard processes failed to start")
+        time.sleep(0.1)
+    return procs, sockets
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run SynexGuard as a sharded multi-process deployment")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--routers", type=int, default=1, help="Front router worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    secret = secrets.token_urlsafe(32)
+    sockdir = tempfile.mkdtemp(prefix="synexguard-shards-")
+    procs, sockets = _spawn_shards(args.shards, secret, sockdir)
+    os.environ.update(
+        SHARD_COUNT=str(args.shards),
+        SHARD_SOCKETS=os.pathsep.join(sockets),
+        SHARD_INTERNAL_SECRET=secret,
+    )
+    try:
+        uvicorn.run(
+            "app.scaleout:create_router_app",
+            factory=True,
+            host=args.host,
+            port=args.port,
+            workers=args.routers,
+            access_log=False,
+        )
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+        shutil.rmtree(sockdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Cross-server attack correlation.
+
+The automation rules look at one event at a time against a short window.
+An attacker that spreads a few attempts over many servers, or works slowly,
+never trips them. The correlation engine keeps a small amount of windowed
+state per (tenant, source IP), shared across all of the tenant's servers:
+
+* servers hit, ordered by last hit, so stale ones fall off the front;
+* the timestamps of the last ``min_failures`` failed logins, which is enough
+  to decide "at least N failures inside the window" exactly;
+* the recent event-type sequence, with repeats collapsed.
+
+Every step is O(1) amortized: each server, failure and source is inserted
+once and expired once, and expiry only ever looks at the oldest entry.
+Memory is bounded per source (servers, failures, sequence) and per tenant
+(``max_sources``, least recently active evicted first).
+
+``observe`` returns a ``Finding`` when a source crosses a threshold. The
+store turns it into an incident, an alert and a tenant-wide ban; later
+events from the same source update that incident instead of opening a
+new one. The incident is reserved under the engine lock (``opens``), so
+heartbeats from several servers racing on the same source open it once.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+
+FAILURE_TYPES = frozenset({"ssh_login_failed"})
+HOSTILE_TYPES = FAILURE_TYPES | {"port_scan", "firewall_drop"}
+# Recon, then password guessing, then a successful login from the same source
+KILL_CHAIN = ("port_scan", "ssh_login_failed", "ssh_login_success")
+TRACKED_TYPES = HOSTILE_TYPES | {KILL_CHAIN[-1]}
+MAX_SERVERS_PER_SOURCE = 256
+SEQUENCE_LENGTH = 8
+
+
+class _Source:
+    __slots__ = ("servers", "failures", "sequence", "first_seen", "last_seen", "incident", "incident_kind")
+
+    def __init__(self, min_failures: int, ts: float) -> None:
+        self.servers: OrderedDict[int, float] = OrderedDict()  # servidor_id -> last hit
+        self.failures: deque[float] = deque(maxlen=min_failures)
+        self.sequence: deque[tuple[float, str]] = deque(maxlen=SEQUENCE_LENGTH)
+        self.first_seen = ts
+        self.last_seen = ts
+        self.incident: dict | None = None  # open incident, set by the store
+        # Kind of the incident reserved under the engine lock, set before the
+        # store has built it, so concurrent heartbeats open it only once
+        self.incident_kind: str | None = None
+
+
+@dataclass
+class Finding:
+    kind: str  # "distributed_bruteforce" | "kill_chain"
+    usuario_id: int
+    ip: str
+    source: _Source = field(repr=False)
+    opens: bool = False  # this finding opens (or escalates) the source's incident
+
+    # Copied on demand: ongoing attacks produce a finding per event
+    @property
+    def servers(self) -> list[int]:
+        return list(self.source.servers)
+
+    @property
+    def sequence(self) -> list[str]:
+        return [tipo for _, tipo in self.source.sequence]
+
+
+class CorrelationEngine:
+    def __init__(self, window_seconds: float, min_servers: int, min_failures: int, max_sources: int) -> None:
+        self.window = window_seconds
+        self.min_servers = min_servers
+        self.min_failures = max(1, min_failures)
+        self.max_sources = max_sources
+        self._tenants: dict[int, OrderedDict[str, _Source]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, event: dict) -> Finding | None:
+        """Feed one event; returns a finding when its source crosses a threshold."""
+        tipo = event["tipo"]
+        ip = event.get("origem_ip")
+        if tipo not in TRACKED_TYPES or not ip:
+            return None
+        usuario_id = event["usuario_id"]
+        ts = event["criado_em"].timestamp()
+        cutoff = ts - self.window
+        with self._lock:
+            sources = self._tenants.get(usuario_id)
+            if sources is None:
+                sources = self._tenants[usuario_id] = OrderedDict()
+            while sources and next(iter(sources.values())).last_seen < cutoff:
+                sources.popitem(last=False)
+
+            src = sources.get(ip)
+            if src is None:
+                if tipo not in HOSTILE_TYPES:
+                    return None  # a successful login alone is not worth tracking
+                if len(sources) >= self.max_sources:
+                    sources.popitem(last=False)
+                src = sources[ip] = _Source(self.min_failures, ts)
+            else:
+                sources.move_to_end(ip)
+            src.last_seen = ts
+
+            servidor_id = event.get("servidor_id")
+            if servidor_id is not None and tipo in HOSTILE_TYPES:
+                src.servers.pop(servidor_id, None)
+                src.servers[servidor_id] = ts
+                if len(src.servers) > MAX_SERVERS_PER_SOURCE:
+                    src.servers.popitem(last=False)
+            while src.servers and next(iter(src.servers.values())) < cutoff:
+                src.servers.popitem(last=False)
+            if tipo in FAILURE_TYPES:
+                src.failures.append(ts)
+            if not src.sequence or src.sequence[-1][1] != tipo:
+                src.sequence.append((ts, tipo))
+
+            kind = self._match(src, tipo, cutoff)
+            opens = kind is not None and (
+                src.incident_kind is None or (kind == "kill_chain" and src.incident_kind != "kill_chain")
+            )
+            if opens:
+                src.incident_kind = kind
+            elif src.incident_kind is None:
+                return None
+            return Finding(
+                kind=kind or src.incident_kind,
+                usuario_id=usuario_id,
+                ip=ip,
+                source=src,
+                opens=opens,
+            )
+
+    def _match(self, src: _Source, tipo: str, cutoff: float) -> str | None:
+        if tipo == KILL_CHAIN[-1]:
+            step = 0
+            for ts, seen in src.sequence:
+                if ts >= cutoff and seen == KILL_CHAIN[step]:
+                    step += 1
+                    if step == len(KILL_CHAIN):
+                        return "kill_chain"
+        if (
+            tipo in FAILURE_TYPES
+            and len(src.servers) >= self.min_servers
+            and len(src.failures) == self.min_failures
+            and src.failures[0] >= cutoff
+        ):
+            return "distributed_bruteforce"
+        return None
+
+    def sizes(self) -> dict[str, int]:
+        return {"correlation_sources": sum(len(s) for s in list(self._tenants.values()))}
@@ -0,0 +1,270 @@
+"""
+Local GeoIP/ASN lookups from a memory-mapped range database.
+
+The database is a flat binary file of sorted, non-overlapping IP ranges.
+Lookups run a binary search directly over the mmap, so the table stays in
+the page cache and never becomes Python objects. Only the results of
+recent lookups do, and those live in a bounded LRU: attacker IPs repeat a
+lot, so most ingest-path lookups hit the cache.
+
+Build a database from an ip2asn-style TSV (range_start, range_end,
+AS_number, country_code, AS_description; CSV also works) with:
+
+    python -m app.services.geoip build ip2asn-combined.tsv /var/lib/synexguard/geoip.db
+    python -m app.services.geoip lookup /var/lib/synexguard/geoip.db 8.8.8.8
+
+The builder writes to a temporary file and renames it over the old one.
+The running API notices the new mtime within ``geoip_reload_interval_seconds``
+and swaps it in without a restart. Lookups already in flight finish on the
+old mapping, which stays valid because the rename leaves its inode alone.
+
+File layout (little-endian):
+
+    header   b"SGGEOIP1", v4 count u32, v6 count u32, strings offset u32, reserved u32
+    v4 rows  start 4s, end 4s, asn u32, org u32, country 2s      (18 bytes, big-endian keys)
+    v6 rows  start 16s, end 16s, asn u32, org u32, country 2s    (42 bytes)
+    strings  u16 length + UTF-8, addressed by offset from the strings section
+
+Keys are big-endian packed addresses, so comparing raw bytes orders them
+the same way as comparing the addresses.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import socket
+import struct
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from app.core.config import settings
+
+logger = logging.getLogger("synexguard.geoip")
+
+MAGIC = b"SGGEOIP1"
+_HEADER = struct.Struct("<8sIIII")
+_TAIL = struct.Struct("<II2s")  # asn, org offset, country
+_NO_ORG = 0xFFFFFFFF
+_MISS = object()
+_V4_MAPPED = b"\0" * 10 + b"\xff\xff"
+
+
+class GeoIPDatabase:
+    """Read-only view over one database file."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, v4_count, v6_count, strings, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a GeoIP database")
+        v4_base = _HEADER.size
+        v6_base = v4_base + v4_count * (8 + _TAIL.size)
+        if v6_base + v6_count * (32 + _TAIL.size) > strings or strings > len(self._mm):
+            raise ValueError(f"{path} is truncated")
+        self._tables = {4: (v4_base, v4_count), 16: (v6_base, v6_count)}
+        self._strings = strings
+        self.ranges = v4_count + v6_count
+
+    def lookup(self, packed: bytes) -> dict | None:
+        width = len(packed)
+        base, count = self._tables[width]
+        row = 2 * width + _TAIL.size
+        mm = self._mm
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            off = base + mid * row
+            if mm[off : off + width] <= packed:
+                lo = mid + 1
+            else:
+                hi = mid
+        if not lo:
+            return None
+        off = base + (lo - 1) * row
+        if mm[off + width : off + 2 * width] < packed:
+            return None
+        asn, org_off, country = _TAIL.unpack_from(mm, off + 2 * width)
+        org = None
+        if org_off != _NO_ORG:
+            start = self._strings + org_off
+            (length,) = struct.unpack_from("<H", mm, start)
+            org = mm[start + 2 : start + 2 + length].decode("utf-8", "replace")
+        return {
+            "pais": country.decode("ascii") if country != b"\0\0" else None,
+            "asn": asn or None,
+            "org": org,
+        }
+
+
+class GeoIP:
+    """Cached resolver that hot-swaps the database when its file changes."""
+
+    def __init__(self, path: str, cache_size: int, reload_interval: float) -> None:
+        self.path = path
+        self._cache_size = cache_size
+        self._reload_interval = reload_interval
+        self._cache: OrderedDict[str, dict | None] = OrderedDict()
+        self._lock = Lock()
+        self._db: GeoIPDatabase | None = None
+        self._next_check = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def lookup(self, ip: str | None) -> dict | None:
+        """``{"pais", "asn", "org"}`` for ``ip``, or None when unknown."""
+        if not ip or not self.path:
+            return None
+        if time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        with self._lock:
+            hit = self._cache.get(ip, _MISS)
+            if hit is not _MISS:
+                self._cache.move_to_end(ip)
+                return hit
+        db, packed = self._db, _packed(ip)
+        result = db.lookup(packed) if db is not None and packed is not None else None
+        with self._lock:
+            self._cache[ip] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def _maybe_reload(self) -> None:
+        self._next_check = time.monotonic() + self._reload_interval
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            if self._db is not None:
+                logger.warning("geoip_db_missing", extra={"path": self.path})
+            return
+        if self._db is not None and self._db.signature == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return
+        try:
+            db = GeoIPDatabase(self.path)
+        except (OSError, ValueError, struct.error) as exc:
+            logger.error("geoip_db_invalid", extra={"path": self.path, "error": str(exc)})
+            return
+        # The old mapping is closed when the last in-flight lookup drops it
+        with self._lock:
+            self._db = db
+            self._cache.clear()
+        logger.info("geoip_db_loaded", extra={"path": self.path, "ranges": db.ranges})
+
+    def cache_entries(self) -> int:
+        return len(self._cache)
+
+
+def _packed(ip: str) -> bytes | None:
+    # inet_pton is several times cheaper than ipaddress on the miss path
+    try:
+        return socket.inet_pton(socket.AF_INET, ip)
+    except OSError:
+        pass
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, ip.partition("%")[0])
+    except (OSError, ValueError):
+        return None
+    return packed[12:] if packed.startswith(_V4_MAPPED) else packed
+
+
+geoip = GeoIP(settings.geoip_db_path, settings.geoip_cache_size, settings.geoip_reload_interval_seconds)
+
+
+# ── Builder ───────────────────────────────────────────────────────────
+def build(source: str, output: str) -> tuple[int, int]:
+    """Compile a range TSV/CSV into ``output``; returns (rows written, rows skipped)."""
+    rows: dict[int, list[tuple[bytes, bytes, int, int, bytes]]] = {4: [], 16: []}
+    orgs: dict[str, int] = {}
+    strings = bytearray()
+    skipped = 0
+    with open(source, encoding="utf-8", newline="") as f:
+        first = f.readline()
+        f.seek(0)
+        for fields in csv.reader(f, delimiter="\t" if "\t" in first else ","):
+            try:
+                start, end = ipaddress.ip_address(fields[0].strip()), ipaddress.ip_address(fields[1].strip())
+                asn = int(fields[2])
+            except (IndexError, ValueError):
+                skipped += 1  # header line or malformed row
+                continue
+            country = fields[3].strip().upper() if len(fields) > 3 else ""
+            org = fields[4].strip() if len(fields) > 4 else ""
+            if start.version != end.version or start > end or (not asn and len(country) != 2):
+                skipped += 1
+                continue
+            if org in ("", "Not routed"):
+                org_off = _NO_ORG
+            else:
+                org_off = orgs.get(org)
+                if org_off is None:
+                    encoded = org.encode()[:0xFFFF]
+                    org_off = orgs[org] = len(strings)
+                    strings += struct.pack("<H", len(encoded)) + encoded
+            code = country.encode("ascii") if len(country) == 2 and country.isalpha() else b"\0\0"
+            rows[len(start.packed)].append((start.packed, end.packed, asn, org_off, code))
+
+    body = bytearray()
+    counts = {}
+    for width in (4, 16):
+        table = sorted(rows[width])
+        kept, last_end = 0, None
+        for start, end, asn, org_off, code in table:
+            if last_end is not None and start <= last_end:
+                skipped += 1  # overlapping range; the first one wins
+                continue
+            body += start + end + _TAIL.pack(asn, org_off, code)
+            last_end = end
+            kept += 1
+        counts[width] = kept
+
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".geoip-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, counts[4], counts[16], _HEADER.size + len(body), 0))
+            f.write(body)
+            f.write(strings)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, output)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return counts[4] + counts[16], skipped
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build or query a SynexGuard GeoIP/ASN database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="compile an ip2asn-style TSV/CSV")
+    p_build.add_argument("source")
+    p_build.add_argument("output")
+    p_lookup = sub.add_parser("lookup", help="resolve addresses against a database")
+    p_lookup.add_argument("database")
+    p_lookup.add_argument("ips", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        written, skipped = build(args.source, args.output)
+        print(f"{args.output}: {written} ranges ({skipped} rows skipped)")
+    else:
+        db = GeoIPDatabase(args.database)
+        for ip in args.ips:
+            packed = _packed(ip)
+            print(ip, db.lookup(packed) if packed is not None else "invalid address")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
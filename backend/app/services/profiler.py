@@ -0,0 +1,137 @@
+"""
+Statistical wall-clock profiler for the running API worker.
+
+A daemon thread periodically snapshots every thread's stack through
+``sys._current_frames()`` (event loop, anyio worker threads running sync
+routes, hashing pool, ...) and aggregates them into the collapsed-stack
+format consumed by flamegraph.pl / speedscope / inferno:
+
+    thread;outer_fn (module.py:12);inner_fn (other.py:40) 17
+
+Overhead is bounded by the minimum interval, a duty-cycle cap on the time
+spent sampling, a maximum stack depth and a cap on distinct stacks.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from time import perf_counter
+
+MAX_STACK_DEPTH = 64
+MAX_DISTINCT_STACKS = 20_000
+MAX_DUTY_CYCLE = 0.05  # at most 5% of wall time spent taking samples
+
+
+class ProfilerBusy(RuntimeError):
+    """A profiling session is already running on this worker."""
+
+
+@dataclass
+class ProfileResult:
+    stacks: Counter = field(default_factory=Counter)
+    samples: int = 0
+    sampling_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    truncated: int = 0
+
+    @property
+    def overhead(self) -> float:
+        return self.sampling_seconds / self.wall_seconds if self.wall_seconds else 0.0
+
+    def collapsed(self) -> str:
+        lines = [f"{';'.join(stack)} {n}" for stack, n in self.stacks.most_common()]
+        if self.truncated:
+            lines.append(f"[truncated] {self.truncated}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    def __init__(self) -> None:
+        self._session = threading.Lock()
+        self._labels: dict[object, str] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._session.locked()
+
+    def start(self, duration: float, interval: float) -> tuple[Future, threading.Event]:
+        """Start a session in the background; returns (result future, stop event)."""
+        if not self._session.acquire(blocking=False):
+            raise ProfilerBusy("a profiling session is already running")
+        result: Future = Future()
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self._run,
+            args=(duration, interval, stop, result),
+            name="synexguard-profiler",
+            daemon=True,
+        )
+        try:
+            thread.start()
+        except BaseException:
+            self._session.release()
+            raise
+        return result, stop
+
+    def _run(self, duration: float, interval: float, stop: threading.Event, result: Future) -> None:
+        try:
+            result.set_result(self._sample(duration, interval, stop))
+        except BaseException as exc:  # noqa: BLE001
+            result.set_exception(exc)
+        finally:
+            self._labels.clear()
+            self._session.release()
+
+    def _sample(self, duration: float, interval: float, stop: threading.Event) -> ProfileResult:
+        profile = ProfileResult()
+        own_ident = threading.get_ident()
+        started = perf_counter()
+        deadline = started + duration
+        while not stop.is_set():
+            tick = perf_counter()
+            if tick >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            current = sys._current_frames()
+            for ident, frame in current.items():
+                if ident == own_ident:
+                    continue
+                stack = self._stack(names.get(ident, f"thread-{ident}"), frame)
+                if stack in profile.stacks or len(profile.stacks) < MAX_DISTINCT_STACKS:
+                    profile.stacks[stack] += 1
+                else:
+                    profile.truncated += 1
+            # Don't keep other threads' frames (and their locals) alive between ticks
+            del current, frame
+            profile.samples += 1
+            spent = perf_counter() - tick
+            profile.sampling_seconds += spent
+            # Stretch the interval when sampling gets expensive (many threads,
+            # deep stacks) so the duty cycle never exceeds MAX_DUTY_CYCLE.
+            stop.wait(max(interval, spent / MAX_DUTY_CYCLE) - spent)
+        profile.wall_seconds = perf_counter() - started
+        return profile
+
+    def _stack(self, thread_name: str, frame) -> tuple[str, ...]:
+        frames: list[str] = []
+        while frame is not None and len(frames) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                filename = os.path.basename(code.co_filename)
+                label = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+                self._labels[code] = label
+            frames.append(label)
+            frame = frame.f_back
+        frames.append(thread_name.replace(";", ":"))
+        frames.reverse()
+        return tuple(frames)
+
+
+profiler = SamplingProfiler()
+
@@ -0,0 +1,285 @@
+"""
+In-memory inverted index over event text, one per tenant.
+
+Each tenant numbers its events with increasing ordinals in arrival order. So
+higher ordinal means more recent, and every posting list is sorted for free.
+Postings are ``array('I')`` of ordinals (4 bytes per term occurrence). A
+parallel ``array('d')`` of timestamps maps time ranges to ordinal ranges by
+bisection.
+
+Indexed text: ``mensagem``, ``origem_ip``, the GeoIP country, ``as<asn>``
+and org, and the scalar values of ``payload``. Tokens are lowercased words. Compound tokens such as
+``root@10.0.0.1`` or ``/var/log/auth.log`` are indexed whole and also by
+their parts (split on ``@ / : -``), so both the full value and a username
+or IP inside it can be found.
+
+Query syntax (``parse_query``):
+
+    root ssh            both terms
+    root OR admin       either term
+    root -success       root but not success (NOT success works too)
+    10.0.*              prefix match (at least 3 characters before the *)
+
+Results come newest first. The cursor is the ordinal of the last returned
+event, so a page stays stable while new events arrive, and also across
+retention pruning.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+_TOKEN_RE = re.compile(r"\w[\w.:@/\-]*")
+_PART_RE = re.compile(r"[@/:\-]+")
+_TRAILING = ".:@/-"
+MAX_TERM_LENGTH = 64
+MAX_PREFIX_TERMS = 2048
+PREFIX_KEY = 3  # prefix queries look up terms by their first N characters
+MAX_PAYLOAD_VALUES = 64
+
+
+class QueryError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> set[str]:
+    tokens: set[str] = set()
+    for raw in _TOKEN_RE.findall(text.lower()):
+        token = raw.rstrip(_TRAILING)
+        if not token or len(token) > MAX_TERM_LENGTH:
+            continue
+        tokens.add(token)
+        if _PART_RE.search(token):
+            for part in _PART_RE.split(token):
+                part = part.strip(".")
+                if part:
+                    tokens.add(part)
+    return tokens
+
+
+def _payload_values(value: Any, out: list[str]) -> None:
+    if len(out) >= MAX_PAYLOAD_VALUES:
+        return
+    if isinstance(value, dict):
+        for v in value.values():
+            _payload_values(v, out)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _payload_values(v, out)
+    elif value is not None and not isinstance(value, bool):
+        out.append(str(value))
+
+
+def event_text(event: dict) -> str:
+    parts = [event.get("mensagem") or "", event.get("origem_ip") or ""]
+    geo = event.get("geo")
+    if geo:
+        parts += [geo["pais"] or "", f"as{geo['asn']}" if geo["asn"] else "", geo["org"] or ""]
+    _payload_values(event.get("payload"), parts)
+    return " ".join(parts)
+
+
+@dataclass
+class Term:
+    text: str
+    prefix: bool = False
+
+
+@dataclass
+class Clause:
+    include: list[Term] = field(default_factory=list)
+    exclude: list[Term] = field(default_factory=list)
+
+
+def parse_query(q: str) -> list[Clause]:
+    """Split on OR into clauses of ANDed terms; ``-term``/``NOT term`` exclude."""
+    clauses = [Clause()]
+    negate = False
+    for word in q.split():
+        if word == "OR":
+            clauses.append(Clause())
+            continue
+        if word == "NOT":
+            negate = True
+            continue
+        if word.startswith("-") and len(word) > 1:
+            negate, word = True, word[1:]
+        prefix = word.endswith("*")
+        text = word.rstrip("*").lower()
+        if not prefix:
+            text = text.rstrip(_TRAILING)
+        if not text:
+            raise QueryError(f"empty term in {word!r}")
+        if prefix and len(text) < PREFIX_KEY:
+            raise QueryError(f"prefix {text!r}* is too short; use at least {PREFIX_KEY} characters")
+        target = clauses[-1].exclude if negate else clauses[-1].include
+        target.append(Term(text, prefix))
+        negate = False
+    for clause in clauses:
+        if not clause.include:
+            raise QueryError("every OR branch needs at least one positive term")
+    return clauses
+
+
+def _contains(postings: array, ordinal: int) -> bool:
+    i = bisect_left(postings, ordinal)
+    return i < len(postings) and postings[i] == ordinal
+
+
+class _TenantIndex:
+    __slots__ = ("postings", "by_prefix", "docs", "times", "base")
+
+    def __init__(self) -> None:
+        self.postings: dict[str, array] = {}
+        self.by_prefix: dict[str, set[str]] = {}
+        self.docs: list[dict] = []
+        self.times = array("d")
+        self.base = 0  # ordinal of docs[0]; grows as retention drops old events
+
+
+class SearchIndex:
+    def __init__(self) -> None:
+        self._tenants: dict[int, _TenantIndex] = {}
+        self._lock = threading.Lock()
+
+    # ── Maintenance ────────────────────────────────────────────────
+    def add(self, event: dict) -> None:
+        tokens = tokenize(event_text(event))
+        with self._lock:
+            idx = self._tenants.get(event["usuario_id"])
+            if idx is None:
+                idx = self._tenants[event["usuario_id"]] = _TenantIndex()
+            ordinal = idx.base + len(idx.docs)
+            idx.docs.append(event)
+            idx.times.append(event["criado_em"].timestamp())
+            postings = idx.postings
+            for token in tokens:
+                plist = postings.get(token)
+                if plist is None:
+                    plist = postings[token] = array("I")
+                    idx.by_prefix.setdefault(token[:PREFIX_KEY], set()).add(token)
+                plist.append(ordinal)
+
+    def prune(self, cutoff: float) -> int:
+        """Drop events older than ``cutoff`` (epoch seconds); returns how many."""
+        dropped = 0
+        with self._lock:
+            for uid in list(self._tenants):
+                idx = self._tenants[uid]
+                k = bisect_left(idx.times, cutoff)
+                if not k:
+                    continue
+                dropped += k
+                if k == len(idx.docs):
+                    del self._tenants[uid]
+                    continue
+                # Replace rather than mutate, so queries holding a snapshot stay valid
+                idx.docs = idx.docs[k:]
+                idx.times = idx.times[k:]
+                idx.base += k
+                empty = []
+                for term, plist in idx.postings.items():
+                    i = bisect_left(plist, idx.base)
+                    if i == len(plist):
+                        empty.append(term)
+                    elif i:
+                        idx.postings[term] = plist[i:]
+                for term in empty:
+                    del idx.postings[term]
+                    key = term[:PREFIX_KEY]
+                    # Searches copy buckets under the lock, so in-place is safe here
+                    bucket = idx.by_prefix[key]
+                    bucket.discard(term)
+                    if not bucket:
+                        del idx.by_prefix[key]
+        return dropped
+
+    def sizes(self) -> dict[str, int]:
+        tenants = list(self._tenants.values())
+        return {
+            "search_docs": sum(len(t.docs) for t in tenants),
+            "search_terms": sum(len(t.postings) for t in tenants),
+        }
+
+    # ── Queries ────────────────────────────────────────────────────
+    def search(
+        self,
+        usuario_id: int,
+        clauses: list[Clause],
+        since: float | None = None,
+        until: float | None = None,
+        cursor: int | None = None,
+        limit: int = 50,
+    ) -> tuple[list[dict], int | None]:
+        """Newest-first matches older than ``cursor``; returns (events, next cursor)."""
+        with self._lock:
+            idx = self._tenants.get(usuario_id)
+            if idx is None:
+                return [], None
+            docs, times, base, postings = idx.docs, idx.times, idx.base, idx.postings
+            end = base + len(docs)
+            candidates = {
+                term.text: list(idx.by_prefix.get(term.text[:PREFIX_KEY], ()))
+                for clause in clauses
+                for term in clause.include + clause.exclude
+                if term.prefix
+            }
+
+        lo = base + (bisect_left(times, since, 0, end - base) if since is not None else 0)
+        hi = base + (bisect_right(times, until, 0, end - base) if until is not None else end - base)
+        if cursor is not None:
+            hi = min(hi, cursor)
+        if lo >= hi:
+            return [], None
+
+        streams = []
+        for clause in clauses:
+            include = [self._resolve(postings, candidates, t) for t in clause.include]
+            if any(not p for p in include):
+                continue
+            exclude = [p for p in (self._resolve(postings, candidates, t) for t in clause.exclude) if p]
+            streams.append(self._clause(include, exclude, lo, hi))
+
+        results: list[dict] = []
+        last = None
+        for ordinal in heapq.merge(*streams, reverse=True):
+            if ordinal == last:
+                continue
+            last = ordinal
+            results.append(docs[ordinal - base])
+            if len(results) == limit:
+                return results, ordinal
+        return results, None
+
+    @staticmethod
+    def _resolve(postings: dict[str, array], candidates: dict[str, list[str]], term: Term) -> array:
+        if not term.prefix:
+            return postings.get(term.text) or array("I")
+        matches = [
+            p for t in candidates[term.text] if t.startswith(term.text) and (p := postings.get(t)) is not None
+        ]
+        if len(matches) > MAX_PREFIX_TERMS:
+            raise QueryError(f"prefix {term.text!r}* matches too many terms; make it longer")
+        if len(matches) == 1:
+            return matches[0]
+        return array("I", sorted(set().union(*matches)))
+
+    @staticmethod
+    def _clause(include: list[array], exclude: list[array], lo: int, hi: int) -> Iterator[int]:
+        # Drive from the rarest term, probe the others by bisection
+        include = sorted(include, key=len)
+        driver, others = include[0], include[1:]
+        i = bisect_left(driver, hi) - 1
+        while i >= 0:
+            ordinal = driver[i]
+            if ordinal < lo:
+                return
+            if all(_contains(p, ordinal) for p in others) and not any(_contains(p, ordinal) for p in exclude):
+                yield ordinal
+            i -= 1
@@ -0,0 +1,213 @@
+"""
+Fixed-size streaming sketches for attack statistics.
+
+``/security/stats`` answers "top attacking IPs", "most targeted usernames"
+and "how many distinct attackers" without scanning the attempt log. Each
+tenant has tumbling windows per clock hour and per UTC day, keeping the
+current and the previous one. Each window holds:
+
+* ``SpaceSaving`` summaries of the top attacker IPs and targeted usernames,
+  with ``attack_stats_top_k`` counters each. A reported count overestimates
+  the true one by at most its ``erro``, and ``erro`` is at most N/k for a
+  window of N items. Every item seen more than N/k times is in the summary,
+  and an item that is not listed was seen at most ``erro_max`` times.
+* ``HyperLogLog`` registers for distinct IPs and usernames, 2^p one-byte
+  registers (``attack_stats_hll_precision``), with a relative standard
+  error of 1.04/sqrt(2^p): 2.3% at p=11 and 1.6% at p=12.
+* exact counters of failed logins, successful logins, hostile events and
+  items from already-banned sources dropped at ingest (``trafego_bloqueado``).
+
+Memory per tenant is bounded: 4 windows x (2 x top_k counters + 2 x 2^p
+bytes), about 150 KiB with the defaults, however many attempts or distinct
+sources arrive.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from heapq import heapify, heapreplace
+
+from app.services.correlation import HOSTILE_TYPES
+
+_MASK64 = (1 << 64) - 1
+_POW2 = [2.0**-r for r in range(66)]
+
+
+class SpaceSaving:
+    """Top-k heavy hitters (Metwally, Agrawal, El Abbadi 2005)."""
+
+    __slots__ = ("k", "counts", "errors", "_heap")
+
+    def __init__(self, k: int) -> None:
+        self.k = k
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}  # only items that replaced another
+        # One (count, item) entry per tracked item. Keys lag behind increments,
+        # so they are lower bounds; the real minimum is the first fresh top.
+        self._heap: list[tuple[int, str]] = []
+
+    def add(self, item: str) -> None:
+        counts = self.counts
+        count = counts.get(item)
+        if count is not None:
+            counts[item] = count + 1
+            return
+        heap = self._heap
+        if len(counts) < self.k:
+            counts[item] = 1
+            heap.append((1, item))
+            if len(heap) == self.k:
+                heapify(heap)
+            return
+        while True:
+            key, victim = heap[0]
+            current = counts[victim]
+            if current == key:
+                break
+            heapreplace(heap, (current, victim))
+        heapreplace(heap, (key + 1, item))
+        del counts[victim]
+        self.errors.pop(victim, None)
+        counts[item] = key + 1
+        self.errors[item] = key
+
+    def floor(self) -> int:
+        """Largest count an untracked item can have had: the smallest counter once full."""
+        return min(self.counts.values()) if self.counts and len(self.counts) >= self.k else 0
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2^p one-byte registers (Flajolet et al. 2007)."""
+
+    __slots__ = ("p", "registers")
+
+    def __init__(self, p: int) -> None:
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, item: str) -> None:
+        # str hashes are SipHash, cached on the object and stable for the process
+        h = hash(item) & _MASK64
+        width = 64 - self.p
+        idx = h >> width
+        rank = width - (h & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    @staticmethod
+    def estimate(registers: bytes | bytearray) -> float:
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(_POW2[r] for r in registers)
+        zeros = registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return raw
+
+
+WINDOWS = {"hora": 3600, "dia": 86400}
+
+
+class _Bucket:
+    __slots__ = ("period", "ips", "users", "ip_hll", "user_hll", "falhas", "sucessos", "hostis", "bloqueados")
+
+    def __init__(self, period: int, top_k: int, precision: int) -> None:
+        self.period = period
+        self.ips = SpaceSaving(top_k)
+        self.users = SpaceSaving(top_k)
+        self.ip_hll = HyperLogLog(precision)
+        self.user_hll = HyperLogLog(precision)
+        self.falhas = 0
+        self.sucessos = 0
+        self.hostis = 0
+        self.bloqueados = 0
+
+
+class AttackStats:
+    """Per-tenant windowed sketches fed from the ingest path."""
+
+    def __init__(self, top_k: int, precision: int) -> None:
+        self.top_k = top_k
+        self.precision = max(4, min(precision, 16))
+        # usuario_id -> window -> [previous, current]
+        self._tenants: dict[int, dict[str, list[_Bucket | None]]] = {}
+        self._lock = threading.Lock()
+
+    def _buckets(self, usuario_id: int, ts: float) -> list[_Bucket]:
+        windows = self._tenants.get(usuario_id)
+        if windows is None:
+            windows = self._tenants[usuario_id] = {name: [None, None] for name in WINDOWS}
+        current = []
+        for name, size in WINDOWS.items():
+            pair = windows[name]
+            period = int(ts // size)
+            bucket = pair[1]
+            if bucket is None or bucket.period < period:
+                pair[0] = bucket if bucket is not None and bucket.period == period - 1 else None
+                bucket = pair[1] = _Bucket(period, self.top_k, self.precision)
+            current.append(bucket)  # late arrivals land in the current window
+        return current
+
+    def observe_login(self, attempt: dict) -> None:
+        with self._lock:
+            for bucket in self._buckets(attempt["usuario_id"], attempt["criado_em"].timestamp()):
+                if attempt["success"]:
+                    bucket.sucessos += 1
+                    continue
+                bucket.falhas += 1
+                bucket.users.add(attempt["user"])
+                bucket.user_hll.add(attempt["user"])
+
+    def observe_event(self, event: dict) -> None:
+        # Failed logins reach here too, as the ssh_login_failed event add_login_attempt emits
+        ip = event.get("origem_ip")
+        if event["tipo"] not in HOSTILE_TYPES or not ip:
+            return
+        with self._lock:
+            for bucket in self._buckets(event["usuario_id"], event["criado_em"].timestamp()):
+                bucket.hostis += 1
+                bucket.ips.add(ip)
+                bucket.ip_hll.add(ip)
+
+    def observe_blocked(self, usuario_id: int, ts: float, n: int) -> None:
+        """Heartbeat items dropped at ingest because their source is already banned."""
+        with self._lock:
+            for bucket in self._buckets(usuario_id, ts):
+                bucket.bloqueados += n
+
+    def summary(self, usuario_id: int, janela: str, anterior: bool, now: float, top: int) -> dict:
+        """Stats for the current (or previous) ``janela`` window as of ``now``."""
+        size = WINDOWS[janela]
+        period = int(now // size) - (1 if anterior else 0)
+        with self._lock:
+            pair = self._tenants.get(usuario_id, {}).get(janela, (None, None))
+            bucket = next((b for b in pair if b is not None and b.period == period), None)
+            if bucket is None:
+                bucket = _Bucket(period, 0, self.precision)
+            ips = sorted(bucket.ips.counts.items(), key=lambda kv: kv[1], reverse=True)[:top]
+            users = sorted(bucket.users.counts.items(), key=lambda kv: kv[1], reverse=True)[:top]
+            result = {
+                "inicio": period * size,
+                "fim": (period + 1) * size,
+                "totais": {
+                    "falhas_login": bucket.falhas,
+                    "logins_sucesso": bucket.sucessos,
+                    "eventos_hostis": bucket.hostis,
+                    "trafego_bloqueado": bucket.bloqueados,
+                },
+                "ips_distintos": round(HyperLogLog.estimate(bucket.ip_hll.registers)),
+                "usuarios_distintos": round(HyperLogLog.estimate(bucket.user_hll.registers)),
+                "top_ips": [{"ip": ip, "count": c, "erro": bucket.ips.errors.get(ip, 0)} for ip, c in ips],
+                "top_usuarios": [{"user": u, "count": c, "erro": bucket.users.errors.get(u, 0)} for u, c in users],
+                # No IP / username missing from the summary was seen more often than this
+                "erro_max": {"ips": bucket.ips.floor(), "usuarios": bucket.users.floor()},
+            }
+        return result
+
+    def sizes(self) -> dict[str, int]:
+        return {
+            "attack_stats_windows": sum(
+                b is not None for windows in list(self._tenants.values()) for pair in windows.values() for b in pair
+            )
+        }
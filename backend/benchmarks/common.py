@@ -0,0 +1,137 @@
+"""Shared helpers for the benchmark scripts."""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import time
+
+import httpx
+import psutil
+
+API = "/api/v1"
+
+EVENT_TYPES = [
+    ("port_scan", "critical"),
+    ("firewall_drop", "warning"),
+    ("service_restart", "info"),
+    ("package_update", "info"),
+    ("sudo_command", "warning"),
+]
+USERNAMES = ["root", "admin", "ubuntu", "deploy", "test", "oracle", "postgres", "git"]
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def rss_bytes(pid: int | None = None) -> int:
+    return psutil.Process(pid or os.getpid()).memory_info().rss
+
+
+def make_client(url: str | None) -> httpx.AsyncClient:
+    """HTTP client for a running server, or for the app in this process.
+
+    The per-IP rate limiter would throttle a single-host load generator, so the
+    in-process mode disables it; start a --url target with RATE_LIMIT_ENABLED=false.
+    """
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60, limits=limits)
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    logging.disable(logging.INFO)
+    from app.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60, limits=limits
+    )
+
+
+async def create_tenant(client: httpx.AsyncClient, label: str, password: str = "bench") -> tuple[str, str, str]:
+    """Register a user and create an agent token; returns (email, jwt, agent_token)."""
+    email = f"{label}-{time.time_ns()}@bench.local"
+    resp = await client.post(f"{API}/auth/register", json={"nome": label, "email": email, "password": password})
+    resp.raise_for_status()
+    resp = await client.post(f"{API}/auth/token", json={"email": email, "password": password})
+    resp.raise_for_status()
+    jwt = resp.json()["access_token"]
+    resp = await client.post(f"{API}/tokens", json={"nome": label}, headers={"Authorization": f"Bearer {jwt}"})
+    resp.raise_for_status()
+    return email, jwt, resp.json()["token"]
+
+
+def random_ip(rng: random.Random, pool: int = 0) -> str:
+    """Attacker address; with ``pool`` > 0 draw from a fixed set of that size."""
+    if pool:
+        n = rng.randrange(pool)
+        return f"203.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def heartbeat_payload(
+    rng: random.Random,
+    hostname: str,
+    events: int = 0,
+    login_attempts: int = 0,
+    ip_pool: int = 0,
+) -> dict:
+    """Same shape as collect_payload() in scripts/install-agent.sh."""
+    return {
+        "hostname": hostname,
+        "ip_publico": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+        "os_info": "Linux-6.1.0-18-amd64-x86_64-with-glibc2.36",
+        "cpu": round(rng.uniform(1, 99), 1),
+        "ram": round(rng.uniform(10, 90), 1),
+        "disk": round(rng.uniform(10, 80), 1),
+        "uptime": f"{rng.randint(0, 90)}d {rng.randint(0, 23)}h {rng.randint(0, 59)}m",
+        "conns": rng.randint(10, 5000),
+        "open_ports": sorted(rng.sample([22, 80, 443, 3306, 5432, 6379, 8000, 8080, 9090], 4)),
+        "interfaces": [
+            {"name": "eth0", "rx_bytes": rng.randint(0, 1 << 40), "tx_bytes": rng.randint(0, 1 << 40)},
+        ],
+        "login_attempts": [
+            {
+                "user": rng.choice(USERNAMES),
+                "ip": random_ip(rng, ip_pool),
+                "method": "SSH",
+                "success": rng.random() < 0.05,
+            }
+            for _ in range(login_attempts)
+        ],
+        "events": [
+            {
+                "tipo": tipo,
+                "severidade": sev,
+                "mensagem": f"{tipo} on {hostname}",
+                "origem_ip": random_ip(rng, ip_pool),
+                "payload": {"porta": rng.choice([22, 80, 443])},
+            }
+            for tipo, sev in (rng.choice(EVENT_TYPES) for _ in range(events))
+        ],
+    }
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    """Small-mean Poisson draw for per-heartbeat event counts."""
+    if mean <= 0:
+        return 0
+    limit, k, p = pow(2.718281828459045, -mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
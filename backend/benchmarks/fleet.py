@@ -0,0 +1,133 @@
+"""
+Fleet-scale load generator: N agents heartbeating while dashboard clients
+poll the list endpoints.
+
+Run from backend/:
+
+    python -m benchmarks.fleet --agents 200 --duration 20
+    python -m benchmarks.fleet --url http://127.0.0.1:8000 --pid <server pid>
+
+Agents send the payload shape of scripts/install-agent.sh, with a Poisson
+number of events and login attempts per heartbeat. Prints throughput and
+p50/p95/p99 latency per endpoint plus process RSS; --json writes the same
+report for comparison across commits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.common import API, create_tenant, heartbeat_payload, latency_summary, make_client, poisson, rss_bytes
+
+DASHBOARD_ENDPOINTS = ["/servers", "/events", "/servers/stats"]
+
+
+async def run(args: argparse.Namespace) -> dict:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    rng = random.Random(args.seed)
+
+    async with make_client(args.url) as client:
+        tenants = [await create_tenant(client, f"fleet{t}") for t in range(args.tenants)]
+        rss_start = rss_bytes(args.pid)
+        deadline = time.perf_counter() + args.duration
+
+        async def timed(name: str, request) -> None:
+            start = time.perf_counter()
+            try:
+                resp = await request
+            except httpx.HTTPError:
+                errors[name] += 1
+                return
+            if resp.status_code >= 400:
+                errors[name] += 1
+            else:
+                latencies[name].append(time.perf_counter() - start)
+
+        async def agent(n: int) -> None:
+            _, _, token = tenants[n % len(tenants)]
+            agent_rng = random.Random(rng.random())
+            headers = {"X-Agent-Token": token}
+            # Spread the first heartbeat so agents don't fire in lockstep
+            await asyncio.sleep(agent_rng.uniform(0, args.interval))
+            while time.perf_counter() < deadline:
+                payload = heartbeat_payload(
+                    agent_rng,
+                    f"node-{n:05d}",
+                    events=poisson(agent_rng, args.events_per_heartbeat),
+                    login_attempts=poisson(agent_rng, args.logins_per_heartbeat),
+                    ip_pool=args.ip_pool,
+                )
+                await timed("POST /agents/heartbeat", client.post(f"{API}/agents/heartbeat", json=payload, headers=headers))
+                await asyncio.sleep(args.interval)
+
+        async def dashboard(n: int) -> None:
+            _, jwt, _ = tenants[n % len(tenants)]
+            headers = {"Authorization": f"Bearer {jwt}"}
+            while time.perf_counter() < deadline:
+                for path in DASHBOARD_ENDPOINTS:
+                    params = {"limit": 500} if path == "/events" else None
+                    await timed(f"GET {path}", client.get(f"{API}{path}", params=params, headers=headers))
+                await asyncio.sleep(args.dashboard_interval)
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(agent(n) for n in range(args.agents)),
+            *(dashboard(n) for n in range(args.dashboards)),
+        )
+        elapsed = time.perf_counter() - started
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "url", "pid")},
+        "elapsed_s": round(elapsed, 2),
+        "rss_start_mb": round(rss_start / 2**20, 1),
+        "rss_end_mb": round(rss_bytes(args.pid) / 2**20, 1),
+        "endpoints": {
+            name: {
+                "rps": round(len(samples) / elapsed, 1),
+                "errors": errors.get(name, 0),
+                **latency_summary(samples),
+            }
+            for name, samples in sorted(latencies.items())
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"elapsed {report['elapsed_s']}s  rss {report['rss_start_mb']} -> {report['rss_end_mb']} MB")
+    print(f"{'endpoint':<28}{'rps':>9}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in report["endpoints"].items():
+        print(
+            f"{name:<28}{row['rps']:>9}{row['errors']:>6}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="Server PID for RSS when using --url")
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--dashboards", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between heartbeats per agent")
+    parser.add_argument("--dashboard-interval", type=float, default=1.0)
+    parser.add_argument("--events-per-heartbeat", type=float, default=0.5, help="Poisson mean")
+    parser.add_argument("--logins-per-heartbeat", type=float, default=0.5, help="Poisson mean")
+    parser.add_argument("--ip-pool", type=int, default=5000, help="Distinct attacker IPs (0 = unbounded)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Write the report to this file")
+    cli_args = parser.parse_args()
+    result = asyncio.run(run(cli_args))
+    print_report(result)
+    if cli_args.json:
+        with open(cli_args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,102 @@
+"""
+GeoIP enrichment (app.services.geoip): database build time, lookup cost
+with and without the LRU, and memory growth from mapping the file.
+
+Run from backend/:
+
+    python -m benchmarks.geoip                       # 500k IPv4 + 50k IPv6 ranges
+    python -m benchmarks.geoip --ranges 1000000 --lookups 500000
+
+A synthetic ip2asn-style TSV is generated in a temporary directory and
+compiled with the same builder as ``python -m app.services.geoip build``.
+"mmap binary search" runs the search directly for random addresses.
+"Attacker mix" replays an attacker-like mix through the resolver, where 90% of the
+lookups come from a small set of addresses. That is the cache hit rate
+the ingest path actually sees.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import ipaddress
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.common import rss_bytes
+
+ORGS = ["AMAZON-02", "DIGITALOCEAN-ASN", "CHINANET-BACKBONE", "OVH SAS", "Hetzner Online GmbH", "TELEFONICA BRASIL S.A"]
+COUNTRIES = ["US", "BR", "CN", "DE", "FR", "RU", "NL", "IN"]
+
+
+def _write_source(path: str, v4: int, v6: int, rng: random.Random) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        span = (2**32 - 2**24) // v4
+        for n in range(v4):
+            start = 2**24 + n * span
+            f.write(
+                f"{ipaddress.IPv4Address(start)}\t{ipaddress.IPv4Address(start + span - 1)}\t"
+                f"{rng.randrange(1, 400_000)}\t{rng.choice(COUNTRIES)}\t{rng.choice(ORGS)} {n % 5000}\n"
+            )
+        span6 = 2**96 // max(v6, 1)
+        for n in range(v6):
+            start = (0x2001 << 112) + n * span6
+            f.write(
+                f"{ipaddress.IPv6Address(start)}\t{ipaddress.IPv6Address(start + span6 - 1)}\t"
+                f"{rng.randrange(1, 400_000)}\t{rng.choice(COUNTRIES)}\t{rng.choice(ORGS)}\n"
+            )
+
+
+def _per_op(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def main(args: argparse.Namespace) -> int:
+    from app.services.geoip import GeoIP, GeoIPDatabase, _packed, build
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        source, db_path = os.path.join(tmp, "ranges.tsv"), os.path.join(tmp, "geoip.db")
+        _write_source(source, args.ranges, args.ranges // 10, rng)
+        start = time.perf_counter()
+        written, _ = build(source, db_path)
+        print(f"build: {written:,} ranges in {time.perf_counter() - start:.1f}s, {os.path.getsize(db_path) / 2**20:.1f} MiB file")
+
+        ips = [str(ipaddress.IPv4Address(rng.randrange(2**24, 2**32))) for _ in range(args.lookups)]
+        packed = [_packed(ip) for ip in ips]
+        gc.collect()
+        before = rss_bytes()
+        db = GeoIPDatabase(db_path)
+        t_search = _per_op(db.lookup, packed)
+        # Touched pages of a file mapping count towards RSS but are shared page cache
+        print(f"mmap binary search: {t_search * 1e9:,.0f} ns/lookup, rss growth {(rss_bytes() - before) / 2**20:.1f} MiB")
+
+        resolver = GeoIP(db_path, args.cache_size, 3600)
+        t_miss = _per_op(resolver.lookup, ips)
+        attackers = ips[:1000]
+        mix = [rng.choice(attackers) if rng.random() < 0.9 else ips[rng.randrange(len(ips))] for _ in range(args.lookups)]
+        t_hot = _per_op(resolver.lookup, mix)
+        print(f"resolver, all misses: {t_miss * 1e9:,.0f} ns/lookup")
+        print(f"resolver, attacker mix (90% from 1k IPs): {t_hot * 1e9:,.0f} ns/lookup, cache {resolver.cache_entries():,} entries")
+
+        # Hot swap: rebuild over the live file and time the next lookup that notices it
+        resolver._reload_interval = 0
+        build(source, db_path)
+        start = time.perf_counter()
+        resolver.lookup(ips[0])
+        print(f"hot swap (reload + first lookup): {(time.perf_counter() - start) * 1e3:.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ranges", type=int, default=500_000, help="IPv4 ranges; a tenth as many IPv6 ranges are added")
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--cache-size", type=int, default=65536)
+    sys.exit(main(parser.parse_args()))
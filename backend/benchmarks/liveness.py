@@ -0,0 +1,83 @@
+"""
+Heartbeat liveness at fleet scale: upsert cost and expiry cost with 100k
+servers.
+
+Run from backend/:
+
+    python -m benchmarks.liveness                   # 100k servers, 10% go dark
+    python -m benchmarks.liveness --servers 200000 --dark 0.5
+
+The store runs on a virtual clock. Every server heartbeats once, and then
+all but --dark of them keep heartbeating. The benchmark times three things:
+a heartbeat (``upsert_server``) with the whole fleet registered, the no-op
+``expire_heartbeats`` call that every /servers read makes, and the
+expiry passes that flip the dark servers to stale and then to offline.
+The offline pass includes the agent_offline events and alerts it emits.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+import time
+
+from benchmarks.soak import VirtualClock, install_clock
+
+
+def main(args: argparse.Namespace) -> int:
+    logging.disable(logging.INFO)
+    from app.core.config import settings
+    from app.db import store
+
+    clock = VirtualClock()
+    install_clock(clock)
+    tenants = max(1, args.servers // 1000)
+
+    def heartbeat(n: int) -> None:
+        store.upsert_server(n % tenants + 1, n % tenants + 1, f"node-{n:06d}", "10.0.0.1", "Linux", cpu=50.0)
+
+    start = time.perf_counter()
+    for n in range(args.servers):
+        heartbeat(n)
+    print(f"registered {args.servers:,} servers in {time.perf_counter() - start:.1f}s")
+
+    clock.advance(30)
+    dark = int(args.servers * args.dark)
+    start = time.perf_counter()
+    for n in range(dark, args.servers):
+        heartbeat(n)
+    per_hb = (time.perf_counter() - start) / (args.servers - dark)
+    print(f"heartbeat (upsert_server): {per_hb * 1e6:.1f} us")
+
+    start = time.perf_counter()
+    for _ in range(10_000):
+        store.expire_heartbeats()
+    print(f"expire_heartbeats, nothing due: {(time.perf_counter() - start) / 10_000 * 1e9:,.0f} ns")
+
+    clock.advance(settings.heartbeat_stale_after_seconds - 29)
+    start = time.perf_counter()
+    stale = store.expire_heartbeats()
+    print(f"stale pass: {stale:,} servers in {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    clock.advance(settings.heartbeat_offline_after_seconds)
+    # Keep the live part of the fleet alive so only the dark servers go offline
+    for n in range(dark, args.servers):
+        heartbeat(n)
+    start = time.perf_counter()
+    offline = store.expire_heartbeats()
+    elapsed = time.perf_counter() - start
+    print(f"offline pass: {offline:,} servers in {elapsed * 1e3:.1f} ms ({elapsed / max(offline, 1) * 1e6:.1f} us each, with event + alert)")
+
+    online = sum(1 for s in store.servers if s["status"] == "online")
+    if online != args.servers - dark:
+        print(f"FAILED: expected {args.servers - dark} online, found {online}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=100_000)
+    parser.add_argument("--dark", type=float, default=0.1, help="share of servers that stop heartbeating")
+    sys.exit(main(parser.parse_args()))
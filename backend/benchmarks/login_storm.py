@@ -0,0 +1,104 @@
+"""
+Login-storm load test: agent heartbeat latency with and without a burst of
+password logins hitting the API at the same time.
+
+Run from backend/:
+
+    python -m benchmarks.login_storm                      # in-process (ASGI)
+    python -m benchmarks.login_storm --url http://127.0.0.1:8000
+
+Start a --url target with RATE_LIMIT_ENABLED=false (see benchmarks.common).
+
+Exits non-zero when heartbeat p99 during the storm exceeds the baseline
+p99 by more than --max-ratio.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import API, create_tenant, make_client, percentile
+
+
+async def heartbeats(
+    client: httpx.AsyncClient, token: str, agents: int, duration: float
+) -> list[float]:
+    latencies: list[float] = []
+    deadline = time.perf_counter() + duration
+
+    async def agent(n: int) -> None:
+        payload = {"hostname": f"storm-{n}", "cpu": 10.0, "ram": 20.0, "disk": 30.0}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            resp = await client.post(
+                f"{API}/agents/heartbeat", json=payload, headers={"X-Agent-Token": token}
+            )
+            if resp.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(agent(n) for n in range(agents)))
+    return latencies
+
+
+async def login_storm(
+    client: httpx.AsyncClient, email: str, workers: int, duration: float
+) -> dict[str, int]:
+    codes: dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            resp = await client.post(
+                f"{API}/auth/token", json={"email": email, "password": "wrong-password"}
+            )
+            codes[str(resp.status_code)] = codes.get(str(resp.status_code), 0) + 1
+            if resp.status_code == 503:
+                # Well-behaved clients back off instead of hot-looping on 503
+                await asyncio.sleep(0.1)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return codes
+
+
+def summarize(label: str, samples: list[float]) -> float:
+    p99 = percentile(samples, 99)
+    print(
+        f"{label:<10} n={len(samples):<6} "
+        f"p50={percentile(samples, 50) * 1000:7.2f}ms "
+        f"p99={p99 * 1000:7.2f}ms "
+        f"mean={(statistics.fmean(samples) if samples else 0) * 1000:7.2f}ms"
+    )
+    return p99
+
+
+async def main(args: argparse.Namespace) -> int:
+    async with make_client(args.url) as client:
+        email, _, token = await create_tenant(client, "storm")
+        baseline = await heartbeats(client, token, args.agents, args.duration)
+        storm_task = asyncio.create_task(login_storm(client, email, args.logins, args.duration))
+        during = await heartbeats(client, token, args.agents, args.duration)
+        codes = await storm_task
+
+    base_p99 = summarize("baseline", baseline)
+    storm_p99 = summarize("storm", during)
+    print(f"login responses: {codes}")
+    ratio = storm_p99 / base_p99 if base_p99 else 0.0
+    print(f"heartbeat p99 ratio storm/baseline: {ratio:.2f} (max {args.max_ratio})")
+    return 0 if ratio <= args.max_ratio else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--agents", type=int, default=20, help="Concurrent heartbeat senders")
+    parser.add_argument("--logins", type=int, default=100, help="Concurrent login workers in the storm")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per phase")
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    sys.exit(asyncio.run(main(parser.parse_args())))
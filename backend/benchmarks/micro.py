@@ -0,0 +1,133 @@
+"""
+Microbenchmarks for the store hot paths.
+
+Run from backend/:
+
+    python -m benchmarks.micro                      # print results
+    python -m benchmarks.micro --save before.json   # keep a baseline
+    python -m benchmarks.micro --compare before.json
+
+Each benchmark runs in a fresh interpreter (spawned process) against a store
+pre-populated with --servers servers and --events events, so results don't
+depend on what ran before.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+import time
+from typing import Callable
+
+BENCHMARKS = ["upsert_server", "add_event", "evaluate_rules", "correlate", "dashboard_stats"]
+
+
+def _populate(servers: int, events: int, tenants: int) -> None:
+    from app.db import store
+    from benchmarks.common import EVENT_TYPES, random_ip
+
+    rng = random.Random(7)
+    for n in range(servers):
+        store.upsert_server(n % tenants + 1, n % tenants + 1, f"node-{n:05d}", "10.0.0.1", "Linux")
+    for n in range(events):
+        tipo, sev = rng.choice(EVENT_TYPES[1:])  # keep port_scan out of setup: it bans
+        store.add_event(n % tenants + 1, n % servers + 1 if servers else None, "node", tipo, sev, "setup", random_ip(rng, 5000))
+
+
+def _workload(name: str, servers: int, tenants: int) -> Callable[[int], None]:
+    from app.db import store
+
+    rng = random.Random(11)
+    if name == "upsert_server":
+        def op(i: int) -> None:
+            n = i % max(servers, 1)
+            store.upsert_server(n % tenants + 1, n % tenants + 1, f"node-{n:05d}", "10.0.0.1", "Linux", cpu=rng.random() * 100)
+    elif name == "add_event":
+        def op(i: int) -> None:
+            store.add_event(i % tenants + 1, 1, "node", "firewall_drop", "warning", "drop", f"198.51.100.{i % 250}")
+    elif name == "evaluate_rules":
+        event = {"tipo": "ssh_login_failed", "usuario_id": 1, "servidor_id": 1, "hostname": "node"}
+
+        def op(i: int) -> None:
+            # Distinct IPs so the brute-force rule counts but never bans
+            event["origem_ip"] = f"198.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+            store._evaluate_automation_rules(event)
+    elif name == "correlate":
+        event = {"tipo": "ssh_login_failed", "usuario_id": 1, "hostname": "node", "criado_em": store.now()}
+
+        def op(i: int) -> None:
+            # A few hundred sources rotating over the fleet, each below the thresholds
+            event["origem_ip"] = f"203.0.{(i >> 8) & 1}.{i & 255}"
+            event["servidor_id"] = i % max(servers, 1) + 1
+            event["criado_em"] = store.now()
+            store.correlator.observe(event)
+    elif name == "dashboard_stats":
+        def op(i: int) -> None:
+            store.get_dashboard_stats(i % tenants + 1)
+    else:
+        raise ValueError(name)
+    return op
+
+
+def _run_one(job: tuple[str, int, int, int, int, int]) -> dict:
+    name, servers, events, tenants, ops, repeats = job
+    import logging
+
+    logging.disable(logging.INFO)
+    _populate(servers, events, tenants)
+    op = _workload(name, servers, tenants)
+    timings = []
+    for r in range(repeats):
+        start = time.perf_counter()
+        base = r * ops
+        for i in range(base, base + ops):
+            op(i)
+        timings.append((time.perf_counter() - start) / ops)
+    return {
+        "ns_per_op": round(statistics.median(timings) * 1e9),
+        "min_ns_per_op": round(min(timings) * 1e9),
+        "ops": ops,
+        "repeats": repeats,
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name in args.only or BENCHMARKS:
+        ops = args.ops if name != "dashboard_stats" else max(1, args.ops // 100)
+        with ctx.Pool(1) as pool:
+            results[name] = pool.apply(_run_one, ((name, args.servers, args.events, args.tenants, ops, args.repeats),))
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{'benchmark':<18}{'ns/op':>12}{'min':>12}{'baseline':>12}{'delta':>9}")
+    for name, row in results.items():
+        ref = baseline.get(name, {}).get("ns_per_op")
+        delta = f"{(row['ns_per_op'] - ref) / ref * 100:+.1f}%" if ref else ""
+        print(f"{name:<18}{row['ns_per_op']:>12}{row['min_ns_per_op']:>12}{ref or '':>12}{delta:>9}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")}, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--servers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--tenants", type=int, default=10)
+    parser.add_argument("--ops", type=int, default=20_000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare against a file written by --save")
+    sys.exit(main(parser.parse_args()))
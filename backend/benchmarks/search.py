@@ -0,0 +1,130 @@
+"""
+Event full-text search (app.services.search): index build rate, memory and
+query latency at fleet-scale event counts.
+
+Run from backend/:
+
+    python -m benchmarks.search                         # 1M events, 4 tenants
+    python -m benchmarks.search --events 10000000 --tenants 10
+
+The index is fed synthetic login/firewall events directly, without going
+through the store or HTTP. Each event's text is freshly generated, but all
+events share one record dict whose fields are overwritten before each
+``add``. The index keeps only references to records, so this measures the
+index's own memory (postings, timestamps, term dict) and not the cost of
+storing 10M event dicts. Query latency is unaffected, because result
+records are only dereferenced for the page being returned.
+
+Each query shape runs --repeats times against the largest tenant, with
+random terms, and reports p50/p99 for one 50-item page.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import EVENT_TYPES, USERNAMES, percentile, rss_bytes
+
+RARE_USER = "zabbix"
+RARE_EVERY = 100_000
+
+
+def _build(index, events: int, tenants: int, ip_pool: int, span_days: int) -> list[str]:
+    rng = random.Random(7)
+    ips = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for _ in range(ip_pool)]
+    start = datetime.now(timezone.utc) - timedelta(days=span_days)
+    step = span_days * 86400 / events
+    record = {"id": 0, "usuario_id": 1, "criado_em": start, "mensagem": "", "origem_ip": None, "payload": None}
+    report_every = max(1, events // 10)
+    t0 = time.perf_counter()
+    for n in range(events):
+        ip = ips[rng.randrange(ip_pool)]
+        if n % 3:
+            user = RARE_USER if n % RARE_EVERY == 0 else USERNAMES[rng.randrange(len(USERNAMES))]
+            outcome = "Failed" if rng.random() < 0.9 else "Successful"
+            record["mensagem"] = f"{outcome} login as '{user}' from {ip} via SSH"
+            record["payload"] = {"user": user, "method": "SSH", "porta": 22}
+        else:
+            tipo, _ = EVENT_TYPES[rng.randrange(len(EVENT_TYPES))]
+            record["mensagem"] = f"{tipo} on node-{n % 500:03d}"
+            record["payload"] = {"servico": tipo}
+        record["id"] = n
+        record["usuario_id"] = 1 + n % tenants
+        record["origem_ip"] = ip
+        record["criado_em"] = start + timedelta(seconds=n * step)
+        index.add(record)
+        if (n + 1) % report_every == 0:
+            rate = (n + 1) / (time.perf_counter() - t0)
+            print(f"  {n + 1:>11,} events  {rate:>9,.0f}/s  rss {rss_bytes() / 2**20:,.0f} MiB", flush=True)
+    return ips
+
+
+def _queries(rng: random.Random, ips: list[str], now: float) -> dict[str, callable]:
+    """shape -> () -> (query, since, until, pages)."""
+    day = 86400.0
+    return {
+        "common term": lambda: ("failed", None, None, 1),
+        "rare username": lambda: (RARE_USER, None, None, 1),
+        "exact ip": lambda: (rng.choice(ips), None, None, 1),
+        "ip prefix": lambda: (rng.choice(ips).rsplit(".", 2)[0] + ".*", None, None, 1),
+        "AND": lambda: (f"{rng.choice(USERNAMES)} successful", None, None, 1),
+        "AND rare pair": lambda: (f"{RARE_USER} {rng.choice(ips)}", None, None, 1),
+        "OR": lambda: (f"{rng.choice(USERNAMES)} OR {rng.choice(USERNAMES)}", None, None, 1),
+        "negation": lambda: (f"{rng.choice(USERNAMES)} -failed", None, None, 1),
+        "time range": lambda: ("failed", now - 7 * day, now - 6 * day, 1),
+        "page 20": lambda: ("failed", None, None, 20),
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    from app.services.search import SearchIndex, parse_query
+
+    index = SearchIndex()
+    gc.collect()
+    base_rss = rss_bytes()
+    print(f"building index: {args.events:,} events across {args.tenants} tenants")
+    t0 = time.perf_counter()
+    ips = _build(index, args.events, args.tenants, args.ip_pool, args.span_days)
+    elapsed = time.perf_counter() - t0
+    sizes = index.sizes()
+    print(
+        f"built in {elapsed:.1f}s ({args.events / elapsed:,.0f} events/s), "
+        f"{sizes['search_terms']:,} terms, index rss {(rss_bytes() - base_rss) / 2**20:,.0f} MiB"
+    )
+
+    rng = random.Random(11)
+    now = time.time()
+    print(f"\n{'query':<16}{'hits/page':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, make in _queries(rng, ips, now).items():
+        timings, hits = [], 0
+        for _ in range(args.repeats):
+            q, since, until, pages = make()
+            clauses = parse_query(q)
+            start = time.perf_counter()
+            cursor = None
+            for _ in range(pages):
+                items, cursor = index.search(1, clauses, since, until, cursor, 50)
+                if cursor is None:
+                    break
+            timings.append(time.perf_counter() - start)
+            hits += len(items)
+        print(
+            f"{name:<16}{hits / args.repeats:>10.0f}"
+            f"{percentile(timings, 50) * 1000:>10.3f}{percentile(timings, 99) * 1000:>10.3f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--ip-pool", type=int, default=50_000, help="distinct source addresses")
+    parser.add_argument("--span-days", type=int, default=30, help="time range the events are spread over")
+    parser.add_argument("--repeats", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""
+List-endpoint serialization: the fragment-cache path (app.core.fastjson)
+against the previous per-request dict building + jsonable_encoder.
+
+Run from backend/:
+
+    python -m benchmarks.serialize                  # 500-item responses
+    python -m benchmarks.serialize --items 200 --repeats 500
+
+For each endpoint, the store is filled with --items records for one tenant.
+The benchmark times three things: building the response body the old way,
+the fast path with an empty cache (the first request), and the fast path
+with a warm cache. Before timing, it checks that both paths produce
+identical bytes. The gzip columns show what the ETag render cache saves
+per poll by keeping compressed variants: the cost of compressing a body
+once, and the compressed size as a share of the original.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from typing import Callable
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def _populate(items: int) -> None:
+    from app.db import store
+    from benchmarks.common import EVENT_TYPES, random_ip
+
+    rng = random.Random(5)
+    for n in range(items):
+        store.upsert_server(1, 1, f"node-{n:05d}", "10.0.0.1", "Linux", cpu=rng.random() * 100, open_ports=[22, 80, 443])
+        tipo, sev = rng.choice(EVENT_TYPES[1:])
+        store.add_event(1, 1, "node", tipo, sev, f"evento {n} com acentuação", random_ip(rng))
+        store.add_login_attempt(1, 1, "node", "root", random_ip(rng), "SSH", False)
+        store.add_alert(1, 1, "node", f"Alerta {n}", "warning", "mensagem")
+        store.add_audit_log(1, "update", "server", str(n), {"campo": "cpu", "valor": n})
+    store.drain_audit_queue()
+
+
+def _endpoints(items: int) -> dict[str, tuple[Callable[[], dict], Callable[[], bytes], Callable[[], None]]]:
+    """name -> (legacy payload builder, fast body builder, cache reset)."""
+    from app.core.fastjson import list_body
+    from app.db import store
+    from app.routers import alerts, audit, events, security, servers
+
+    user = {"user_id": 1, "role": "user"}
+
+    def reset(cache) -> Callable[[], None]:
+        return lambda: cache._entries.clear()
+
+    def latest(records: list[dict]) -> list[dict]:
+        return sorted(records, key=lambda r: r["criado_em"], reverse=True)[:items]
+
+    return {
+        "servers": (
+            lambda: {"items": [servers._server_out(s) for s in store.servers]},
+            # These two endpoints also sit behind the ETag render cache; time the body itself
+            lambda: list_body(servers.server_json, [s for s in store.servers if s["usuario_id"] == 1]),
+            reset(servers.server_json),
+        ),
+        "events": (
+            lambda: {"items": [events._event_out(e) for e in latest(store.events)], "total": len(store.events)},
+            lambda: events.list_events(user=user, limit=items, tipo=None, severidade=None).body,
+            reset(events.event_json),
+        ),
+        "login_attempts": (
+            lambda: {
+                "items": [security._login_attempt_out(a) for a in latest(store.login_attempts)],
+                "stats": {"total": len(store.login_attempts), "blocked": len(store.login_attempts), "suspicious": 0},
+            },
+            lambda: security.list_login_attempts(user=user, limit=items).body,
+            reset(security.login_attempt_json),
+        ),
+        "alerts": (
+            lambda: {"items": [alerts._alert_out(a) for a in latest(store.alerts)], "total": len(store.alerts)},
+            lambda: list_body(alerts.alert_json, latest([a for a in store.alerts if a["usuario_id"] == 1]), total=len(store.alerts)),
+            reset(alerts.alert_json),
+        ),
+        "audit_logs": (
+            lambda: {"items": [audit._audit_log_out(a) for a in latest(store.audit_logs)], "total": min(items, len(store.audit_logs))},
+            lambda: audit.list_audit_logs(user=user, limit=items).body,
+            reset(audit.audit_log_json),
+        ),
+    }
+
+
+def _time(fn: Callable[[], object], repeats: int, before: Callable[[], None] | None = None) -> float:
+    timings = []
+    for _ in range(repeats):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main(args: argparse.Namespace) -> int:
+    import logging
+
+    logging.disable(logging.INFO)
+    _populate(args.items)
+    print(f"{args.items}-item responses, median of {args.repeats}")
+    from app.core.compression import compress
+
+    print(f"{'endpoint':<16}{'legacy us':>11}{'cold us':>10}{'warm us':>10}{'speedup':>9}{'gzip us':>10}{'ratio':>8}")
+    mismatched = []
+    for name, (legacy, fast, reset) in _endpoints(args.items).items():
+        def legacy_body() -> bytes:
+            return JSONResponse(jsonable_encoder(legacy())).body
+
+        if legacy_body() != fast():
+            mismatched.append(name)
+        t_legacy = _time(legacy_body, args.repeats)
+        t_cold = _time(fast, max(1, args.repeats // 10), before=reset)
+        t_warm = _time(fast, args.repeats)
+        body = fast()
+        t_gzip = _time(lambda: compress("gzip", body), max(1, args.repeats // 10))
+        ratio = len(compress("gzip", body)) / len(body)
+        print(
+            f"{name:<16}{t_legacy * 1e6:>11.0f}{t_cold * 1e6:>10.0f}{t_warm * 1e6:>10.0f}{t_legacy / t_warm:>8.1f}x"
+            f"{t_gzip * 1e6:>10.0f}{ratio:>8.1%}"
+        )
+    if mismatched:
+        print(f"\nFAILED: response bytes differ for {', '.join(mismatched)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=200)
+    sys.exit(main(parser.parse_args()))
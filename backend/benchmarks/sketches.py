@@ -0,0 +1,112 @@
+"""
+Attack-statistics sketches (app.services.sketches): update cost, memory
+per tenant, and observed error against exact counts.
+
+Run from backend/:
+
+    python -m benchmarks.sketches                      # 2M failed logins over one UTC day
+    python -m benchmarks.sketches --attempts 5000000 --sources 500000 --top-k 200
+
+One tenant receives a Zipf-distributed stream of attacker IPs and
+usernames, spread evenly over a day. The benchmark reports the ns per
+observe_login + observe_event pair (what one failed login costs at
+ingest), the traced memory of the tenant's windows, and the ``summary``
+query time for the last hour and the whole day. It also checks every returned top-k row against the exact counts:
+``count - erro <= true <= count`` must hold. Distinct counts are compared
+with the exact cardinality. Fails if a bound is violated or a distinct
+estimate is off by more than 4 standard errors.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import accumulate
+from bisect import bisect_left
+
+
+def _zipf(n: int, s: float, rng: random.Random, count: int) -> list[int]:
+    cum = list(accumulate(1 / (i + 1) ** s for i in range(n)))
+    total = cum[-1]
+    return [bisect_left(cum, rng.random() * total) for _ in range(count)]
+
+
+def main(args: argparse.Namespace) -> int:
+    from app.services.sketches import AttackStats
+
+    rng = random.Random(5)
+    ips = [f"{rng.randrange(1, 224)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}" for _ in range(args.sources)]
+    users = ["root", "admin", "ubuntu", "test", "oracle"] + [f"user{i}" for i in range(args.sources // 10)]
+    ip_ranks = _zipf(len(ips), 1.1, rng, args.attempts)
+    user_ranks = _zipf(len(users), 1.2, rng, args.attempts)
+    start_ts = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+    step = 86400 / args.attempts
+    stream = [
+        (
+            {"usuario_id": 1, "user": users[u], "success": False, "criado_em": datetime.fromtimestamp(start_ts + n * step, timezone.utc)},
+            {"usuario_id": 1, "tipo": "ssh_login_failed", "origem_ip": ips[i], "criado_em": datetime.fromtimestamp(start_ts + n * step, timezone.utc)},
+        )
+        for n, (i, u) in enumerate(zip(ip_ranks, user_ranks))
+    ]
+
+    stats = AttackStats(args.top_k, args.precision)
+    t0 = time.perf_counter()
+    for attempt, event in stream:
+        stats.observe_login(attempt)
+        stats.observe_event(event)
+    elapsed = time.perf_counter() - t0
+    # Same stream again into a fresh instance, traced: tracemalloc would skew the timing
+    traced = AttackStats(args.top_k, args.precision)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for attempt, event in stream:
+        traced.observe_login(attempt)
+        traced.observe_event(event)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del traced
+    print(f"{args.attempts:,} failed logins from {args.sources:,} sources over one day")
+    print(f"update (login + event): {elapsed / args.attempts * 1e9:,.0f} ns")
+    print(f"memory for the tenant: {memory / 1024:,.0f} KiB ({stats.sizes()['attack_stats_windows']} windows, top_k={args.top_k}, p={args.precision})")
+
+    now = start_ts + 86400 - 1
+    failed = 0
+    for janela, size in (("hora", 3600), ("dia", 86400)):
+        t0 = time.perf_counter()
+        summary = stats.summary(1, janela, False, now, 10)
+        query_ms = (time.perf_counter() - t0) * 1e3
+        window = [(a, e) for a, e in stream if a["criado_em"].timestamp() // size == now // size]
+        exact_ips = Counter(e["origem_ip"] for _, e in window)
+        exact_users = Counter(a["user"] for a, _ in window)
+        for name, rows, key, exact in (("ip", summary["top_ips"], "ip", exact_ips), ("user", summary["top_usuarios"], "user", exact_users)):
+            for row in rows:
+                true = exact[row[key]]
+                if not row["count"] - row["erro"] <= true <= row["count"]:
+                    print(f"FAILED: {name} {row[key]} true={true} outside [{row['count'] - row['erro']}, {row['count']}]")
+                    failed += 1
+            worst = max((row["erro"] for row in rows), default=0)
+            print(f"  {janela} top-10 {name}s: max erro {worst:,} on N={len(window):,} (bound N/k={len(window) // args.top_k:,})")
+        se = 1.04 / math.sqrt(1 << args.precision)
+        for name, estimate, exact in (("ips", summary["ips_distintos"], len(exact_ips)), ("users", summary["usuarios_distintos"], len(exact_users))):
+            rel = (estimate - exact) / exact
+            print(f"  {janela} distinct {name}: {estimate:,} vs {exact:,} exact ({rel * 100:+.1f}%, standard error {se * 100:.1f}%)")
+            if abs(rel) > 4 * se:
+                print("FAILED: distinct estimate outside 4 standard errors")
+                failed += 1
+        print(f"  {janela} summary query: {query_ms:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=2_000_000)
+    parser.add_argument("--sources", type=int, default=200_000, help="distinct attacker IPs in the pool")
+    parser.add_argument("--top-k", type=int, default=64)
+    parser.add_argument("--precision", type=int, default=11)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,226 @@
+"""
+Soak test: replay hours of synthetic fleet traffic against the in-process app
+on an accelerated clock and fail if any in-memory structure keeps growing.
+
+Run from backend/:
+
+    python -m benchmarks.soak                          # 6 simulated hours
+    python -m benchmarks.soak --hours 24 --agents 50 --limit events=200000
+
+Each step advances the virtual clock by --step seconds. During a step,
+every agent sends one heartbeat. Attackers rotate source IPs every
+--rotate-every steps: they brute-force SSH through the agents' reports
+and probe the API directly, so the rate limiter sees them too.
+Dashboards poll the list endpoints.
+
+The store and the rate limiter read the virtual clock. Structure sizes
+(store.structure_sizes(), rate_limiter.sizes()) and tracemalloc totals
+are sampled every --snapshot-every steps. The growth rate over the
+second half of the run is compared against the per-structure limits, in
+items per simulated hour. Structures with no limit are reported but
+never fail the run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from benchmarks.common import API, heartbeat_payload, random_ip
+
+# Structures that must plateau once the working set is warm. Data lists
+# without a retention policy (events, login_attempts, alerts, ...) grow
+# with traffic by design and are only reported unless --limit is given.
+DEFAULT_LIMITS = {
+    "servers": 0.0,
+    "traffic": 0.0,
+    "automation_rules": 0.0,
+    "ip_fail_counters": 50.0,
+    "rate_limiter_clients": 50.0,
+    "rate_limiter_blocked": 50.0,
+    "change_feed_waiters": 0.0,
+}
+
+
+class VirtualClock:
+    def __init__(self) -> None:
+        self.t = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+
+    def advance(self, seconds: float) -> None:
+        self.t += seconds
+
+    def time(self) -> float:
+        return self.t
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.t, timezone.utc)
+
+
+def install_clock(clock: VirtualClock) -> None:
+    from app import middleware
+    from app.db import store
+
+    store.now = clock.now
+    middleware.time = clock.time
+
+
+def sizes() -> dict[str, int]:
+    from app.db import store
+    from app.middleware import rate_limiter
+
+    return {**store.structure_sizes(), **rate_limiter.sizes()}
+
+
+def slope_per_hour(points: list[tuple[float, float]]) -> float:
+    """Least-squares slope of (hours, value) points."""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / var if var else 0.0
+
+
+async def run(args: argparse.Namespace) -> int:
+    import httpx
+
+    os.environ["RATE_LIMIT_ENABLED"] = "true"
+    import logging
+
+    logging.disable(logging.INFO)
+    from app.main import app
+
+    clock = VirtualClock()
+    install_clock(clock)
+    rng = random.Random(args.seed)
+    if args.tracemalloc:
+        tracemalloc.start(1)
+
+    transport = httpx.ASGITransport(app=app, client=("10.255.0.1", 50000))
+
+    def as_client(ip: str) -> None:
+        # Requests run one at a time, so the transport's client address can be
+        # switched per request to give every simulated host its own source IP.
+        transport.client = (ip, 50000)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=60) as client:
+        tenants = []
+        for t in range(args.tenants):
+            as_client(f"10.254.0.{t + 1}")
+            email = f"soak{t}@bench.local"
+            await client.post(f"{API}/auth/register", json={"nome": f"soak{t}", "email": email, "password": "soak"})
+            jwt = (await client.post(f"{API}/auth/token", json={"email": email, "password": "soak"})).json()["access_token"]
+            token = (await client.post(f"{API}/tokens", json={"nome": "soak"}, headers={"Authorization": f"Bearer {jwt}"})).json()["token"]
+            tenants.append((jwt, token))
+
+        attacker_ips = [random_ip(rng) for _ in range(args.attackers)]
+        steps = int(args.hours * 3600 / args.step)
+        history: dict[str, list[tuple[float, float]]] = {}
+        heap: list[tuple[float, float]] = []
+        heap_half: tracemalloc.Snapshot | None = None
+        wall_start = time.perf_counter()
+
+        for step in range(steps):
+            clock.advance(args.step)
+            if step % args.rotate_every == 0:
+                attacker_ips = [random_ip(rng) for _ in range(args.attackers)]
+
+            for n in range(args.agents):
+                jwt, token = tenants[n % len(tenants)]
+                attempts = [
+                    {"user": "root", "ip": rng.choice(attacker_ips), "method": "SSH", "success": False}
+                    for _ in range(rng.randint(0, args.attempts_per_heartbeat))
+                ]
+                payload = heartbeat_payload(rng, f"soak-{n:04d}", events=rng.randint(0, 1))
+                payload["login_attempts"] = attempts
+                as_client(f"10.1.{n >> 8}.{n & 255}")
+                await client.post(f"{API}/agents/heartbeat", json=payload, headers={"X-Agent-Token": token})
+
+            for ip in attacker_ips:
+                as_client(ip)
+                await client.get(f"{API}/servers")
+
+            for d in range(args.dashboards):
+                jwt, _ = tenants[d % len(tenants)]
+                as_client(f"10.2.0.{d + 1}")
+                for path in ("/servers", "/events", "/alerts", "/servers/stats"):
+                    await client.get(f"{API}{path}", headers={"Authorization": f"Bearer {jwt}"})
+
+            if step % args.snapshot_every == 0 or step == steps - 1:
+                hours = (step + 1) * args.step / 3600
+                for name, value in sizes().items():
+                    history.setdefault(name, []).append((hours, value))
+                if args.tracemalloc:
+                    current, _ = tracemalloc.get_traced_memory()
+                    heap.append((hours, current / 2**20))
+                    if heap_half is None and step >= steps // 2:
+                        heap_half = tracemalloc.take_snapshot()
+
+        wall = time.perf_counter() - wall_start
+        heap_end = tracemalloc.take_snapshot() if args.tracemalloc else None
+
+    limits = {**DEFAULT_LIMITS, **args.limit}
+    failed = []
+    print(f"simulated {args.hours}h in {wall:.1f}s wall ({steps} steps of {args.step}s)")
+    print(f"{'structure':<24}{'final':>10}{'growth/h':>12}{'limit/h':>10}")
+    for name, points in sorted(history.items()):
+        second_half = [p for p in points if p[0] >= args.hours / 2]
+        rate = slope_per_hour(second_half)
+        limit = limits.get(name)
+        status = ""
+        if limit is not None and rate > limit:
+            failed.append(name)
+            status = "  FAIL"
+        print(f"{name:<24}{points[-1][1]:>10.0f}{rate:>12.1f}{'' if limit is None else limit:>10}{status}")
+
+    if heap:
+        heap_rate = slope_per_hour([p for p in heap if p[0] >= args.hours / 2])
+        heap_limit = "" if args.max_heap_mb_per_hour is None else args.max_heap_mb_per_hour
+        print(f"{'traced heap (MB)':<24}{heap[-1][1]:>10.1f}{heap_rate:>12.2f}{heap_limit:>10}")
+        if args.max_heap_mb_per_hour is not None and heap_rate > args.max_heap_mb_per_hour:
+            failed.append("traced heap")
+
+    if heap_half is not None and heap_end is not None:
+        print("\ntop allocators by growth over the second half:")
+        for stat in heap_end.compare_to(heap_half, "lineno")[: args.top]:
+            print(f"  {stat.size_diff / 1024:+10.1f} KiB  {stat.traceback.format()[-1].strip()}")
+
+    if failed:
+        print(f"\nFAILED: growth above limit for {', '.join(failed)}")
+        return 1
+    return 0
+
+
+def parse_limit(value: str) -> tuple[str, float]:
+    name, _, rate = value.partition("=")
+    return name, float(rate)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=6.0, help="Simulated duration")
+    parser.add_argument("--step", type=float, default=60.0, help="Simulated seconds per step")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--tenants", type=int, default=2)
+    parser.add_argument("--dashboards", type=int, default=2)
+    parser.add_argument("--attackers", type=int, default=10)
+    parser.add_argument("--attempts-per-heartbeat", type=int, default=3)
+    parser.add_argument("--rotate-every", type=int, default=5, help="Steps between attacker IP rotations")
+    parser.add_argument("--snapshot-every", type=int, default=10, help="Steps between size snapshots")
+    parser.add_argument("--limit", type=parse_limit, action="append", default=[], metavar="NAME=PER_HOUR",
+                        help="Max growth per simulated hour for a structure (repeatable)")
+    parser.add_argument("--max-heap-mb-per-hour", type=float, default=None)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="Skip allocation tracing (several times faster)")
+    parser.add_argument("--top", type=int, default=10, help="Allocators to list")
+    parser.add_argument("--seed", type=int, default=3)
+    cli_args = parser.parse_args()
+    cli_args.limit = dict(cli_args.limit)
+    sys.exit(asyncio.run(run(cli_args)))
@@ -51,7 +51,7 @@ for cmd in curl systemctl python3 pip3; do
 done
 
 echo "[2/5] Creating directories..."
-mkdir -p "$INSTALL_DIR" /etc/synexguard
+mkdir -p "$INSTALL_DIR" /etc/synexguard /var/lib/synexguard/spool
 
 echo "[3/5] Writing configuration..."
 cat > "$CONFIG_FILE" <<EOF
@@ -59,7 +59,23 @@ cat > "$CONFIG_FILE" <<EOF
 AGENT_TOKEN=${AGENT_TOKEN}
 API_URL=${API_URL}
 HEARTBEAT_INTERVAL=2
+# Slower collectors, in seconds: disk/uptime, socket count + listening ports, hostname/public IP
+DISK_INTERVAL=30
+SOCKETS_INTERVAL=30
+IDENTITY_INTERVAL=600
+# While the API is unreachable heartbeats are spooled here and uploaded in batches later
+SPOOL_DIR=/var/lib/synexguard/spool
+SPOOL_MAX_MB=64
+SPOOL_MAX_AGE_HOURS=24
+# Upper bound, in seconds, of the jittered exponential backoff between retries
+BACKOFF_MAX=300
+# sshd log to follow for login attempts (empty: auto-detect auth.log/secure, off: disabled)
+AUTH_LOG=
+AUTH_LOG_MAX_PER_HEARTBEAT=5000
 LOG_LEVEL=info
+# ipset: enforce the bans that apply to this server (tenant-wide and its own) with
+# ipset + iptables DROP rules; off: only track them
+BAN_ENFORCEMENT=ipset
 EOF
 chmod 600 "$CONFIG_FILE"
 
@@ -71,9 +87,16 @@ pip3 install --quiet --upgrade requests psutil || {
 
 cat > "${INSTALL_DIR}/agent.py" <<'EOF'
 #!/usr/bin/env python3
+import gzip
+import ipaddress
 import json
 import os
+import random
+import re
+import shutil
 import socket
+import subprocess
+import sys
 import time
 import platform
 
@@ -82,6 +105,14 @@ import requests
 
 
 CONFIG_FILE = "/etc/synexguard/agent.conf"
+SPOOL_BATCH_RECORDS = 200
+SPOOL_BATCH_BYTES = 4 << 20
+AUTH_LOGS = ("/var/log/auth.log", "/var/log/secure")
+# "Failed password for invalid user x from 1.2.3.4 port 22 ssh2", "Accepted publickey for y from ...",
+# logged by sshd[pid] or, from OpenSSH 9.8 on, by sshd-session[pid]
+SSHD_LOGIN = re.compile(rb"sshd(?:-session)?\[\d+\]: (Accepted|Failed) \S+ for (?:invalid user )?(.*?) from ([0-9A-Fa-f.:]+) port ")
+PROC_NET = ("/proc/net/tcp", "/proc/net/tcp6", "/proc/net/udp", "/proc/net/udp6")
+BAN_SETS = {4: ("synexguard", "inet", "iptables"), 6: ("synexguard6", "inet6", "ip6tables")}
 
 
 def load_config() -> dict:
@@ -122,26 +153,48 @@ def format_uptime(seconds: float) -> str:
   return f"{minutes}m"
 
 
-def collect_payload() -> dict:
-  hostname = socket.gethostname()
-  ip_publico = get_public_ip()
-  try:
-    os_info = platform.platform()
-  except Exception:
-    os_info = "Linux"
-
-  cpu = psutil.cpu_percent(interval=0.5)
-  ram = psutil.virtual_memory().percent
-  disk = psutil.disk_usage("/").percent
+def count_sockets() -> tuple[int, list[int]]:
+  """Open inet sockets and listening TCP ports, in one streaming pass over /proc/net.
 
-  boot_time = psutil.boot_time()
-  uptime_seconds = time.time() - boot_time
+  psutil.net_connections() builds an object per socket and maps each one to
+  its process, which costs seconds of CPU on hosts with 100k sockets. Here
+  each line is read once and only LISTEN lines are parsed.
+  """
+  conns = 0
+  ports: set[int] = set()
+  found = False
+  for path in PROC_NET:
+    try:
+      f = open(path, "r", encoding="ascii", errors="replace", buffering=1 << 16)
+    except OSError:
+      continue
+    found = True
+    tcp = path.startswith("/proc/net/tcp")
+    with f:
+      next(f, None)  # header
+      for line in f:
+        conns += 1
+        # Only the state column can be exactly " 0A ": the other fields are
+        # longer hex words, contain ':' or are decimal
+        if tcp and " 0A " in line:
+          local = line.split(None, 2)[1]
+          ports.add(int(local.rpartition(":")[2], 16))
+  if not found:  # no procfs (containers with a masked /proc, non-Linux)
+    sockets = psutil.net_connections()
+    conns = len(sockets)
+    ports = {c.laddr.port for c in sockets if c.status == psutil.CONN_LISTEN and c.laddr}
+  return conns, sorted(ports)
+
+
+def collect_gauges() -> dict:
+  # Non-blocking: the percentage covers the time since the previous call
+  return {
+    "cpu": round(psutil.cpu_percent(interval=None), 1),
+    "ram": round(psutil.virtual_memory().percent, 1),
+  }
 
-  conns = len(psutil.net_connections())
-  open_ports = sorted(
-    {c.laddr.port for c in psutil.net_connections() if c.status == psutil.CONN_LISTEN and c.laddr}
-  )
 
+def collect_interfaces() -> dict:
   interfaces = []
   for name, stats in psutil.net_io_counters(pernic=True).items():
     if name == "lo":
@@ -153,23 +206,604 @@ def collect_payload() -> dict:
         "tx_bytes": int(stats.bytes_sent),
       }
     )
+  return {"interfaces": interfaces}
+
 
+def collect_disk() -> dict:
   return {
-    "hostname": hostname,
-    "ip_publico": ip_publico,
-    "os_info": os_info,
-    "cpu": round(cpu, 1),
-    "ram": round(ram, 1),
-    "disk": round(disk, 1),
-    "uptime": format_uptime(uptime_seconds),
-    "conns": conns,
-    "open_ports": open_ports,
-    "interfaces": interfaces,
-    "login_attempts": [],
-    "events": [],
+    "disk": round(psutil.disk_usage("/").percent, 1),
+    "uptime": format_uptime(time.time() - psutil.boot_time()),
   }
 
 
+def collect_sockets() -> dict:
+  conns, open_ports = count_sockets()
+  return {"conns": conns, "open_ports": open_ports}
+
+
+def collect_identity() -> dict:
+  try:
+    os_info = platform.platform()
+  except Exception:
+    os_info = "Linux"
+  return {"hostname": socket.gethostname(), "ip_publico": get_public_ip(), "os_info": os_info}
+
+
+class Collector:
+  """One payload source on its own schedule; its last result is reused until it is due again."""
+
+  def __init__(self, name: str, interval: float, fn) -> None:
+    self.name = name
+    self.interval = interval
+    self.fn = fn
+    self.value: dict = {}
+    self.due = 0.0
+    self.runs = 0
+    self.cpu_seconds = 0.0
+
+  def get(self, now: float) -> dict:
+    if now >= self.due:
+      self.due = now + self.interval
+      start = time.process_time()
+      try:
+        self.value = self.fn()
+      except Exception as exc:  # noqa: BLE001
+        print(f"[synexguard-agent] collector {self.name} failed: {exc}")  # keep the last good value
+      self.cpu_seconds += time.process_time() - start
+      self.runs += 1
+    return self.value
+
+
+def build_collectors(cfg: dict, interval: float) -> list[Collector]:
+  def seconds(key: str, default: float) -> float:
+    try:
+      value = float(cfg.get(key, default))
+    except ValueError:
+      value = default
+    return max(value, interval)
+
+  psutil.cpu_percent(interval=None)  # prime the CPU delta for the first tick
+  return [
+    Collector("gauges", interval, collect_gauges),
+    Collector("interfaces", interval, collect_interfaces),
+    Collector("disk", seconds("DISK_INTERVAL", 30), collect_disk),
+    Collector("sockets", seconds("SOCKETS_INTERVAL", 30), collect_sockets),
+    Collector("identity", seconds("IDENTITY_INTERVAL", 600), collect_identity),
+  ]
+
+
+def collect_payload(collectors: list[Collector], now: float | None = None) -> dict:
+  if now is None:
+    now = time.monotonic()
+  payload = {"login_attempts": [], "events": []}
+  for collector in collectors:
+    payload.update(collector.get(now))
+  return payload
+
+
+class AuthLogTailer:
+  """Follows the sshd auth log and turns accept/fail lines into login_attempts.
+
+  Each poll reads on from a byte offset that is persisted across restarts,
+  parses only complete lines (a partial last line waits for the next poll)
+  and matches them with one precompiled pattern over the whole chunk. A
+  new inode at the path means the log was rotated: the old handle is read
+  to the end first. A file shorter than the offset was truncated in place
+  (copytruncate) and is read again from the start.
+
+  Memory and CPU per poll are bounded: at most ``read_budget`` bytes are
+  read, and at most ``max_attempts`` failures are returned. Failures past
+  that cap are only counted. Successful logins are always kept.
+  """
+
+  CHUNK = 1 << 18
+  MAX_LINE = 1 << 16
+
+  def __init__(self, path: str, state_path: str, max_attempts: int = 5000, read_budget: int = 16 << 20) -> None:
+    self.path = path
+    self.state_path = state_path
+    self.max_attempts = max_attempts
+    self.read_budget = read_budget
+    self.file = None
+    self.ino = None
+    self.offset = 0
+    self.tail = b""
+    self.saved = None
+    self._restore()
+
+  def _restore(self) -> None:
+    try:
+      with open(self.state_path, "r", encoding="ascii") as f:
+        ino, offset = (int(v) for v in f.read().split())
+    except (OSError, ValueError):
+      ino, offset = None, 0
+    try:
+      size = os.stat(self.path).st_size
+    except OSError:
+      return
+    if ino is None:
+      self._open(self.path, size)  # first run: only lines written from now on
+      return
+    # Rotated while we were down: finish the previous file if it is still around
+    for path in (self.path, self.path + ".1"):
+      try:
+        if os.stat(path).st_ino == ino:
+          self._open(path, offset if offset <= os.stat(path).st_size else 0)
+          return
+      except OSError:
+        continue
+    self._open(self.path, 0)
+
+  def _open(self, path: str, offset: int) -> None:
+    self.file = open(path, "rb")
+    self.ino = os.fstat(self.file.fileno()).st_ino
+    self.file.seek(offset)
+    self.offset = offset
+    self.tail = b""
+
+  def poll(self) -> tuple[list[dict], int]:
+    """New login attempts since the last poll, and how many failures were over the cap."""
+    attempts: list[dict] = []
+    dropped = 0
+    budget = self.read_budget
+    while True:
+      if self.file is None:
+        try:
+          self._open(self.path, 0)
+        except OSError:
+          break
+      used, over = self._read(attempts, budget)
+      budget -= used
+      dropped += over
+      if budget <= 0:
+        break
+      # At EOF: check whether the path now points at another file or shrank
+      try:
+        st = os.stat(self.path)
+      except OSError:
+        break  # rotated, new file not created yet
+      if st.st_ino != self.ino:
+        self.file.close()
+        self.file = None
+      elif st.st_size < self.offset:
+        self.file.seek(0)
+        self.offset = 0
+        self.tail = b""
+      else:
+        break
+    self._save()
+    return attempts, dropped
+
+  def _read(self, attempts: list[dict], budget: int) -> tuple[int, int]:
+    used = dropped = 0
+    while used < budget:
+      chunk = self.file.read(self.CHUNK)
+      if not chunk:
+        break
+      used += len(chunk)
+      data = self.tail + chunk
+      end = data.rfind(b"\n") + 1
+      self.tail = data[end:] if len(data) - end <= self.MAX_LINE else b""
+      for m in SSHD_LOGIN.finditer(data, 0, end):
+        success = m.group(1) == b"Accepted"
+        if not success and len(attempts) >= self.max_attempts:
+          dropped += 1
+          continue
+        attempts.append({
+          "user": m.group(2).decode("utf-8", "replace") or "unknown",
+          "ip": m.group(3).decode("ascii"),
+          "method": "SSH",
+          "success": success,
+        })
+    self.offset = self.file.tell() - len(self.tail)
+    return used, dropped
+
+  def _save(self) -> None:
+    state = (self.ino, self.offset)
+    if self.ino is None or state == self.saved:
+      return
+    tmp = self.state_path + ".tmp"
+    with open(tmp, "w", encoding="ascii") as f:
+      f.write(f"{self.ino} {self.offset}\n")
+    os.replace(tmp, self.state_path)
+    self.saved = state
+
+
+def build_tailer(cfg: dict) -> AuthLogTailer | None:
+  path = cfg.get("AUTH_LOG", "")
+  if not path:
+    path = next((p for p in AUTH_LOGS if os.path.exists(p)), "")
+  if not path or path == "off":
+    print("[synexguard-agent] no auth log found; SSH login attempts are not reported")
+    return None
+  state_dir = cfg.get("STATE_DIR", "/var/lib/synexguard")
+  os.makedirs(state_dir, exist_ok=True)
+  return AuthLogTailer(
+    path,
+    os.path.join(state_dir, "authlog.pos"),
+    max_attempts=int(cfg.get("AUTH_LOG_MAX_PER_HEARTBEAT", "5000")),
+  )
+
+
+def collect_login_attempts(tailer: AuthLogTailer | None, payload: dict) -> None:
+  if tailer is None:
+    return
+  attempts, dropped = tailer.poll()
+  payload["login_attempts"] = attempts
+  if dropped:
+    payload["events"].append({
+      "tipo": "auth_log_overflow",
+      "severidade": "warning",
+      "mensagem": f"{dropped} failed SSH logins over AUTH_LOG_MAX_PER_HEARTBEAT were not sent individually",
+      "payload": {"dropped": dropped},
+    })
+
+
+def bench(cycles: int) -> None:
+  """CPU time per heartbeat cycle, without sending anything: agent.py --bench [cycles]."""
+  cfg = load_config()
+  collectors = build_collectors(cfg, 1.0)
+  start = time.process_time()
+  for tick in range(cycles):
+    collect_payload(collectors, now=float(tick))  # a 1s heartbeat, without the sleeps
+  total = time.process_time() - start
+  print(f"{cycles} cycles, {total / cycles * 1e3:.2f} ms CPU per cycle")
+  for c in collectors:
+    per_run = c.cpu_seconds / max(c.runs, 1)
+    print(f"  {c.name:<10} every {c.interval:>5.0f}s  {c.runs:>5} runs  {per_run * 1e3:8.2f} ms/run")
+  start = time.process_time()
+  sockets = psutil.net_connections()
+  print(f"  reference: psutil.net_connections() {(time.process_time() - start) * 1e3:.2f} ms for {len(sockets)} sockets")
+
+
+def bench_authlog(rate: int, seconds: int) -> None:
+  """Replay a synthetic auth.log at ``rate`` lines/s: agent.py --bench-authlog [rate] [seconds].
+
+  Lines are appended one simulated second at a time, then polled. The log
+  is rotated (rename + new file) halfway and truncated in place at three
+  quarters, so both paths are covered. Login lines alternate between the
+  sshd and the OpenSSH 9.8+ sshd-session formats. Fails if any of them is
+  lost or counted twice.
+  """
+  import tempfile
+  import tracemalloc
+
+  users = [b"root", b"admin", b"ubuntu", b"oracle", b"test", b"git"]
+  noise = [
+    b"CRON[%d]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)",
+    b"sudo: pam_unix(sudo:session): session closed for user root",
+    b"systemd-logind[%d]: New session 42 of user deploy.",
+    b"sshd[%d]: Connection closed by authenticating user root 10.1.2.3 port 22 [preauth]",
+    b"sshd[%d]: Invalid user test from 10.9.8.7 port 40022",
+    b"sshd-session[%d]: Connection closed by invalid user admin 10.4.4.4 port 41234 [preauth]",
+  ]
+  # OpenSSH 9.8+ (current Ubuntu, Fedora) logs per-connection lines as sshd-session
+  daemons = [b"sshd", b"sshd-session"]
+  rng = random.Random(7)
+
+  def lines(n: int) -> tuple[bytes, int]:
+    out, expected = [], 0
+    for i in range(n):
+      r = rng.random()
+      prefix = b"Oct 19 10:00:01 web-01 "
+      ip = b"203.0.%d.%d" % (rng.randrange(256), rng.randrange(1, 255))
+      if r < 0.70:
+        user = rng.choice(users)
+        out.append(prefix + b"%s[%d]: Failed password for %s%s from %s port %d ssh2" % (
+          daemons[i & 1], 1000 + i % 5000, b"invalid user " if r < 0.3 else b"", user, ip, 1024 + i % 60000))
+        expected += 1
+      elif r < 0.71:
+        out.append(prefix + b"%s[%d]: Accepted publickey for deploy from %s port 50022 ssh2" % (daemons[i & 1], 1000 + i % 5000, ip))
+        expected += 1
+      else:
+        entry = rng.choice(noise)
+        out.append(prefix + (entry % (i % 5000) if b"%d" in entry else entry))
+    return b"\n".join(out) + b"\n", expected
+
+  with tempfile.TemporaryDirectory() as tmp:
+    log = os.path.join(tmp, "auth.log")
+    open(log, "wb").close()
+    tailer = AuthLogTailer(log, os.path.join(tmp, "authlog.pos"), max_attempts=10**9)
+    expected = seen = written = 0
+    cpu = peak = 0.0
+    for second in range(seconds):
+      data, n = lines(rate)
+      if second == seconds * 3 // 4:
+        seen += len(tailer.poll()[0])
+        open(log, "wb").close()  # copytruncate
+      written += len(data)
+      if second == seconds // 2:
+        # logrotate mid-second: half the lines land in the old file after our last poll
+        cut = data.index(b"\n", len(data) // 2) + 1
+        with open(log, "ab") as f:
+          f.write(data[:cut])
+        os.replace(log, log + ".1")
+        data = data[cut:]
+      with open(log, "ab") as f:
+        f.write(data)
+      expected += n
+      if second == seconds - 1:
+        tracemalloc.start()
+      start = time.process_time()
+      attempts, _ = tailer.poll()
+      cpu += time.process_time() - start
+      if second == seconds - 1:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+      seen += len(attempts)
+    total = rate * seconds
+    print(f"{total:,} lines ({written / 2**20:.1f} MiB) at {rate:,} lines/s over {seconds}s")
+    print(f"  CPU {cpu:.2f}s: {total / cpu:,.0f} lines/s, {cpu / seconds * 100:.1f}% of one core at this rate")
+    print(f"  peak memory in one poll: {peak / 2**20:.1f} MiB (read chunk {AuthLogTailer.CHUNK // 1024} KiB)")
+    print(f"  login attempts: {seen:,} of {expected:,} expected")
+    if seen != expected:
+      print("FAILED: attempts lost or duplicated")
+      sys.exit(1)
+
+
+class BanList:
+  """Mirror of the bans that apply to this server, applied to ipset in one batch per sync.
+
+  That is every tenant-wide ban (correlation) plus the ones scoped to this
+  server (manual bans and automation rules); the backend filters by server.
+
+  The backend sends only adds/removes since our cursor, or a full snapshot
+  (first sync, backend restart, long gaps). A snapshot is loaded into a
+  temporary set and swapped in atomically, so entries from a previous agent
+  run can't linger. The cursor only advances once a batch is applied, so a
+  failed batch is simply retried on the next heartbeat.
+  """
+
+  def __init__(self, mode: str) -> None:
+    self.cursor = ""
+    self.ips: set[str] = set()
+    self.enforce = mode == "ipset"
+    if self.enforce and not shutil.which("ipset"):
+      print("[synexguard-agent] ipset not found; bans are tracked but not enforced")
+      self.enforce = False
+    if self.enforce:
+      try:
+        for name, family, iptables in BAN_SETS.values():
+          subprocess.run(["ipset", "create", name, "hash:net", "family", family, "-exist"], check=True, capture_output=True, text=True)
+          rule = ["INPUT", "-m", "set", "--match-set", name, "src", "-j", "DROP"]
+          if shutil.which(iptables) and subprocess.run([iptables, "-C", *rule], capture_output=True).returncode != 0:
+            subprocess.run([iptables, "-I", *rule], check=True, capture_output=True, text=True)
+      except (subprocess.CalledProcessError, OSError) as exc:
+        # Containers and nftables-only hosts: no ip_set module or no iptables
+        # set match. Crashing here would crash-loop under Restart=always.
+        detail = exc.stderr.strip() if isinstance(exc, subprocess.CalledProcessError) and exc.stderr else exc
+        print(f"[synexguard-agent] ipset/iptables setup failed ({detail}); bans are tracked but not enforced")
+        self.enforce = False
+
+  @staticmethod
+  def _version(entry: str) -> int | None:
+    try:
+      return ipaddress.ip_network(entry, strict=False).version
+    except ValueError:
+      return None
+
+  def apply(self, diff: dict) -> None:
+    add = [ip for ip in diff.get("add", []) if self._version(ip)]
+    remove = [ip for ip in diff.get("remove", []) if self._version(ip)]
+    if self.enforce:
+      if diff.get("full"):
+        script = []
+        for version, (name, family, _) in BAN_SETS.items():
+          tmp = f"{name}-new"
+          script += [f"create {tmp} hash:net family {family} -exist", f"flush {tmp}"]
+          script += [f"add {tmp} {ip} -exist" for ip in add if self._version(ip) == version]
+          script += [f"swap {tmp} {name}", f"destroy {tmp}"]
+      else:
+        script = [f"del {BAN_SETS[self._version(ip)][0]} {ip} -exist" for ip in remove]
+        script += [f"add {BAN_SETS[self._version(ip)][0]} {ip} -exist" for ip in add]
+      if script:
+        subprocess.run(["ipset", "restore"], input="\n".join(script) + "\n", text=True, check=True)
+    if diff.get("full"):
+      self.ips = set(add)
+    else:
+      self.ips.difference_update(remove)
+      self.ips.update(add)
+    self.cursor = diff.get("cursor", self.cursor)
+
+
+class Spool:
+  """Bounded on-disk queue of heartbeats the API could not take.
+
+  Heartbeats are appended as NDJSON lines to numbered segment files, with
+  one fsync per SPOOL_FSYNC_EVERY lines (or seconds) rather than per line.
+  The read position is persisted after every acknowledged upload, so a
+  restart doesn't resend what the API already has. A new run always starts
+  a new segment, so a line torn by a crash is only ever at a segment's end
+  and gets skipped. Whole segments are dropped, oldest first, past the
+  size cap or once their last write is older than the age cap.
+  """
+
+  SEGMENT_BYTES = 1 << 20
+
+  def __init__(self, directory: str, max_bytes: int, max_age: float, fsync_every: int = 10, fsync_seconds: float = 10.0) -> None:
+    os.makedirs(directory, exist_ok=True)
+    self.dir = directory
+    self.max_bytes = max(max_bytes, 2 * self.SEGMENT_BYTES)
+    self.max_age = max_age
+    self.fsync_every = fsync_every
+    self.fsync_seconds = fsync_seconds
+    self.unsynced = 0
+    self.last_sync = time.monotonic()
+    self.segments = sorted(
+      int(name[4:-7]) for name in os.listdir(directory) if name.startswith("seg-") and name.endswith(".ndjson")
+    )
+    self.read_seq, self.read_off = self._load_cursor()
+    self._open(self.segments[-1] + 1 if self.segments else 1)
+    if self.read_seq not in self.segments:
+      self.read_seq, self.read_off = self.segments[0], 0
+    self._enforce_caps()
+
+  def _path(self, seq: int) -> str:
+    return os.path.join(self.dir, f"seg-{seq:010d}.ndjson")
+
+  def _load_cursor(self) -> tuple[int, int]:
+    try:
+      with open(os.path.join(self.dir, "cursor"), "r", encoding="ascii") as f:
+        seq, off = f.read().split()
+      return int(seq), int(off)
+    except (OSError, ValueError):
+      return 0, 0
+
+  def _open(self, seq: int) -> None:
+    self.segments.append(seq)
+    self.write_seq = seq
+    self.writer = open(self._path(seq), "ab")
+
+  def empty(self) -> bool:
+    return self.read_seq == self.write_seq and self.read_off >= self.writer.tell()
+
+  def append(self, payload: dict) -> None:
+    payload.setdefault("coletado_em", round(time.time(), 3))
+    line = json.dumps(payload, separators=(",", ":")).encode() + b"\n"
+    if self.writer.tell() and self.writer.tell() + len(line) > self.SEGMENT_BYTES:
+      self.sync()
+      self.writer.close()
+      self._open(self.write_seq + 1)
+      self._enforce_caps()
+    self.writer.write(line)
+    self.writer.flush()
+    self.unsynced += 1
+    if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_seconds:
+      self.sync()
+
+  def sync(self) -> None:
+    if self.unsynced:
+      os.fsync(self.writer.fileno())
+    self.unsynced = 0
+    self.last_sync = time.monotonic()
+
+  def _enforce_caps(self) -> None:
+    sizes = {seq: os.path.getsize(self._path(seq)) for seq in self.segments}
+    total = sum(sizes.values())
+    expired = time.time() - self.max_age
+    dropped = 0
+    while len(self.segments) > 1:
+      seq = self.segments[0]
+      if total <= self.max_bytes and os.path.getmtime(self._path(seq)) >= expired:
+        break
+      os.unlink(self._path(seq))
+      self.segments.pop(0)
+      total -= sizes[seq]
+      dropped += 1
+      if self.read_seq == seq:
+        self.read_seq, self.read_off = self.segments[0], 0
+    if dropped:
+      print(f"[synexguard-agent] spool over its size/age cap: dropped {dropped} oldest segment(s)")
+
+  def peek(self, max_records: int, max_bytes: int) -> tuple[list[bytes], tuple[int, int]]:
+    """Oldest pending lines, and the position just past them to pass to ack()."""
+    self.writer.flush()
+    expired = time.time() - self.max_age
+    lines: list[bytes] = []
+    size = 0
+    seq, off = self.read_seq, self.read_off
+    while True:
+      with open(self._path(seq), "rb") as f:
+        f.seek(off)
+        for line in f:
+          off += len(line)
+          if not line.endswith(b"\n"):
+            continue  # torn by a crash
+          try:
+            collected = json.loads(line).get("coletado_em", 0)
+          except ValueError:
+            continue
+          if collected < expired:
+            continue
+          lines.append(line)
+          size += len(line)
+          if len(lines) >= max_records or size >= max_bytes:
+            return lines, (seq, off)
+      if seq == self.write_seq:
+        return lines, (seq, off)
+      seq, off = seq + 1, 0
+
+  def ack(self, position: tuple[int, int]) -> None:
+    seq, off = position
+    while self.segments[0] < seq:
+      os.unlink(self._path(self.segments.pop(0)))
+    self.read_seq, self.read_off = seq, off
+    tmp = os.path.join(self.dir, "cursor.tmp")
+    with open(tmp, "w", encoding="ascii") as f:
+      f.write(f"{seq} {off}\n")
+    os.replace(tmp, os.path.join(self.dir, "cursor"))
+
+
+class Backoff:
+  """Exponential backoff with full jitter.
+
+  Each agent waits a random share of the current window, so a fleet that
+  lost the API at the same moment doesn't come back in lockstep.
+  """
+
+  def __init__(self, base: float, cap: float) -> None:
+    self.base = base
+    self.cap = cap
+    self.failures = 0
+    self.until = 0.0
+
+  def ready(self, now: float) -> bool:
+    return now >= self.until
+
+  def failure(self, retry_after: float = 0.0) -> float:
+    self.failures += 1
+    window = min(self.cap, self.base * 2 ** min(self.failures, 20))
+    delay = max(random.uniform(0, window), retry_after)
+    self.until = time.monotonic() + delay
+    return delay
+
+  def success(self) -> None:
+    self.failures = 0
+    self.until = 0.0
+
+
+def retry_after(resp) -> float | None:
+  """None if ``resp`` is final; else seconds the API asked us to wait (0 if it didn't say)."""
+  if resp.status_code != 429 and resp.status_code < 500:
+    return None
+  try:
+    return float(resp.headers.get("Retry-After", 0))
+  except ValueError:
+    return 0.0
+
+
+def apply_bans(bans: BanList, resp) -> None:
+  diff = resp.json().get("bans")
+  if diff:
+    try:
+      bans.apply(diff)
+    except (OSError, subprocess.CalledProcessError) as exc:
+      print(f"[synexguard-agent] ban sync failed: {exc}")
+
+
+def upload_backlog(session, url: str, token: str, spool: Spool, bans: BanList, deadline: float) -> float | None:
+  """Drain the spool in gzip'd NDJSON batches until it is empty or ``deadline``.
+
+  Returns None when done, or the Retry-After delay when the API is still not taking data.
+  """
+  headers = {"X-Agent-Token": token, "Content-Type": "application/x-ndjson", "Content-Encoding": "gzip"}
+  while not spool.empty() and time.monotonic() < deadline:
+    lines, position = spool.peek(SPOOL_BATCH_RECORDS, SPOOL_BATCH_BYTES)
+    if lines:
+      resp = session.post(url, headers=headers, data=gzip.compress(b"".join(lines), compresslevel=6), timeout=30)
+      delay = retry_after(resp)
+      if delay is not None or resp.status_code in (401, 403):
+        print(f"[synexguard-agent] backlog upload failed: HTTP {resp.status_code}; {len(lines)} heartbeats kept")
+        return delay or 0.0
+      if resp.status_code >= 300:
+        # Anything else is about the batch itself; retrying would wedge the spool
+        print(f"[synexguard-agent] backlog batch rejected: HTTP {resp.status_code} {resp.text[:200]}; dropped {len(lines)} heartbeats")
+      else:
+        apply_bans(bans, resp)
+    spool.ack(position)
+  return None
+
+
 def main() -> None:
   cfg = load_config()
   token = (
@@ -197,33 +831,73 @@ def main() -> None:
     return
 
   url = api_url.rstrip("/") + "/api/v1/agents/heartbeat"
+  headers = {"X-Agent-Token": token, "Content-Type": "application/json"}
   session = requests.Session()
+  bans = BanList(cfg.get("BAN_ENFORCEMENT", "ipset"))
+  collectors = build_collectors(cfg, interval)
+  tailer = build_tailer(cfg)
+  spool = Spool(
+    cfg.get("SPOOL_DIR", "/var/lib/synexguard/spool"),
+    int(float(cfg.get("SPOOL_MAX_MB", "64")) * 2**20),
+    float(cfg.get("SPOOL_MAX_AGE_HOURS", "24")) * 3600,
+  )
+  backoff = Backoff(interval, float(cfg.get("BACKOFF_MAX", "300")))
 
   print(
     f"[synexguard-agent] started — api={api_url} interval={interval}s hostname={socket.gethostname()}"
   )
 
   while True:
+    started = time.monotonic()
+    payload = None
     try:
-      payload = collect_payload()
-      resp = session.post(
-        url,
-        headers={"X-Agent-Token": token, "Content-Type": "application/json"},
-        data=json.dumps(payload),
-        timeout=10,
-      )
-      if resp.status_code >= 300:
-        print(
-          f"[synexguard-agent] heartbeat failed: HTTP {resp.status_code} {resp.text[:200]}"
-        )
+      payload = collect_payload(collectors)
+      collect_login_attempts(tailer, payload)
+      payload["ban_cursor"] = bans.cursor
+      if spool.empty() and backoff.ready(started):
+        resp = session.post(url, headers=headers, data=json.dumps(payload), timeout=10)
+        delay = retry_after(resp)
+        if delay is not None:
+          spool.append(payload)
+          wait = backoff.failure(delay)
+          print(f"[synexguard-agent] heartbeat failed: HTTP {resp.status_code}; spooling, retry in {wait:.0f}s")
+        elif resp.status_code >= 300:
+          print(
+            f"[synexguard-agent] heartbeat failed: HTTP {resp.status_code} {resp.text[:200]}"
+          )
+        else:
+          backoff.success()
+          apply_bans(bans, resp)
+      else:
+        # Keep order: once there is a backlog, new heartbeats queue behind it
+        spool.append(payload)
+        if backoff.ready(started):
+          delay = upload_backlog(session, url + "/batch", token, spool, bans, started + interval)
+          if delay is None:
+            backoff.success()
+          else:
+            backoff.failure(delay)
+    except requests.RequestException as exc:
+      if payload is not None and spool.empty():
+        spool.append(payload)
+      wait = backoff.failure()
+      print(f"[synexguard-agent] API unreachable: {exc}; spooling, retry in {wait:.0f}s")
     except Exception as exc:  # noqa: BLE001
       print(f"[synexguard-agent] heartbeat error: {exc}")
 
-    time.sleep(interval)
+    time.sleep(max(0.0, interval - (time.monotonic() - started)))
 
 
 if __name__ == "__main__":
-  main()
+  if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+    bench(int(sys.argv[2]) if len(sys.argv) > 2 else 300)
+  elif len(sys.argv) > 1 and sys.argv[1] == "--bench-authlog":
+    bench_authlog(
+      int(sys.argv[2]) if len(sys.argv) > 2 else 10_000,
+      int(sys.argv[3]) if len(sys.argv) > 3 else 60,
+    )
+  else:
+    main()
 EOF
 
 chmod 755 "${INSTALL_DIR}/agent.py"